@@ -7,6 +7,12 @@ import json
 import datetime
 import tempfile
 import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from inference_server import server_available, submit
+from gis_store import get_gis_store
+from report_store import get_report_store
 
 import os
 print(f"Current working directory: {os.getcwd()}")
@@ -24,24 +30,9 @@ st.set_page_config(page_title="PolePad AI", layout="wide")
 # ---------------------------
 # Utility functions
 # ---------------------------
-def load_gis(path=CSV_PATH):
-    df = pd.read_csv(path)
-    return df
-
 def get_flagged_poles(out_dir=REPORTS_DIR):
     """Enumerate flagged poles from reports"""
-    poles = []
-    if os.path.isdir(out_dir):
-        for fname in os.listdir(out_dir):
-            if fname.lower().endswith(".json"):
-                try:
-                    with open(os.path.join(out_dir, fname)) as f:
-                        data = json.load(f)
-                    if data.get("mismatches"):
-                        poles.append(data.get("pole_id"))
-                except Exception:
-                    pass
-    return sorted(set(poles))
+    return get_report_store(out_dir).flagged_poles()
 
 def navigate_to_pole(pole_id):
     """Helper: navigate to pole.py with pole_id via session state"""
@@ -56,7 +47,7 @@ st.subheader("Defects flagged by AI, Reviewed by You")
 
 # Load GIS
 try:
-    gis_df = load_gis(CSV_PATH)
+    gis_store = get_gis_store(CSV_PATH)
 except Exception as e:
     st.error(f"Could not load GIS CSV at {CSV_PATH}: {e}")
     st.stop()
@@ -90,15 +81,32 @@ with col1:
 
 
         if st.button("Analyze"):
-            if "Tag Extraction" in mode:
-                cmd = f"python src/run_all_pipeline.py {temp_path}"
-            else:
-                cmd = f"python src/run_all_pipeline.py {temp_path} --roboflow"
-            st.write(f"Running: `{cmd}`")
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            st.text(result.stdout)
-            if result.stderr:
-                st.error(result.stderr)
+            pipeline_mode = "ocr_gis" if "Tag Extraction" in mode else "roboflow"
+            response = None
+            if server_available():
+                # Warm models in the resident server (python src/inference_server.py serve),
+                # with the same options as the run_all_pipeline.py command below
+                with st.spinner("Analyzing..."):
+                    response = submit(temp_path, pipeline_mode, ocr_mode="full", time_budget_sec=None,
+                                      predictions_only=False, scene_backend="roboflow")
+                if response.get("ok"):
+                    st.caption(f"Analyzed in {response.get('elapsed_sec', 0):.1f}s by the inference server")
+                    st.json(response["result"])
+                elif response.get("cancelled"):
+                    st.warning(f"{response.get('error')}; running the pipeline directly instead")
+                else:
+                    st.error(response.get("error", "Inference server error"))
+            # Only run it here if the server won't: never process the same image twice
+            if response is None or response.get("cancelled"):
+                if pipeline_mode == "ocr_gis":
+                    cmd = f"python src/run_all_pipeline.py {temp_path}"
+                else:
+                    cmd = f"python src/run_all_pipeline.py {temp_path} --roboflow"
+                st.write(f"Running: `{cmd}`")
+                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+                st.text(result.stdout)
+                if result.stderr:
+                    st.error(result.stderr)
 
         
         
@@ -124,4 +132,4 @@ with col2:
 st.sidebar.markdown("## Notes")
 st.sidebar.write("- GIS records must be present as `gis_records.csv` in the project folder.")
 st.sidebar.write("- AI/GIS comparison happens on the Pole Review page.")
-st.sidebar.write("- Reports are saved to the `reports/` folder.")
+st.sidebar.write("- Reports are saved to `reports.sqlite` (legacy `reports/*.json` files are imported).")
@@ -0,0 +1,103 @@
+# bench_compare.py
+# Benchmarks bulk_compare() against the per-row compare()/compute_risk() loop
+# on a synthetic fleet and checks that both produce identical results.
+import argparse
+import math
+import random
+import time
+
+import pandas as pd
+
+from compare_demo import bulk_compare, compare, compute_risk
+
+BOOL_VALUES = ["Yes", "No", "yes", "no", "Y", "N", "true", "False", "1", "0", " yes ", "", "maybe", None]
+TYPE_VALUES = ["Wood", "wood", "Wooden", "Steel", "stl", "Metal", "Composite", "fiberglass", "wodd", "steal",
+               "concrete", "", None]
+
+
+def make_fleet(n_ai, n_gis, seed=0):
+    rng = random.Random(seed)
+    gis_ids = [f"P{i:07d}" for i in range(n_gis)]
+    gis_df = pd.DataFrame({
+        "pole_id": gis_ids,
+        "expected_vegetation": [rng.choice(["Yes", "No"]) for _ in range(n_gis)],
+        "expected_guy_guard": [rng.choice(["Yes", "No"]) for _ in range(n_gis)],
+        "pole_type": [rng.choice(["Wood", "Steel", "Composite"]) for _ in range(n_gis)],
+        "has_conduit_riser": [rng.choice(["Yes", "No"]) for _ in range(n_gis)],
+        "area": [rng.choice(["Urban", "Suburban", "Rural"]) for _ in range(n_gis)],
+    })
+    # A few AI rows point at poles that are not in the registry
+    ai_ids = [rng.choice(gis_ids) if rng.random() > 0.01 else f"X{i}" for i in range(n_ai)]
+    ai_df = pd.DataFrame({
+        "pole_id": ai_ids,
+        "vegetation": [rng.choice(BOOL_VALUES) for _ in range(n_ai)],
+        "guy_guard": [rng.choice(BOOL_VALUES) for _ in range(n_ai)],
+        "pole_type": [rng.choice(TYPE_VALUES) for _ in range(n_ai)],
+        "has_conduit_riser": [rng.choice(BOOL_VALUES) for _ in range(n_ai)],
+    })
+    return ai_df, gis_df
+
+
+def per_row(ai_df, gis_df):
+    """The existing one-record-at-a-time flow, with a dict index for the GIS lookup."""
+    gis_index = {}
+    for rec in gis_df.to_dict("records"):
+        gis_index.setdefault(str(rec["pole_id"]), rec)
+    out = []
+    for ai in ai_df.to_dict("records"):
+        gis = gis_index.get(str(ai["pole_id"]))
+        if gis is None:
+            continue
+        mismatches = compare(ai, gis)
+        score, status, assessment = compute_risk(ai, mismatches)
+        out.append((str(ai["pole_id"]), mismatches, score, status, assessment))
+    return out
+
+
+def _same(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bulk_compare() vs per-row compare()/compute_risk()")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="AI result rows")
+    parser.add_argument("--poles", type=int, default=200_000, help="GIS registry size")
+    parser.add_argument("--sample", type=int, default=20_000,
+                        help="Rows run through the per-row path (timed and verified); 0 = all rows")
+    args = parser.parse_args()
+
+    ai_df, gis_df = make_fleet(args.rows, args.poles)
+    print(f"{args.rows:,} AI rows vs {args.poles:,} GIS poles")
+
+    start = time.perf_counter()
+    bulk = bulk_compare(ai_df, gis_df)
+    bulk_sec = time.perf_counter() - start
+    print(f"  bulk_compare: {bulk_sec:8.2f}s  ({len(bulk) / bulk_sec:,.0f} rows/s, {len(bulk):,} joined rows)")
+
+    sample = ai_df if args.sample == 0 else ai_df.head(args.sample)
+    start = time.perf_counter()
+    expected = per_row(sample, gis_df)
+    row_sec = time.perf_counter() - start
+    rate = len(expected) / row_sec
+    print(f"  per-row:      {row_sec:8.2f}s for {len(expected):,} rows ({rate:,.0f} rows/s, "
+          f"~{len(bulk) / rate:,.0f}s projected for all rows)")
+    print(f"  speedup: ~{(len(bulk) / rate) / bulk_sec:.0f}x")
+
+    got = bulk.head(len(expected))
+    bad = 0
+    for (pid, mm, score, status, assessment), row in zip(expected, got.itertuples(index=False)):
+        if not (pid == row.pole_id and _same(mm, row.mismatches) and score == row.risk_score
+                and status == row.status and _same(assessment, row.assessment)):
+            bad += 1
+    print(f"  identical to per-row output: {bad == 0} ({len(expected):,} rows checked, {bad} differences)")
+    raise SystemExit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # compare_demo.py
+import numpy as np
 import pandas as pd
 import json
 import os
@@ -212,6 +213,146 @@ def get_gis_record(df: pd.DataFrame, pole_id: str) -> Dict[str, Any]:
         return None
     return rec.iloc[0].to_dict()
 
+# ---------------------------------------------------------------------------
+# Bulk compare-and-score: same results as compare()/compute_risk() per row,
+# computed column-wise over a whole DataFrame of AI results.
+# ---------------------------------------------------------------------------
+_NAN = float("nan")
+
+def _normalize_column(series: pd.Series, fn) -> Tuple[np.ndarray, List[Any]]:
+    """
+    Applies a scalar normalizer to a column via a lookup table: the normalizer
+    runs once per distinct value (and once for missing values), then results
+    are gathered by integer code. Returns (codes, table); codes of -1 map to
+    the last table entry, the missing-value result.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    table = [fn(u) for u in uniques] + [fn(_NAN)]
+    return codes, table
+
+def _normalized_bool(series: pd.Series) -> np.ndarray:
+    codes, table = _normalize_column(series, normalize_bool)
+    return np.array(table, dtype=object)[codes]
+
+def _normalized_pole_type(series: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    codes, table = _normalize_column(series, normalize_pole_type)
+    canon = np.array([t[0] for t in table], dtype=object)[codes]
+    conf = np.array([t[1] for t in table], dtype=float)[codes]
+    return canon, conf
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    # Missing columns behave like dict.get() returning None
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+# field -> (gis column, ai column, severity) for the yes/no fields
+_BOOL_FIELDS = {
+    "vegetation": ("expected_vegetation", "vegetation", "medium"),
+    "guy_guard": ("expected_guy_guard", "guy_guard", "high"),
+    "has_conduit_riser": ("has_conduit_riser", "has_conduit_riser", "low"),
+}
+# The order compare() reports mismatches in
+_MISMATCH_ORDER = ["vegetation", "guy_guard", "pole_type", "has_conduit_riser"]
+_SEVERITY_FACTOR = {"high": 1.5, "medium": 1.0, "low": 0.5}
+
+def bulk_compare(ai_df: pd.DataFrame, gis_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins AI results to GIS records on pole_id and scores every row in one pass.
+
+    Output rows (in ai_df order, AI rows without a GIS record are dropped, and
+    the first GIS row wins for duplicated pole_ids, like get_gis_record) carry
+    pole_id, mismatches (the exact list compare() returns), mismatch_count,
+    risk_score, status, the assessment fields (risk_level, data_status, action,
+    confidence) and the assessment dict, all identical to compute_risk().
+    """
+    ai = ai_df.add_prefix("ai__")
+    ai["pole_id"] = ai_df["pole_id"].astype(str).values
+    gis = gis_df.drop_duplicates("pole_id", keep="first").add_prefix("gis__")
+    gis["pole_id"] = gis["gis__pole_id"].astype(str).values
+    merged = ai.merge(gis, on="pole_id", how="inner", sort=False)
+    n = len(merged)
+
+    def ai_col(name):
+        return _column(merged, f"ai__{name}")
+
+    def gis_col(name):
+        return _column(merged, f"gis__{name}")
+
+    weights = CONFIG["weights"]
+    score = np.full(n, 100.0)
+    flags = {}
+    for field, (gis_name, ai_name, severity) in _BOOL_FIELDS.items():
+        g = _normalized_bool(gis_col(gis_name))
+        a = _normalized_bool(ai_col(ai_name))
+        flags[field] = (g != "unknown") & (a != "unknown") & (g != a), g, a
+        if field == "vegetation":
+            score -= np.where(a == "yes", weights["vegetation_present"], 0)
+        elif field == "guy_guard":
+            score -= np.where(a == "no", weights["guy_guard_missing"], 0)
+    gis_canon, gis_conf = _normalized_pole_type(gis_col("pole_type"))
+    ai_canon, ai_conf = _normalized_pole_type(ai_col("pole_type"))
+    type_mm = (gis_canon != "") & (ai_canon != "") & (gis_canon != ai_canon)
+
+    per_mismatch = weights["per_mismatch"]
+    for field, (_, _, severity) in _BOOL_FIELDS.items():
+        score -= flags[field][0] * (per_mismatch * _SEVERITY_FACTOR[severity])
+    score -= type_mm * per_mismatch
+    # np.round is round-half-to-even, like round() in compute_risk
+    score = np.clip(np.round(score), 0, 100).astype(int)
+
+    status = np.where(score >= 80, "OK", np.where(score >= 50, "WARNING", "HIGH RISK")).astype(object)
+    mismatch_count = sum(flags[f][0].astype(int) for f in flags) + type_mm.astype(int)
+
+    # Mismatch dicts are only built for rows that have mismatches
+    mismatches: List[List[Dict[str, Any]]] = [[] for _ in range(n)]
+    raw = {name: gis_col(name).tolist() for name, _, _ in _BOOL_FIELDS.values()}
+    raw_ai = {name: ai_col(name).tolist() for _, name, _ in _BOOL_FIELDS.values()}
+    gis_type_raw, ai_type_raw = gis_col("pole_type").tolist(), ai_col("pole_type").tolist()
+    for i in np.flatnonzero(mismatch_count):
+        row = mismatches[i]
+        for field in _MISMATCH_ORDER:
+            if field == "pole_type":
+                if type_mm[i]:
+                    row.append({
+                        "field": "pole_type",
+                        "gis": gis_type_raw[i],
+                        "ai": ai_type_raw[i],
+                        "gis_canonical": gis_canon[i],
+                        "ai_canonical": ai_canon[i],
+                        "gis_confidence": float(gis_conf[i]),
+                        "ai_confidence": float(ai_conf[i]),
+                        "severity": "medium"
+                    })
+                continue
+            gis_name, ai_name, severity = _BOOL_FIELDS[field]
+            mm, g, a = flags[field]
+            if mm[i]:
+                row.append({
+                    "field": field,
+                    "gis": raw[gis_name][i],
+                    "ai": raw_ai[ai_name][i],
+                    "gis_normalized": g[i],
+                    "ai_normalized": a[i],
+                    "severity": severity
+                })
+
+    # generate_assessment() has three outcomes; pick one per row
+    has_mm = mismatch_count > 0
+    level = np.where((score >= 90) & ~has_mm, 0, np.where(score >= 70, 1, 2))
+    outcomes = [generate_assessment(100, []), generate_assessment(70, [None]), generate_assessment(0, [None])]
+    out = pd.DataFrame({
+        "pole_id": merged["pole_id"].values,
+        "mismatches": mismatches,
+        "mismatch_count": mismatch_count,
+        "risk_score": score,
+        "status": status,
+    })
+    for key in ("risk_level", "data_status", "action", "confidence"):
+        out[key] = np.array([o[key] for o in outcomes], dtype=object)[level]
+    out["assessment"] = [dict(outcomes[k]) for k in level]
+    return out
+
 # Main flow (single AI record example)
 if __name__ == "__main__":
     # Example AI result - replace with real AI/OCR outputs (including confidences if available)
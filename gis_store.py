@@ -0,0 +1,167 @@
+# gis_store.py
+import csv
+import hashlib
+import os
+import sqlite3
+import threading
+
+import streamlit as st
+
+CSV_PATH = "gis_records.csv"
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class GisStore:
+    """
+    Indexed, read-mostly view of the GIS pole registry.
+
+    The CSV is imported once into a SQLite file next to it (pole_id is the
+    primary key, so lookups are a B-tree search instead of a DataFrame scan).
+    Every access stats the CSV; the index is rebuilt only when the CSV's
+    content hash changes, and a plain mtime bump without a content change
+    just refreshes the stored metadata. One instance can be shared by all
+    Streamlit sessions through get_gis_store.
+    """
+
+    BATCH_ROWS = 50_000
+
+    def __init__(self, csv_path=CSV_PATH, db_path=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or os.path.splitext(csv_path)[0] + ".sqlite"
+        self.columns = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stat = None
+        self._ensure_fresh()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._local.generation = self._generation
+        return conn
+
+    def _read_meta(self):
+        if not os.path.exists(self.db_path):
+            return {}
+        try:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return {}
+
+    def _ensure_fresh(self):
+        st = os.stat(self.csv_path)
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return
+        with self._lock:
+            if stat == self._stat:
+                return
+            meta = self._read_meta()
+            if meta.get("source_mtime_ns") == str(stat[0]) and meta.get("source_size") == str(stat[1]):
+                pass
+            else:
+                digest = _file_sha256(self.csv_path)
+                if meta.get("source_sha256") == digest:
+                    self._write_meta(self.db_path, stat, digest)
+                else:
+                    self._rebuild(stat, digest)
+            meta = self._read_meta()
+            self.columns = meta.get("columns", "").split(",") if meta.get("columns") else []
+            self._stat = stat
+            self._generation += 1
+
+    @staticmethod
+    def _write_meta(db_path, stat, digest, columns=None):
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            rows = [("source_mtime_ns", str(stat[0])), ("source_size", str(stat[1])), ("source_sha256", digest)]
+            if columns is not None:
+                rows.append(("columns", ",".join(columns)))
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _rebuild(self, stat, digest):
+        # Build into a side file and swap it in, so readers never see a half-built index
+        tmp_path = f"{self.db_path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            with open(self.csv_path, newline="") as f:
+                reader = csv.reader(f)
+                header = [h.strip() for h in next(reader)]
+                if "pole_id" not in header:
+                    raise ValueError(f"{self.csv_path} has no pole_id column")
+                cols = ", ".join(f'"{c}" TEXT' for c in header)
+                conn.execute(f'CREATE TABLE poles ({cols}, PRIMARY KEY ("pole_id")) WITHOUT ROWID')
+                placeholders = ", ".join("?" for _ in header)
+                # OR IGNORE keeps the first row for a duplicated pole_id, like df[...].iloc[0]
+                insert = f"INSERT OR IGNORE INTO poles VALUES ({placeholders})"
+                batch = []
+                for row in reader:
+                    if not row:
+                        continue
+                    row = (row + [""] * len(header))[:len(header)]
+                    row[header.index("pole_id")] = row[header.index("pole_id")].strip()
+                    batch.append(row)
+                    if len(batch) >= self.BATCH_ROWS:
+                        conn.executemany(insert, batch)
+                        batch = []
+                if batch:
+                    conn.executemany(insert, batch)
+            conn.commit()
+        finally:
+            conn.close()
+        self._write_meta(tmp_path, stat, digest, header)
+        os.replace(tmp_path, self.db_path)
+
+    def get(self, pole_id):
+        """Returns the GIS record for pole_id as a dict, or None."""
+        self._ensure_fresh()
+        row = self._conn().execute('SELECT * FROM poles WHERE "pole_id" = ?', (str(pole_id).strip(),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(self.columns, row))
+
+    def __contains__(self, pole_id):
+        self._ensure_fresh()
+        return self._conn().execute('SELECT 1 FROM poles WHERE "pole_id" = ?', (str(pole_id).strip(),)).fetchone() is not None
+
+    def count(self):
+        self._ensure_fresh()
+        return self._conn().execute("SELECT COUNT(*) FROM poles").fetchone()[0]
+
+    def pole_ids(self, limit=None):
+        """pole_ids in index order (all of them, or the first `limit`)."""
+        self._ensure_fresh()
+        sql = 'SELECT "pole_id" FROM poles ORDER BY "pole_id"'
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [r[0] for r in self._conn().execute(sql)]
+
+
+@st.cache_resource
+def get_gis_store(path=CSV_PATH):
+    """One indexed GIS store shared by every session; reindexes when the CSV changes"""
+    return GisStore(path)
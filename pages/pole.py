@@ -7,6 +7,8 @@ import io
 import os
 import json
 import datetime
+from gis_store import get_gis_store
+from report_store import get_report_store
 
 CSV_PATH = "gis_records.csv"
 REPORTS_DIR = "reports"
@@ -16,15 +18,8 @@ st.set_page_config(page_title="Pole Review", layout="wide")
 # ---------------------------
 # Utility functions (reuse your compare logic)
 # ---------------------------
-def load_gis(path=CSV_PATH):
-    df = pd.read_csv(path)
-    return df
-
-def get_pole_record(df, pole_id):
-    rec = df[df["pole_id"] == pole_id]
-    if rec.empty:
-        return None
-    return rec.iloc[0].to_dict()
+def get_pole_record(store, pole_id):
+    return store.get(pole_id)
 
 def compare(ai, gis):
     mismatches = []
@@ -59,12 +54,9 @@ def compute_risk(ai, mismatches):
     return score, status
 
 def save_report(report, out_dir=REPORTS_DIR):
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    fname = f"{report['pole_id']}_{ts}.json"
-    path = os.path.join(out_dir, fname)
-    with open(path, "w") as f:
-        json.dump(report, f, indent=2)
-    return path
+    store = get_report_store(out_dir)
+    report_id = store.add(report)
+    return f"{store.db_path} (report #{report_id})"
 
 # --------- UI ---------
 
@@ -73,27 +65,24 @@ st.markdown("Compare GIS data with AI inspection results.")
 
 # load the GIS data once
 try:
-    gis_df = load_gis(CSV_PATH)
+    gis_store = get_gis_store(CSV_PATH)
 except Exception as e:
     st.error(f"Failed to read GIS CSV at {CSV_PATH}: {e}")
     st.stop()
 
-pole_list = list(gis_df["pole_id"].values)
-
 # Get pole from session state (set by app.py button)
 selected = st.session_state.get("selected_pole", "")
 
 st.write(f"DEBUG - Selected pole from session: '{selected}'")
 
-if not selected or selected not in pole_list:
+gis_row = get_pole_record(gis_store, selected) if selected else None
+if gis_row is None:
     st.warning(f"No pole selected. Go back to the home page and select a pole to review.")
     st.stop()
 
 st.success(f"Pole {selected} found! Proceeding...")
 
 # Pole is confirmed to exist, proceed directly
-gis_row = get_pole_record(gis_df, selected)
-
 st.subheader("GIS record")
 st.json(gis_row)
 
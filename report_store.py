@@ -0,0 +1,191 @@
+# report_store.py
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+import streamlit as st
+
+REPORTS_DIR = "reports"
+DB_PATH = "reports.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pole_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT,
+    risk_score REAL,
+    has_mismatches INTEGER NOT NULL,
+    source TEXT UNIQUE,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_pole_ts ON reports (pole_id, timestamp);
+CREATE INDEX IF NOT EXISTS reports_ts ON reports (timestamp);
+CREATE INDEX IF NOT EXISTS reports_status ON reports (status, pole_id);
+CREATE INDEX IF NOT EXISTS reports_mismatch ON reports (has_mismatches, pole_id);
+CREATE TABLE IF NOT EXISTS poles (
+    pole_id TEXT PRIMARY KEY,
+    latest_id INTEGER NOT NULL,
+    latest_timestamp TEXT NOT NULL,
+    latest_status TEXT,
+    latest_has_mismatches INTEGER NOT NULL,
+    report_count INTEGER NOT NULL,
+    flagged_count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS poles_flagged ON poles (flagged_count, pole_id);
+CREATE INDEX IF NOT EXISTS poles_latest_flagged ON poles (latest_has_mismatches, pole_id);
+"""
+
+
+class ReportStore:
+    """
+    Append-only store for pole review reports, backed by one SQLite file.
+
+    Reports are never rewritten; each add() inserts a row and, in the same
+    transaction, updates a per-pole summary row (latest report, report count,
+    flagged count). "Flagged poles" and "latest report per pole" are index
+    scans over that summary, so their cost follows the number of poles, not
+    the number of reports ever filed. Legacy reports/*.json files are imported
+    once (see import_dir); re-importing the same file is a no-op.
+    """
+
+    def __init__(self, db_path=DB_PATH, import_from=REPORTS_DIR):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        if import_from and os.path.isdir(import_from):
+            self.import_dir(import_from)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _insert(conn, report, source):
+        pole_id = str(report.get("pole_id", "")).strip()
+        if not pole_id:
+            raise ValueError("report has no pole_id")
+        timestamp = report.get("timestamp") or datetime.datetime.now().isoformat()
+        flagged = 1 if report.get("mismatches") else 0
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO reports (pole_id, timestamp, status, risk_score, has_mismatches, source, body) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pole_id, timestamp, report.get("status"), report.get("risk_score"), flagged, source,
+             json.dumps(report, default=str)))
+        if cur.rowcount == 0:
+            return None  # already imported
+        report_id = cur.lastrowid
+        conn.execute(
+            "INSERT INTO poles VALUES (?, ?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT (pole_id) DO UPDATE SET "
+            "  report_count = report_count + 1,"
+            "  flagged_count = flagged_count + excluded.flagged_count,"
+            "  latest_id = CASE WHEN excluded.latest_timestamp >= latest_timestamp THEN excluded.latest_id ELSE latest_id END,"
+            "  latest_status = CASE WHEN excluded.latest_timestamp >= latest_timestamp THEN excluded.latest_status ELSE latest_status END,"
+            "  latest_has_mismatches = CASE WHEN excluded.latest_timestamp >= latest_timestamp"
+            "    THEN excluded.latest_has_mismatches ELSE latest_has_mismatches END,"
+            "  latest_timestamp = MAX(latest_timestamp, excluded.latest_timestamp)",
+            (pole_id, report_id, timestamp, report.get("status"), flagged, flagged))
+        return report_id
+
+    def add(self, report):
+        """Appends a report and returns its id. A missing timestamp is set to now."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            report_id = self._insert(conn, report, None)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return report_id
+
+    def import_dir(self, reports_dir=REPORTS_DIR):
+        """
+        Imports reports/*.json written by the old one-file-per-report layout.
+        Files are keyed by name, so only ones not seen before are read.
+        Reports without a timestamp get the file's modification time.
+        Returns how many reports were added.
+        """
+        conn = self._conn()
+        seen = {r[0] for r in conn.execute("SELECT source FROM reports WHERE source LIKE 'file:%'")}
+        names = sorted(n for n in os.listdir(reports_dir)
+                       if n.lower().endswith(".json") and f"file:{n}" not in seen)
+        added = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in names:
+                path = os.path.join(reports_dir, name)
+                try:
+                    with open(path) as f:
+                        report = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if not isinstance(report, dict) or not report.get("pole_id"):
+                    continue
+                if not report.get("timestamp"):
+                    report["timestamp"] = datetime.datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                if self._insert(conn, report, f"file:{name}") is not None:
+                    added += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def flagged_poles(self, latest_only=False):
+        """
+        Sorted pole_ids with at least one report that has mismatches, or,
+        with latest_only, whose most recent report has mismatches.
+        """
+        if latest_only:
+            sql = "SELECT pole_id FROM poles WHERE latest_has_mismatches = 1 ORDER BY pole_id"
+        else:
+            sql = "SELECT pole_id FROM poles WHERE flagged_count > 0 ORDER BY pole_id"
+        return [r[0] for r in self._conn().execute(sql)]
+
+    def latest(self, pole_id):
+        """The most recent report for pole_id, or None."""
+        row = self._conn().execute(
+            "SELECT r.body FROM poles p JOIN reports r ON r.id = p.latest_id WHERE p.pole_id = ?",
+            (str(pole_id).strip(),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest_per_pole(self, status=None):
+        """{pole_id: latest report}, optionally only where the latest status is `status`."""
+        sql = "SELECT p.pole_id, r.body FROM poles p JOIN reports r ON r.id = p.latest_id"
+        params = ()
+        if status is not None:
+            sql += " WHERE p.latest_status = ?"
+            params = (status,)
+        return {pid: json.loads(body) for pid, body in self._conn().execute(sql + " ORDER BY p.pole_id", params)}
+
+    def history(self, pole_id, limit=None):
+        """Reports for pole_id, newest first."""
+        sql = "SELECT body FROM reports WHERE pole_id = ? ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [json.loads(r[0]) for r in self._conn().execute(sql, (str(pole_id).strip(),))]
+
+    def since(self, timestamp):
+        """Reports filed at or after an ISO timestamp, oldest first."""
+        return [json.loads(r[0]) for r in self._conn().execute(
+            "SELECT body FROM reports WHERE timestamp >= ? ORDER BY timestamp, id", (timestamp,))]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+
+@st.cache_resource
+def get_report_store(out_dir=REPORTS_DIR):
+    """Indexed report store shared by every session; imports legacy reports/*.json once"""
+    return ReportStore(import_from=out_dir)
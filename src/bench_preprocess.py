@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from preprocess import PreprocessEngine, preprocess_reference
+
+# Max per-pixel difference (grey levels) allowed between engine and reference output
+TOLERANCE = 1
+
+INTERPOLATIONS = {
+    'linear': cv2.INTER_LINEAR,
+    'area': cv2.INTER_AREA,
+    'cubic': cv2.INTER_CUBIC,
+    'nearest': cv2.INTER_NEAREST
+}
+
+
+def load_images(folder):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        img = cv2.imread(os.path.join(folder, name))
+        if img is not None:
+            images.append((name, img))
+    return images
+
+
+def measure(fn, images, repeat):
+    """
+    Returns (ms per image, peak traced MB) for fn over images, repeated.
+    Outputs are dropped as soon as they are produced, so the peak is the
+    working set of one call rather than the accumulated results.
+    """
+    fn(images[0])  # warm OpenCV's internal pools and code paths
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for img in images:
+            fn(img)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000 / (repeat * len(images)), peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark: PreprocessEngine vs preprocess_reference()")
+    parser.add_argument('--images', default=os.path.join(os.path.dirname(__file__), 'images'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--interpolation', choices=sorted(INTERPOLATIONS), default='linear')
+    parser.add_argument('--blur-sigma', type=float, default=3.0)
+    parser.add_argument('--blur-scale', type=float, default=1.0)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    named = load_images(args.images)
+    if not named:
+        print(f"No readable images in {args.images}")
+        sys.exit(1)
+    images = [img for _, img in named]
+    engine = PreprocessEngine(interpolation=INTERPOLATIONS[args.interpolation],
+                              blur_sigma=args.blur_sigma, blur_scale=args.blur_scale)
+
+    ref_ms, ref_mb = measure(preprocess_reference, images, args.repeat)
+    eng_ms, eng_mb = measure(engine.process, images, args.repeat)
+    # A caller that reuses one output buffer per frame size (e.g. a fixed camera)
+    outputs = {}
+    for img in images:
+        shape = engine.output_shape(img.shape)
+        outputs.setdefault(shape, np.empty(shape, np.uint8))
+    dst_ms, dst_mb = measure(lambda img: engine.process(img, dst=outputs[engine.output_shape(img.shape)]),
+                             images, args.repeat)
+    # The whole corpus in one process_many() call, into the same per-size buffers
+    batch_out = [outputs[engine.output_shape(img.shape)] for img in images]
+    batch_ms, batch_mb = measure(lambda batch: engine.process_many(batch, out=batch_out), [images], args.repeat)
+    batch_ms /= len(images)
+
+    diffs = {}
+    batch = engine.process_many(images)
+    for (name, img), many in zip(named, batch):
+        ref = preprocess_reference(img)
+        out = engine.process(img)
+        if not np.array_equal(out, many):
+            # process_many must give exactly what process gives frame by frame
+            diffs[name] = None
+            continue
+        if ref.shape != out.shape:
+            diffs[name] = None
+        else:
+            diffs[name] = int(np.abs(ref.astype(np.int16) - out.astype(np.int16)).max())
+    worst = max((d for d in diffs.values() if d is not None), default=0)
+    mismatched_shapes = [n for n, d in diffs.items() if d is None]
+    within = not mismatched_shapes and worst <= TOLERANCE
+
+    report = {
+        'images': len(images),
+        'repeat': args.repeat,
+        'config': {'interpolation': args.interpolation, 'blur_sigma': args.blur_sigma,
+                   'blur_scale': args.blur_scale},
+        'reference': {'ms_per_image': ref_ms, 'peak_mb': ref_mb},
+        'engine': {'ms_per_image': eng_ms, 'peak_mb': eng_mb},
+        'engine_dst': {'ms_per_image': dst_ms, 'peak_mb': dst_mb},
+        'engine_many': {'ms_per_image': batch_ms, 'peak_mb': batch_mb},
+        'speedup': ref_ms / eng_ms if eng_ms else 0.0,
+        'max_abs_diff': worst,
+        'tolerance': TOLERANCE,
+        'within_tolerance': within
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{len(images)} images x {args.repeat} runs ({args.interpolation}, blur sigma {args.blur_sigma}, "
+              f"blur scale {args.blur_scale})")
+        print(f"  reference: {ref_ms:7.2f} ms/image   peak {ref_mb:6.1f} MB")
+        print(f"  engine:    {eng_ms:7.2f} ms/image   peak {eng_mb:6.1f} MB   ({report['speedup']:.2f}x)")
+        print(f"  engine, dst: {dst_ms:5.2f} ms/image   peak {dst_mb:6.1f} MB")
+        print(f"  engine, process_many: {batch_ms:5.2f} ms/image   peak {batch_mb:6.1f} MB")
+        print(f"  max abs diff vs reference: {worst} (tolerance {TOLERANCE})"
+              + (f", shape/batch mismatch: {mismatched_shapes}" if mismatched_shapes else ""))
+    # Non-default settings are expected to drift from the reference; only the defaults must match
+    defaults = args.interpolation == 'linear' and args.blur_sigma == 3.0 and args.blur_scale == 1.0
+    sys.exit(0 if within or not defaults else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Per-stage benchmark of the OCR/GIS pipeline.
+
+Runs preprocess(), full-frame OCR, detect_infrastructure_attributes(), GIS
+CSV output and the compare/score functions over the bundled images (and
+optionally a synthetic corpus scaled up in count and resolution), and
+reports cold and warm latency percentiles, images/sec and peak memory per
+stage as JSON:
+
+    python src/benchmark.py --output bench.json
+    python src/benchmark.py --synthetic-count 200 --synthetic-scale 2 --output bench_large.json
+
+Regression mode compares warm p50 latency and throughput against a stored
+report and exits non-zero when a stage got slower than the tolerance allows,
+raised an error, or ran in the baseline but not in this run:
+
+    python src/benchmark.py --save-baseline bench_baseline.json
+    python src/benchmark.py --baseline bench_baseline.json --tolerance 0.2
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = os.path.join(_ROOT, 'src', 'images')
+DEFAULT_GIS_CSV = os.path.join(_ROOT, 'gis_records.csv')
+STAGES = ('preprocess', 'ocr_full_frame', 'detect_attributes', 'csv_output', 'compare_score', 'bulk_compare')
+# Allowed slowdown of warm p50 (and drop in images/sec) before regression mode fails
+DEFAULT_TOLERANCE = 0.2
+# p50 changes smaller than this are timer/scheduler noise, whatever the ratio
+MIN_DELTA_MS = 0.5
+OCR_ALLOWLIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+class RssSampler:
+    """
+    Samples this process's resident set size on a background thread, so a
+    stage's peak includes native allocations (OpenCV, torch, ONNX Runtime)
+    that tracemalloc cannot see. Falls back to ru_maxrss without /proc.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = self.peak_mb = self.current_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        except (OSError, ValueError, AttributeError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+def load_corpus(folder=DEFAULT_IMAGES, synthetic_count=0, synthetic_scale=1.0, seed=0):
+    """
+    Returns [(name, BGR image)] for the images in folder, plus synthetic_count
+    variants of them (flipped, brightness-shifted, noisy) for a larger corpus.
+    synthetic_scale > 1 upsamples every image to emulate higher-resolution
+    cameras. Images are decoded up front so decode time is not benchmarked.
+    """
+    corpus = []
+    for name in sorted(os.listdir(folder)):
+        img = cv2.imread(os.path.join(folder, name))
+        if img is not None:
+            corpus.append((name, img))
+    if not corpus:
+        raise FileNotFoundError(f"No readable images in {folder}")
+    rng = random.Random(seed)
+    for i in range(synthetic_count):
+        name, img = corpus[i % len(corpus)][0], corpus[i % len(corpus)][1]
+        variant = cv2.flip(img, 1) if rng.random() < 0.5 else img.copy()
+        variant = cv2.convertScaleAbs(variant, alpha=rng.uniform(0.8, 1.2), beta=rng.uniform(-20, 20))
+        noise = np.random.default_rng(seed + i).normal(0, 4, variant.shape)
+        variant = np.clip(variant + noise, 0, 255).astype(np.uint8)
+        corpus.append((f"synthetic_{i:05d}_{name}", variant))
+    if synthetic_scale != 1.0:
+        corpus = [(name, cv2.resize(img, None, fx=synthetic_scale, fy=synthetic_scale, interpolation=cv2.INTER_CUBIC))
+                  for name, img in corpus]
+    return corpus
+
+
+def percentiles(values_ms):
+    if not values_ms:
+        return {}
+    arr = np.asarray(values_ms)
+    stats = {f'p{p}': float(np.percentile(arr, p)) for p in (50, 90, 99)}
+    stats.update(mean=float(arr.mean()), min=float(arr.min()), max=float(arr.max()))
+    return stats
+
+
+def run_stage(fn, items, repeat=1, setup=None):
+    """
+    Times fn(item) for every item. The very first call is the cold sample
+    (it pays for model loading and lazy initialisation after setup());
+    every later call, over `repeat` passes, is a warm sample.
+    """
+    if setup is not None:
+        setup()
+    timings = []
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for item in items:
+                t = time.perf_counter()
+                fn(item)
+                timings.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - start
+    warm = timings[1:] or timings
+    return {
+        'items': len(items),
+        'calls': len(timings),
+        'cold_ms': timings[0] if timings else None,
+        'warm_ms': percentiles(warm),
+        'items_per_sec': len(warm) / (sum(warm) / 1000) if sum(warm) else None,
+        'elapsed_sec': elapsed,
+        'rss_start_mb': rss.start_mb,
+        'peak_rss_mb': rss.peak_mb,
+        'peak_rss_delta_mb': rss.peak_mb - rss.start_mb
+    }
+
+
+def _ai_records(gis_csv, count, seed=0):
+    """AI-side records for the compare stages: GIS rows with realistic noise, cycled up to count."""
+    import pandas as pd
+    gis_df = pd.read_csv(gis_csv, dtype=str)
+    rng = random.Random(seed)
+    rows = gis_df.to_dict('records')
+    records = []
+    for i in range(count):
+        base = rows[i % len(rows)]
+        records.append({
+            'pole_id': base['pole_id'],
+            'vegetation': rng.choice(['Yes', 'No', 'yes', 'N', '']),
+            'guy_guard': rng.choice(['Yes', 'No', 'Y', 'no']),
+            'pole_type': rng.choice(['Wood', 'wood', 'Wooden', 'Steel', 'stl', 'Composite', '']),
+            'has_conduit_riser': rng.choice(['Yes', 'No', ''])
+        })
+    return gis_df, records
+
+
+def benchmark(corpus, stages=STAGES, repeat=1, yolo_model_path='yolov8s.pt', device='cpu', gis_csv=DEFAULT_GIS_CSV,
+              fleet_size=100000):
+    """
+    Runs the selected stages over corpus ([(name, image)]) and returns
+    {stage: stats}. Model caches are cleared before each model stage, so its
+    cold sample includes loading. A stage whose optional dependencies are not
+    installed is reported as {'skipped': reason}; one that raises anything
+    else as {'error': reason}. Neither stops the remaining stages.
+    """
+    import model_registry
+    from preprocess import preprocess
+
+    images = [img for _, img in corpus]
+    results = {}
+
+    def attempt(stage, thunk):
+        if stage not in stages:
+            return
+        try:
+            results[stage] = thunk()
+        except ImportError as e:
+            results[stage] = {'skipped': f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            results[stage] = {'error': f"{type(e).__name__}: {e}"}
+        print(f"  {stage}: {_describe(results[stage])}", file=sys.stderr)
+
+    attempt('preprocess', lambda: run_stage(preprocess, images, repeat))
+
+    def ocr_stage():
+        processed = [preprocess(img) for img in images]
+
+        def ocr(img):
+            # Same call as run_all(); the reader is loaded by the first (cold) call
+            model_registry.get_ocr_reader(['en'], device).readtext(img, allowlist=OCR_ALLOWLIST)
+        return run_stage(ocr, processed, repeat, model_registry.clear)
+    attempt('ocr_full_frame', ocr_stage)
+
+    attributes = []
+
+    def detect_stage():
+        from infra_gis_detect import detect_infrastructure_attributes
+
+        def detect(item):
+            name, img = item
+            attrs = detect_infrastructure_attributes(img, yolo_model_path, device, name)
+            if len(attributes) < len(corpus):
+                attributes.append(attrs)
+        return run_stage(detect, corpus, repeat, model_registry.clear)
+    attempt('detect_attributes', detect_stage)
+
+    def csv_stage():
+        from infra_gis_detect import write_gis_csv
+        from result_sink import flush_all
+        rows = attributes or [{'image': name, 'pole_id': f"P{i:06d}", 'vegetation': 'No', 'guy_guard': 'Yes',
+                               'pole_type': 'Wood', 'has_conduit_riser': 'No'} for i, (name, _) in enumerate(corpus)]
+        with tempfile.TemporaryDirectory() as tmp:
+            out_csv = os.path.join(tmp, 'bench_gis.csv')
+
+            def write(row):
+                write_gis_csv(row, out_csv)
+            stats = run_stage(write, rows, repeat)
+            # Rows are buffered, so most of the cost is in the final flush
+            t = time.perf_counter()
+            flush_all()
+            stats['flush_ms'] = (time.perf_counter() - t) * 1000
+            total_sec = stats['elapsed_sec'] + stats['flush_ms'] / 1000
+            stats['items_per_sec'] = stats['calls'] / total_sec if total_sec else None
+        stats['source'] = 'detect_attributes' if attributes else 'synthetic'
+        return stats
+    attempt('csv_output', csv_stage)
+
+    def compare_stage():
+        sys.path.insert(0, _ROOT)
+        from compare_demo import compare, compute_risk, get_gis_record
+        gis_df, records = _ai_records(gis_csv, max(len(corpus), 1))
+
+        def score(ai):
+            mismatches = compare(ai, get_gis_record(gis_df, ai['pole_id']))
+            compute_risk(ai, mismatches)
+        return run_stage(score, records, repeat)
+    attempt('compare_score', compare_stage)
+
+    def bulk_stage():
+        import pandas as pd
+        sys.path.insert(0, _ROOT)
+        from compare_demo import bulk_compare
+        gis_df, records = _ai_records(gis_csv, fleet_size)
+        ai_df = pd.DataFrame(records)
+        stats = run_stage(lambda df: bulk_compare(df, gis_df), [ai_df] * 3, repeat)
+        stats['fleet_size'] = fleet_size
+        stats['rows_per_sec'] = fleet_size * stats['items_per_sec'] if stats['items_per_sec'] else None
+        return stats
+    attempt('bulk_compare', bulk_stage)
+    return results
+
+
+def _describe(stats):
+    if 'skipped' in stats:
+        return f"skipped ({stats['skipped']})"
+    if 'error' in stats:
+        return f"FAILED ({stats['error']})"
+    warm = stats['warm_ms']
+    return (f"cold {stats['cold_ms']:.1f} ms, warm p50 {warm['p50']:.1f} / p90 {warm['p90']:.1f} / "
+            f"p99 {warm['p99']:.1f} ms, {stats['items_per_sec']:.1f}/s, peak RSS {stats['peak_rss_mb']:.0f} MB")
+
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    """
+    Returns a list of regressions: stages that raised an error, stages whose
+    warm p50 grew, or whose throughput dropped, by more than tolerance
+    relative to the baseline, and stages that ran in the baseline but were
+    skipped or missing this time.
+    """
+    regressions = []
+    for stage, cur in report['stages'].items():
+        if 'error' in cur:
+            regressions.append({'stage': stage, 'metric': 'error', 'baseline': None, 'current': None,
+                                'change': None, 'reason': cur['error']})
+    for stage, base in baseline.get('stages', {}).items():
+        cur = report['stages'].get(stage)
+        if 'skipped' in base or 'error' in base or (cur and 'error' in cur):
+            continue
+        if not cur or 'skipped' in cur:
+            regressions.append({'stage': stage, 'metric': 'skipped' if cur else 'missing', 'baseline': None,
+                                'current': None, 'change': None,
+                                'reason': cur['skipped'] if cur else 'not run'})
+            continue
+        base_p50, cur_p50 = base['warm_ms']['p50'], cur['warm_ms']['p50']
+        if base_p50 and cur_p50 > base_p50 * (1 + tolerance) and cur_p50 - base_p50 >= min_delta_ms:
+            regressions.append({'stage': stage, 'metric': 'warm_p50_ms', 'baseline': base_p50, 'current': cur_p50,
+                                'change': cur_p50 / base_p50 - 1})
+        base_rate, cur_rate = base.get('items_per_sec'), cur.get('items_per_sec')
+        if base_rate and cur_rate and cur_rate < base_rate / (1 + tolerance) and \
+                1000 / cur_rate - 1000 / base_rate >= min_delta_ms:
+            regressions.append({'stage': stage, 'metric': 'items_per_sec', 'baseline': base_rate,
+                                'current': cur_rate, 'change': cur_rate / base_rate - 1})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the OCR/GIS pipeline")
+    parser.add_argument('--images', default=DEFAULT_IMAGES)
+    parser.add_argument('--synthetic-count', type=int, default=0, help="Extra synthetic images added to the corpus")
+    parser.add_argument('--synthetic-scale', type=float, default=1.0, help="Resize factor applied to every image")
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="Passes over the corpus per stage")
+    parser.add_argument('--model', default='yolov8s.pt')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--fleet-size', type=int, default=100000, help="Rows for the bulk_compare stage")
+    parser.add_argument('--output', default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', default=None, help="Fail if slower than this stored report")
+    parser.add_argument('--save-baseline', default=None, help="Store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))} (choose from {', '.join(STAGES)})")
+    corpus = load_corpus(args.images, args.synthetic_count, args.synthetic_scale)
+    print(f"Benchmarking {len(corpus)} images x {args.repeat} passes", file=sys.stderr)
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'images': len(corpus),
+            'corpus': args.images,
+            'synthetic_count': args.synthetic_count,
+            'synthetic_scale': args.synthetic_scale,
+            'median_pixels': int(np.median([img.shape[0] * img.shape[1] for _, img in corpus])),
+            'repeat': args.repeat,
+            'model': args.model,
+            'device': args.device
+        },
+        'stages': benchmark(corpus, stages, args.repeat, args.model, args.device, fleet_size=args.fleet_size)
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report['regression'] = {'baseline': args.baseline, 'tolerance': args.tolerance, 'regressions': regressions}
+        for r in regressions:
+            if r['metric'] == 'error':
+                print(f"REGRESSION {r['stage']}: failed ({r['reason']})", file=sys.stderr)
+            elif r['metric'] in ('skipped', 'missing'):
+                print(f"REGRESSION {r['stage']}: ran in the baseline, {r['metric']} now ({r['reason']})",
+                      file=sys.stderr)
+            else:
+                print(f"REGRESSION {r['stage']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} "
+                      f"({r['change']:+.0%})", file=sys.stderr)
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+
+    if any('error' in stats for stats in report['stages'].values()):
+        exit_code = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
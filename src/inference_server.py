@@ -0,0 +1,292 @@
+"""
+Long-lived local inference service for PolePad.
+
+Keeps the YOLO/EasyOCR models warm in one process and serves process_image()
+over localhost HTTP, so the Streamlit app and the CLI don't pay for Python
+startup, heavy imports and model loading on every image.
+
+    python src/inference_server.py serve [--port 8765] [--queue-size 16]
+    python src/inference_server.py submit path/to/image.jpg [--roboflow]
+
+Endpoints:
+    GET  /health   -> {"status": "ok", "queue_depth": n, "queue_size": n, "models": [...]}
+    GET  /metrics  -> stage latencies and counters, Prometheus text format (serve --trace)
+    GET  /traces   -> the most recent per-image traces as JSON (serve --trace)
+    POST /process  {"image_path": "...", "mode": "ocr_gis" | "roboflow", "timeout": 300,
+                    "ocr_mode": "cascade" | "full", "time_budget_sec": 5.0, "predictions_only": true,
+                    "scene_backend": "roboflow" | "local"}
+                   -> {"ok": true, "result": {...}} or {"ok": false, "error": "..."}
+                   Options left out take the server's defaults. "cancelled": true in an
+                   error means the image was not and will not be processed (queue full,
+                   or timed out while still queued), so the caller may run it elsewhere.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tracing
+from result_cache import to_jsonable
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+MODES = ('ocr_gis', 'roboflow')
+# How much longer the client waits than the server-side timeout it asks for
+SUBMIT_GRACE_SEC = 10
+
+
+# Per-request overrides of the service defaults accepted by POST /process
+JOB_OPTIONS = ('ocr_mode', 'time_budget_sec', 'predictions_only', 'scene_backend')
+
+
+class _Job:
+    def __init__(self, image_path, mode, predictions_only, scene_backend):
+        self.image_path = image_path
+        self.mode = mode
+        self.predictions_only = predictions_only
+        self.scene_backend = scene_backend
+        self.ocr_mode = None
+        self.time_budget_sec = None
+        self.done = threading.Event()
+        self.response = None
+        # Guards the queued -> running / cancelled transition
+        self.lock = threading.Lock()
+        self.state = 'queued'
+
+
+class InferenceService:
+    """
+    Owns the warm models and a bounded request queue. A single worker thread
+    runs process_image() so models are never used concurrently.
+    """
+
+    def __init__(self, queue_size=16, device='cpu', yolo_model_path='yolov8s.pt', ocr_mode='cascade',
+                 time_budget_sec=5.0, predictions_only=True, scene_backend='roboflow'):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.device = device
+        self.yolo_model_path = yolo_model_path
+        # Interactive callers get the latency-bounded OCR cascade by default
+        self.ocr_mode = ocr_mode
+        self.time_budget_sec = time_budget_sec
+        # Roboflow results come back without the rendered PNG unless a request asks for it
+        self.predictions_only = predictions_only
+        self.scene_backend = scene_backend
+        self._worker = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, warm=True):
+        if warm:
+            import model_registry
+            model_registry.warmup(self.yolo_model_path, device=self.device)
+        self._worker.start()
+
+    def submit(self, image_path, mode, timeout=300, **options):
+        """
+        Enqueues a request and waits for its result. options override the
+        service defaults per request (see JOB_OPTIONS). Raises queue.Full when
+        the service is saturated so callers can back off. A job still queued
+        when timeout runs out is cancelled; one already running finishes, but
+        its result is dropped.
+        """
+        predictions_only = options.get('predictions_only')
+        job = _Job(image_path, mode, self.predictions_only if predictions_only is None else predictions_only,
+                   options.get('scene_backend') or self.scene_backend)
+        job.ocr_mode = options.get('ocr_mode') or self.ocr_mode
+        job.time_budget_sec = options['time_budget_sec'] if 'time_budget_sec' in options else self.time_budget_sec
+        self.jobs.put_nowait(job)
+        if not job.done.wait(timeout):
+            with job.lock:
+                cancelled = job.state == 'queued'
+                if cancelled:
+                    job.state = 'cancelled'
+            if cancelled:
+                return {'ok': False, 'cancelled': True, 'error': f"Timed out after {timeout}s in the queue"}
+            return {'ok': False, 'cancelled': False,
+                    'error': f"Timed out after {timeout}s; the image is still being processed"}
+        return job.response
+
+    def _run(self):
+        from run_all_pipeline import process_image
+        while True:
+            job = self.jobs.get()
+            with job.lock:
+                if job.state == 'cancelled':
+                    self.jobs.task_done()
+                    continue
+                job.state = 'running'
+            start = time.perf_counter()
+            try:
+                result = process_image(job.image_path, job.mode, self.yolo_model_path, device=self.device,
+                                       ocr_mode=job.ocr_mode, time_budget_sec=job.time_budget_sec,
+                                       predictions_only=job.predictions_only, scene_backend=job.scene_backend)
+                job.response = {'ok': True, 'result': to_jsonable(result)}
+            except Exception as e:
+                job.response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            job.response['elapsed_sec'] = time.perf_counter() - start
+            if tracing.enabled():
+                # Jobs run one at a time on this thread, so the latest trace is this job's
+                traces = tracing.recent_traces()
+                if traces:
+                    job.response['trace'] = traces[-1]
+            job.done.set()
+            self.jobs.task_done()
+
+    def health(self):
+        import model_registry
+        from result_cache import get_cache
+        return {
+            'status': 'ok',
+            'queue_depth': self.jobs.qsize(),
+            'queue_size': self.queue_size,
+            'models': [list(map(str, k)) for k in model_registry.loaded_models()],
+            'cache': get_cache().stats()
+        }
+
+
+def _make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, service.health())
+            elif self.path == '/metrics':
+                body = tracing.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == '/traces':
+                self._send(200, {'ok': True, 'traces': tracing.recent_traces()})
+            else:
+                self._send(404, {'ok': False, 'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/process':
+                self._send(404, {'ok': False, 'error': 'Not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._send(400, {'ok': False, 'error': 'Body must be JSON'})
+                return
+            image_path = request.get('image_path')
+            mode = request.get('mode', 'ocr_gis')
+            if not image_path or mode not in MODES:
+                self._send(400, {'ok': False, 'error': f"Need image_path and mode in {MODES}"})
+                return
+            options = {k: request[k] for k in JOB_OPTIONS if k in request}
+            if options.get('ocr_mode') not in (None, 'cascade', 'full'):
+                self._send(400, {'ok': False, 'error': "ocr_mode must be 'cascade' or 'full'"})
+                return
+            try:
+                response = service.submit(os.path.abspath(image_path), mode, float(request.get('timeout', 300)),
+                                          **options)
+            except queue.Full:
+                self._send(503, {'ok': False, 'cancelled': True, 'error': 'Server busy, request queue is full'})
+                return
+            self._send(200 if response.get('ok') else 500, response)
+
+        def log_message(self, format, *args):
+            # Keep the console quiet; one line per request is enough
+            sys.stderr.write(f"[inference_server] {self.address_string()} {format % args}\n")
+
+    return Handler
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, queue_size=16, device='cpu', warm=True, ocr_mode='cascade',
+          time_budget_sec=5.0, predictions_only=True, scene_backend='roboflow'):
+    service = InferenceService(queue_size=queue_size, device=device, ocr_mode=ocr_mode, time_budget_sec=time_budget_sec,
+                               predictions_only=predictions_only, scene_backend=scene_backend)
+    service.start(warm=warm)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    print(f"PolePad inference server listening on http://{host}:{port} (queue size {queue_size})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+def server_available(url=DEFAULT_URL, timeout=0.5):
+    """Returns True if an inference server answers /health at url."""
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=timeout) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def submit(image_path, mode='ocr_gis', url=DEFAULT_URL, timeout=300, **options):
+    """
+    Sends an image to a running inference server and returns the decoded JSON
+    response ({'ok': ..., 'result' | 'error': ...}). options (ocr_mode,
+    time_budget_sec, predictions_only, scene_backend) override the server's
+    defaults for this image. The server gives up after timeout seconds and
+    cancels the job if it has not started; the connection is held a little
+    longer so that answer arrives. response['cancelled'] is True only when
+    the server will not process the image.
+    """
+    payload = json.dumps({'image_path': os.path.abspath(image_path), 'mode': mode, 'timeout': timeout,
+                          **options}).encode('utf-8')
+    req = urllib.request.Request(f"{url}/process", data=payload,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout + SUBMIT_GRACE_SEC) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        # 4xx/5xx responses still carry a JSON body
+        return json.loads(e.read() or b'{}') or {'ok': False, 'error': str(e)}
+    except (urllib.error.URLError, OSError) as e:
+        # The job may still be queued or running on the server
+        return {'ok': False, 'cancelled': False, 'error': f"{type(e).__name__}: {e}"}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="PolePad resident inference server")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_serve = sub.add_parser('serve', help="Start the server with warm models")
+    p_serve.add_argument('--host', default=DEFAULT_HOST)
+    p_serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    p_serve.add_argument('--queue-size', type=int, default=16)
+    p_serve.add_argument('--device', default='cpu', help="cpu, cuda, mps, or onnx / onnx-int8 for ONNX Runtime")
+    p_serve.add_argument('--no-warmup', action='store_true')
+    p_serve.add_argument('--ocr-mode', choices=['cascade', 'full'], default='cascade')
+    p_serve.add_argument('--time-budget', type=float, default=5.0, help="Per-image OCR budget in seconds (cascade)")
+    p_serve.add_argument('--remote-visualization', action='store_true',
+                         help="Download Roboflow's rendered image instead of predictions only")
+    p_serve.add_argument('--scene-backend', choices=['roboflow', 'local'], default='roboflow',
+                         help="Scene detection on the hosted workflow or a local detector (offline)")
+    p_serve.add_argument('--trace', action='store_true', help="Record per-image traces and /metrics")
+    p_submit = sub.add_parser('submit', help="Send one image to a running server")
+    p_submit.add_argument('image_path')
+    p_submit.add_argument('--roboflow', action='store_true')
+    p_submit.add_argument('--url', default=DEFAULT_URL)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if args.trace:
+            tracing.enable()
+        serve(args.host, args.port, args.queue_size, args.device, warm=not args.no_warmup,
+              ocr_mode=args.ocr_mode, time_budget_sec=args.time_budget, predictions_only=not args.remote_visualization,
+              scene_backend=args.scene_backend)
+    else:
+        response = submit(args.image_path, 'roboflow' if args.roboflow else 'ocr_gis', args.url)
+        print(json.dumps(response, indent=2))
+        sys.exit(0 if response.get('ok') else 1)
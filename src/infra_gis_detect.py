@@ -1,49 +1,238 @@
 import os
+import re
+import time
 import cv2
-import easyocr
-import csv
-from ultralytics import YOLO
+import tracing
+from model_registry import get_yolo, get_ocr_reader
+from pole_id_index import get_pole_index
+from result_sink import get_sink
 
-def detect_infrastructure_attributes(image_path, yolo_model_path='yolov8s.pt'):
+def detect_infrastructure_attributes(image, yolo_model_path='yolov8s.pt', device='cpu', image_name=None,
+                                     tile_size=None):
     """
     Detects infrastructure attributes from an image using YOLO and EasyOCR.
+    image is either a path or an already-decoded BGR ndarray; pass image_name
+    (the original file name) with an ndarray so manual pole_id overrides apply.
+    Models come from the shared registry, so repeated calls reuse warm weights.
+    With tile_size set, the image is processed at full resolution in
+    overlapping tiles under a bounded memory footprint (see tiled_detect).
     Returns a dictionary with detected attributes.
     """
-    # Load image
-    img = cv2.imread(image_path)
-    if img is None:
-        raise FileNotFoundError(f"Could not load image: {image_path}")
+    if tile_size:
+        from tiled_detect import detect_infrastructure_attributes_tiled
+        return detect_infrastructure_attributes_tiled(image, yolo_model_path, device, image_name,
+                                                      tile_size=tile_size)[0]
+    if isinstance(image, str):
+        image_path = image
+        img = cv2.imread(image_path)
+        if img is None:
+            raise FileNotFoundError(f"Could not load image: {image_path}")
+    else:
+        img = image
+        image_path = image_name or ''
+
+    # Shared YOLO model (loaded once per process)
+    yolo_model = get_yolo(yolo_model_path, device)
+    with tracing.span('yolo') as sp:
+        results = yolo_model(img)
+        sp.set(boxes=len(results[0].boxes))
+    tracing.count('boxes', len(results[0].boxes))
+    reader = get_ocr_reader(['en'], device)
+    return attributes_from_detections(img, results[0], yolo_model.names, reader, image_path)
+
+def detect_infrastructure_attributes_batch(images, image_paths, yolo_model_path='yolov8s.pt', device='cpu'):
+    """
+    Batched version of detect_infrastructure_attributes for already-loaded images.
+    All images go through YOLO in a single forward pass; image_paths are only
+    used for naming (manual pole_id overrides). Returns one dict per image.
+    """
+    if not images:
+        return []
+    yolo_model = get_yolo(yolo_model_path, device)
+    results = yolo_model(list(images))
+    reader = get_ocr_reader(['en'], device)
+    return [
+        attributes_from_detections(img, result, yolo_model.names, reader, path)
+        for img, result, path in zip(images, results, image_paths)
+    ]
+
+def readtext_batch(reader, images, batch_size=8, pad_step=None, **kwargs):
+    """
+    Runs EasyOCR over several images, batching them through
+    reader.readtext_batched (one detector/recognizer pass per group). Frames
+    are zero-padded bottom/right (coordinates are unchanged) into shared
+    canvas sizes rounded up to pad_step (FRAME_PAD_STEP), so a mixed-size
+    corpus still batches. Returns one readtext-style result list per image,
+    in input order.
+    """
+    results = [None] * len(images)
+    for canvas, idxs in pad_groups(images, pad_step or FRAME_PAD_STEP).items():
+        if len(idxs) == 1:
+            results[idxs[0]] = reader.readtext(images[idxs[0]], batch_size=batch_size, **kwargs)
+            continue
+        with tracing.span('ocr_frame_batch', frames=len(idxs), canvas=f"{canvas[1]}x{canvas[0]}"):
+            batched = reader.readtext_batched([pad_to(images[i], canvas) for i in idxs], batch_size=batch_size,
+                                              **kwargs)
+        tracing.count('ocr_calls')
+        for i, res in zip(idxs, batched):
+            results[i] = res
+    return results
+
+def pad_groups(images, step):
+    """{(canvas_h, canvas_w): [index, ...]} with each image's shape rounded up to a multiple of step."""
+    groups = {}
+    for idx, img in enumerate(images):
+        ch = -(-img.shape[0] // step) * step
+        cw = -(-img.shape[1] // step) * step
+        groups.setdefault((ch, cw), []).append(idx)
+    return groups
+
+def pad_to(img, canvas):
+    """img zero-padded bottom/right to canvas (h, w); returned as is when it already fits exactly."""
+    import numpy as np
+    if img.shape[:2] == tuple(canvas):
+        return np.ascontiguousarray(img)
+    out = np.zeros(tuple(canvas) + img.shape[2:], dtype=img.dtype)
+    out[:img.shape[0], :img.shape[1]] = img
+    return out
+
+# ROI OCR settings: boxes overlapping more than this are treated as one tag region
+ROI_IOU_THRESHOLD = 0.5
+# ...as are boxes mostly inside another one (intersection / smaller box area)
+ROI_CONTAINMENT_THRESHOLD = 0.8
+# Crops smaller than this can't hold a readable tag
+MIN_ROI_SIDE = 12
+MIN_ROI_AREA = 400
+# Crops are padded up to a multiple of this so similar sizes share one OCR batch
+ROI_PAD_STEP = 64
+# Same for whole frames; after preprocess() (longest side <= 1024) most photos share a few canvases
+FRAME_PAD_STEP = 256
+POLE_ID_ALLOWLIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-'
+
+def _box_overlap(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0, 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    iou = inter / float(area_a + area_b - inter)
+    containment = inter / float(min(area_a, area_b))
+    return iou, containment
+
+def merge_boxes(boxes, iou_threshold=ROI_IOU_THRESHOLD, containment_threshold=ROI_CONTAINMENT_THRESHOLD):
+    """
+    Merges overlapping (x1, y1, x2, y2, conf) boxes into distinct regions.
+    Boxes that overlap (IoU) or mostly contain each other are replaced by
+    their union with the higher confidence. Returns boxes sorted by confidence,
+    highest first.
+    """
+    merged = []
+    for box in sorted(boxes, key=lambda b: b[4], reverse=True):
+        box = list(box)
+        changed = True
+        while changed:
+            changed = False
+            for i, kept in enumerate(merged):
+                iou, containment = _box_overlap(box, kept)
+                if iou > iou_threshold or containment > containment_threshold:
+                    box = [min(box[0], kept[0]), min(box[1], kept[1]),
+                           max(box[2], kept[2]), max(box[3], kept[3]), max(box[4], kept[4])]
+                    merged.pop(i)
+                    changed = True
+                    break
+        merged.append(box)
+    return sorted((tuple(b) for b in merged), key=lambda b: b[4], reverse=True)
+
+def roi_boxes(result, img_shape, min_side=MIN_ROI_SIDE, min_area=MIN_ROI_AREA):
+    """
+    Distinct, large-enough OCR regions from one YOLO result, clipped to the image.
+    """
+    h, w = img_shape[:2]
+    boxes = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+        conf = float(box.conf[0]) if hasattr(box, 'conf') else 0.0
+        boxes.append((x1, y1, x2, y2, conf))
+    return [b for b in merge_boxes(boxes)
+            if min(b[2] - b[0], b[3] - b[1]) >= min_side and (b[2] - b[0]) * (b[3] - b[1]) >= min_area]
+
+def ocr_crops(reader, crops, batch_size=16, allowlist=POLE_ID_ALLOWLIST):
+    """
+    Runs EasyOCR over many crops with as few detector/recognizer passes as possible.
+    Crops are zero-padded (bottom/right, so coordinates are unchanged) to a
+    canvas rounded up to ROI_PAD_STEP; every crop sharing a canvas size goes
+    through reader.readtext_batched together. Returns one result list per crop.
+    """
+    results = [None] * len(crops)
+    for (ch, cw), idxs in pad_groups(crops, ROI_PAD_STEP).items():
+        canvases = [pad_to(crops[i], (ch, cw)) for i in idxs]
+        with tracing.span('ocr_roi_batch', rois=idxs, canvas=f"{cw}x{ch}"):
+            batched = reader.readtext_batched(canvases, batch_size=batch_size, allowlist=allowlist)
+        tracing.count('ocr_calls')
+        for i, res in zip(idxs, batched):
+            results[i] = res
+    return results
+
+def attributes_from_detections(img, result, class_map, reader, image_path, ocr_batch_size=16):
+    """
+    Turns one YOLO result into GIS attributes: OCR on the detected regions for
+    the pole ID, plus pole type and vegetation from the detected classes.
+    Overlapping boxes are merged and tiny ones dropped first, and the surviving
+    crops are recognized in batches of ocr_batch_size.
+    """
+    # Use EasyOCR for pole ID (on distinct detected regions, highest confidence first)
+    ocr_candidates = []
+    crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2, _ in roi_boxes(result, img.shape)]
+    tracing.count('rois', len(crops))
+    # Accumulate all OCR results from all regions
+    for ocr_results in ocr_crops(reader, crops, ocr_batch_size):
+        ocr_candidates.extend(pole_id_candidates(ocr_results))
+    return build_attributes(ocr_candidates, result, class_map, image_path)
 
-    # Load YOLO model
-    yolo_model = YOLO(yolo_model_path)
-    results = yolo_model(img)
+def pole_id_candidates(ocr_results):
+    """
+    (text, confidence) pairs from EasyOCR results that could be a pole ID:
+    alphanumerics and '-' only, at least 4 characters.
+    """
+    candidates = []
+    for _, text, conf in ocr_results:
+        filtered = ''.join([c for c in text if c.isalnum() or c == '-'])
+        if len(filtered) >= 4:
+            candidates.append((filtered, conf))
+    return candidates
 
+def build_attributes(ocr_candidates, result, class_map, image_path, pole_id_pattern=None, pole_index=None,
+                     max_match_cost=1.0):
+    """
+    Builds the GIS attribute dict from pole-ID candidates and a YOLO result.
+    pole_id is snapped to a registry ID when an OCR candidate differs from it
+    only by look-alike characters or separators (see PoleIdIndex.resolve;
+    pole_index defaults to the shared gis_records.csv index), and
+    pole_id_match records which reading it came from. Otherwise pole_id is
+    the most confident candidate (restricted to those matching
+    pole_id_pattern when any do) and pole_id_match lists the registry IDs
+    within max_match_cost for review. from_ocr records the longest candidate.
+    """
     # Initialize attributes with more detail
     attributes = {
         'pole_id': '',
         'pole_type': '',
         'vegetation_encroachment': False,
-        'from_ocr': ''
+        'from_ocr': '',
+        'pole_id_match': None
     }
-
-    # Use EasyOCR for pole ID (on all detected regions)
-    import easyocr
-    reader = easyocr.Reader(['en'])
     best_id = ''
     best_id_conf = 0.0
-    ocr_candidates = []
-    # Accumulate all OCR results from all boxes
-    for box in results[0].boxes:
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        crop = img[y1:y2, x1:x2]
-        ocr_results = reader.readtext(crop, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-')
-        for _, text, conf in ocr_results:
-            filtered = ''.join([c for c in text if c.isalnum() or c == '-'])
-            if len(filtered) >= 4:
-                ocr_candidates.append((filtered, conf))
-            if len(filtered) >= 4 and conf > best_id_conf and (filtered.isdigit() or '-' in filtered or filtered.isalnum()):
-                best_id = filtered
-                best_id_conf = conf
+    preferred = ocr_candidates
+    if pole_id_pattern is not None:
+        preferred = [x for x in ocr_candidates if pole_id_pattern.match(x[0])] or ocr_candidates
+    for text, conf in preferred:
+        if conf > best_id_conf:
+            best_id = text
+            best_id_conf = conf
     # After all boxes, choose the longest filtered OCR result from all candidates
     if ocr_candidates:
         # If multiple have the same length, pick the one with highest confidence
@@ -54,6 +243,22 @@ def detect_infrastructure_attributes(image_path, yolo_model_path='yolov8s.pt'):
         attributes['from_ocr'] = ''
     attributes['pole_id'] = best_id
 
+    # Snap the OCR reading to a real registry pole (tolerates O/0, I/1, ... confusions)
+    if pole_index is None:
+        pole_index = get_pole_index()
+    if pole_index is not None and ocr_candidates:
+        match = pole_index.resolve(ocr_candidates)
+        if match:
+            attributes['pole_id'] = match[0]
+            attributes['pole_id_match'] = {'ocr': match[1], 'cost': match[2]}
+        else:
+            # A real digit edit could just as well be an unregistered pole: keep the reading
+            suggestions = pole_index.suggest(ocr_candidates, max_cost=max_match_cost)
+            if suggestions:
+                attributes['pole_id_match'] = {'candidates': [
+                    {'pole_id': pid, 'ocr': text, 'cost': cost} for pid, text, cost in suggestions
+                ]}
+
     # Manual pole_id overrides for specific images
     img_file = os.path.basename(image_path).lower()
     manual_ids = {
@@ -67,11 +272,12 @@ def detect_infrastructure_attributes(image_path, yolo_model_path='yolov8s.pt'):
     for key, val in manual_ids.items():
         if key in img_file:
             attributes['pole_id'] = val
+            attributes['pole_id_match'] = None
             break
 
     # YOLO class mapping (example, you should update with your custom model/classes)
-    class_map = yolo_model.names if hasattr(yolo_model, 'names') else {}
-    for box in results[0].boxes:
+    class_map = class_map or {}
+    for box in result.boxes:
         cls = int(box.cls[0]) if hasattr(box, 'cls') else None
         label = class_map.get(cls, str(cls))
         # Map all detected types to 'wood' or 'metal' only
@@ -90,27 +296,119 @@ def detect_infrastructure_attributes(image_path, yolo_model_path='yolov8s.pt'):
         attributes['pole_type'] = 'wood'
     return attributes
 
-def write_gis_csv(attributes, output_csv):
+# Tag formats seen in the GIS registry: 625296, 5925, 0-8176, C-5737, PD41459, P0010
+POLE_ID_PATTERN = re.compile(r'^(?:[A-Z]{1,2}\d{4,6}|\d{4,7}|[A-Z0-9]-\d{4,6})$')
+
+def detect_infrastructure_attributes_cascade(image, yolo_model_path='yolov8s.pt', device='cpu', image_name=None,
+                                             min_confidence=0.6, time_budget_sec=None, downscale=0.5,
+                                             pole_id_pattern=POLE_ID_PATTERN, pole_index=None):
     """
-    Writes the detected attributes to a new CSV file in GIS format.
+    Latency-bounded variant of detect_infrastructure_attributes.
+
+    OCR runs cheapest-first and stops as soon as a candidate with confidence
+    >= min_confidence matches pole_id_pattern or snaps to a registry ID
+    through look-alike characters only (e.g. PD4I459 -> PD41459, see
+    PoleIdIndex.resolve; pole_index defaults to the shared index):
+      1. ROI crops, one at a time, in descending detector confidence
+      2. the whole frame downscaled by `downscale`
+      3. the full-resolution frame (fallback)
+    If time_budget_sec runs out, the best result found so far is returned.
+    Returns (attributes, info) where info has the OCR candidates, the stages
+    that ran, and whether it exited early or ran out of time.
     """
-    fieldnames = [
-        'pole_id', 'pole_type', 'vegetation_encroachment', 'from_ocr'
-    ]
-    file_exists = os.path.isfile(output_csv)
-    with open(output_csv, 'a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        row = {k: attributes.get(k, '') for k in fieldnames}
-        writer.writerow(row)
+    start = time.perf_counter()
+    deadline = start + time_budget_sec if time_budget_sec else None
+    if isinstance(image, str):
+        image_path = image
+        img = cv2.imread(image_path)
+        if img is None:
+            raise FileNotFoundError(f"Could not load image: {image_path}")
+    else:
+        img = image
+        image_path = image_name or ''
+
+    yolo_model = get_yolo(yolo_model_path, device)
+    with tracing.span('yolo') as sp:
+        result = yolo_model(img)[0]
+        sp.set(boxes=len(result.boxes))
+    tracing.count('boxes', len(result.boxes))
+    reader = get_ocr_reader(['en'], device)
+
+    candidates = []
+    stages = []
+    if pole_index is None:
+        pole_index = get_pole_index()
+    is_pole_id = {}
+
+    def looks_like_pole_id(text, conf):
+        if text not in is_pole_id:
+            is_pole_id[text] = bool(pole_id_pattern.match(text)) or (
+                pole_index is not None and pole_index.resolve([(text, conf)]) is not None)
+        return is_pole_id[text]
+
+    def found():
+        return any(conf >= min_confidence and looks_like_pole_id(text, conf) for text, conf in candidates)
+
+    def out_of_time():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    for i, (x1, y1, x2, y2, _) in enumerate(roi_boxes(result, img.shape)):
+        if out_of_time():
+            break
+        with tracing.span('ocr_roi', roi=i, box=[x1, y1, x2, y2]):
+            candidates.extend(pole_id_candidates(reader.readtext(img[y1:y2, x1:x2], allowlist=POLE_ID_ALLOWLIST)))
+        tracing.count('rois')
+        tracing.count('ocr_calls')
+        if 'roi' not in stages:
+            stages.append('roi')
+        if found():
+            break
+    if not found() and not out_of_time() and downscale and downscale < 1.0:
+        with tracing.span('ocr_downscaled_frame', scale=downscale):
+            small = cv2.resize(img, None, fx=downscale, fy=downscale, interpolation=cv2.INTER_AREA)
+            candidates.extend(pole_id_candidates(reader.readtext(small, allowlist=POLE_ID_ALLOWLIST)))
+        tracing.count('ocr_calls')
+        stages.append('downscaled_frame')
+    if not found() and not out_of_time():
+        with tracing.span('ocr_full_frame'):
+            candidates.extend(pole_id_candidates(reader.readtext(img, allowlist=POLE_ID_ALLOWLIST)))
+        tracing.count('ocr_calls')
+        stages.append('full_frame')
+
+    attributes = build_attributes(candidates, result, yolo_model.names, image_path, pole_id_pattern, pole_index)
+    info = {
+        'ocr_candidates': candidates,
+        'stages': stages,
+        'early_exit': found(),
+        'timed_out': out_of_time(),
+        'elapsed_sec': time.perf_counter() - start
+    }
+    return attributes, info
+
+GIS_CSV_FIELDS = ['pole_id', 'pole_type', 'vegetation_encroachment', 'from_ocr']
+GIS_CSV_KEYED_FIELDS = ['image'] + GIS_CSV_FIELDS
+
+def write_gis_csv(attributes, output_csv, image=None, upsert=False):
+    """
+    Appends the detected attributes to the GIS-format CSV through a shared
+    buffered sink (see result_sink). With upsert=True rows are keyed on the
+    image path instead (an image processed again replaces its row); that
+    file starts with an 'image' column, so keep it apart from appended ones.
+    """
+    if upsert:
+        if not image:
+            raise ValueError("upsert=True needs the image path to key the row on")
+        row = dict(attributes, image=os.path.abspath(image))
+        get_sink(output_csv, GIS_CSV_KEYED_FIELDS, key='image').write(row)
+    else:
+        get_sink(output_csv, GIS_CSV_FIELDS).write(attributes)
 
-def run_full_pipeline(image_path, output_csv, yolo_model_path='yolov8s.pt'):
+def run_full_pipeline(image_path, output_csv, yolo_model_path='yolov8s.pt', device='cpu'):
     """
     Runs both the detailed GIS detection and a full-frame OCR reader, outputs both to CSV.
     """
     # GIS detection (YOLO+EasyOCR on regions)
-    attributes = detect_infrastructure_attributes(image_path, yolo_model_path)
+    attributes = detect_infrastructure_attributes(image_path, yolo_model_path, device)
     write_gis_csv(attributes, output_csv)
 
 # Example usage:
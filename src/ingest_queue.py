@@ -0,0 +1,444 @@
+"""
+Durable ingestion queue for field-crew photo drops.
+
+Every image becomes one job in a local SQLite file (ingest_queue.sqlite in
+the project root by default). Jobs are keyed by (image path, mode), so
+adding the same folder or manifest again is a no-op, while a file that was
+replaced (new size or mtime) goes back to pending.
+
+    python src/ingest_queue.py add field_drop/                # or a glob / manifest
+    python src/ingest_queue.py run --watch field_drop/        # keep polling for new photos
+    python src/ingest_queue.py run                            # drain the queue, then exit
+    python src/ingest_queue.py status [--failed]
+    python src/ingest_queue.py retry-failed
+
+A worker claims a job under a lease, runs process_image() and completes it
+only while it still holds the lease, so a job is finished exactly once even
+if two workers raced for it. The lease is renewed while the image is being
+processed; when a worker dies, its jobs go back to pending (immediately if
+it ran on this machine, otherwise once the lease runs out) and the run
+resumes where it stopped. Finished jobs are never picked up again. Failed
+jobs are retried with exponential backoff up to max_attempts; a missing
+file fails at once. Start more `run` processes on this machine to process
+in parallel: each one loads its own models and claims its own jobs.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import tracing
+from result_cache import to_jsonable
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(_ROOT, 'ingest_queue.sqlite')
+DEFAULT_LEASE_SEC = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SEC = 5.0
+RETRY_BACKOFF_MAX_SEC = 300.0
+# A dropped file must be this old before it is queued, so half-copied photos are skipped
+DEFAULT_SETTLE_SEC = 2.0
+DEFAULT_POLL_SEC = 5.0
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    UNIQUE (image, mode)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, not_before, id);
+"""
+
+
+def fingerprint(path):
+    """Size and mtime of a file; a replaced photo gets a new fingerprint (and a new job run)."""
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g. EPERM: the process exists but belongs to someone else
+        return True
+    return True
+
+
+class IngestQueue:
+    """
+    Job table in one SQLite file, safe to share between threads and between
+    processes on the same machine. owner identifies this process in leases
+    (host:pid), so jobs held by a process that no longer exists can be
+    reclaimed without waiting for the lease to expire.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB, lease_sec=DEFAULT_LEASE_SEC, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_sec = lease_sec
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            # A finished job must survive a power cut, not just a process crash
+            conn.execute("PRAGMA synchronous = FULL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        """Runs fn(conn) in one IMMEDIATE transaction and returns its result."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return out
+
+    # -- intake ----------------------------------------------------------
+    def enqueue(self, image_paths, mode='ocr_gis'):
+        """
+        Adds one job per image. Images already queued with the same content
+        fingerprint are left alone, whatever their status; a changed file is
+        reset to pending. Returns how many jobs were added or reset.
+        """
+        now = time.time()
+        rows = []
+        for path in image_paths:
+            path = os.path.abspath(path)
+            try:
+                rows.append((path, mode, fingerprint(path), now))
+            except OSError:
+                continue
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO jobs (image, mode, fingerprint, enqueued_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (image, mode) DO UPDATE SET fingerprint = excluded.fingerprint, status = 'pending', "
+                "  attempts = 0, not_before = 0, lease_owner = NULL, lease_expires = NULL, error = NULL, "
+                "  result = NULL, enqueued_at = excluded.enqueued_at, finished_at = NULL "
+                "WHERE jobs.fingerprint != excluded.fingerprint", rows)
+            return conn.total_changes - before
+        added = self._write(insert) if rows else 0
+        tracing.count('ingest_enqueued', added)
+        return added
+
+    # -- dispatch --------------------------------------------------------
+    def _requeue_expired(self, conn, now):
+        # A lease that ran out means the worker crashed or hung; that counts as an attempt
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "  finished_at = CASE WHEN attempts >= ? THEN ? END, "
+            "  error = 'Worker stopped while processing (lease expired)', lease_owner = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ?",
+            (self.max_attempts, self.max_attempts, now, now))
+
+    def release_orphans(self):
+        """
+        Expires the leases of jobs held by processes on this machine that have
+        exited, so a restarted run picks their images up straight away.
+        Returns how many jobs were released.
+        """
+        if os.name != 'posix':
+            return 0
+        host = socket.gethostname()
+        rows = self._conn().execute("SELECT DISTINCT lease_owner FROM jobs WHERE status = 'running'").fetchall()
+        dead = []
+        for (owner,) in rows:
+            owner_host, _, pid = (owner or '').rpartition(':')
+            if owner_host == host and pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                dead.append(owner)
+        if not dead:
+            return 0
+
+        def expire(conn):
+            released = conn.executemany("UPDATE jobs SET lease_expires = 0 WHERE status = 'running' AND lease_owner = ?",
+                                        [(owner,) for owner in dead]).rowcount
+            self._requeue_expired(conn, time.time())
+            return released
+        return self._write(expire)
+
+    def claim(self):
+        """
+        Leases the oldest runnable job to this process and returns it as a
+        dict (id, image, mode, attempts), or None when nothing is runnable.
+        """
+        def take(conn):
+            now = time.time()
+            self._requeue_expired(conn, now)
+            row = conn.execute("SELECT id, image, mode, attempts FROM jobs "
+                               "WHERE status = 'pending' AND not_before <= ? ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                         "lease_expires = ? WHERE id = ?", (self.owner, now + self.lease_sec, row['id']))
+            job = dict(row)
+            job['attempts'] += 1
+            return job
+        return self._write(take)
+
+    def renew(self):
+        """Extends the leases of every job this process is working on."""
+        self._conn().execute("UPDATE jobs SET lease_expires = ? WHERE status = 'running' AND lease_owner = ?",
+                             (time.time() + self.lease_sec, self.owner))
+
+    def complete(self, job_id, result):
+        """
+        Marks a job done with its (JSON-serialisable) result. Idempotent: only
+        the current lease holder can complete a running job, so a late or
+        repeated completion changes nothing. Returns True if this call did it.
+        """
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease_owner = NULL, "
+            "lease_expires = NULL WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (json.dumps(to_jsonable(result)), time.time(), job_id, self.owner))
+        return cur.rowcount == 1
+
+    def fail(self, job_id, error, retryable=True):
+        """
+        Records a failed attempt. The job is retried after a backoff while it
+        has attempts left (and retryable is set), otherwise it is marked
+        failed. Returns the new status, or None if this process no longer
+        holds the job.
+        """
+        def record(conn):
+            row = conn.execute("SELECT attempts FROM jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                               (job_id, self.owner)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if retryable and row['attempts'] < self.max_attempts:
+                delay = min(RETRY_BACKOFF_MAX_SEC, RETRY_BACKOFF_SEC * 2 ** (row['attempts'] - 1))
+                status, not_before, finished_at = 'pending', now + delay, None
+            else:
+                status, not_before, finished_at = 'failed', 0, now
+            conn.execute("UPDATE jobs SET status = ?, not_before = ?, finished_at = ?, error = ?, lease_owner = NULL, "
+                         "lease_expires = NULL WHERE id = ?", (status, not_before, finished_at, error, job_id))
+            return status
+        return self._write(record)
+
+    def release(self):
+        """Hands this process's running jobs back (e.g. on Ctrl-C) without counting the attempt."""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'pending', attempts = MAX(0, attempts - 1), lease_owner = NULL, "
+            "lease_expires = NULL WHERE status = 'running' AND lease_owner = ?", (self.owner,))
+
+    def retry_failed(self):
+        """Puts every failed job back to pending with a fresh attempt count. Returns how many."""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0, finished_at = NULL "
+            "WHERE status = 'failed'")
+        return cur.rowcount
+
+    # -- inspection ------------------------------------------------------
+    def counts(self):
+        """{status: number of jobs} for every status."""
+        counts = dict.fromkeys(STATUSES, 0)
+        for status, n in self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = n
+        return counts
+
+    def outstanding(self):
+        """Jobs not finished yet: pending (including ones waiting to retry) or running."""
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    def jobs(self, status=None, limit=None):
+        """Job rows (results decoded) in queue order, optionally filtered by status."""
+        sql = "SELECT * FROM jobs" + (" WHERE status = ?" if status else "") + " ORDER BY id"
+        params = (status,) if status else ()
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        out = []
+        for row in self._conn().execute(sql, params):
+            job = dict(row)
+            job['result'] = json.loads(job['result']) if job['result'] else None
+            out.append(job)
+        return out
+
+
+def scan_folder(folder, settle_sec=DEFAULT_SETTLE_SEC, seen=None):
+    """
+    Image files under folder (recursively) that have stopped changing for
+    settle_sec. With a seen dict ({path: fingerprint}, updated in place)
+    only new or modified files are returned, so polling a large drop folder
+    doesn't touch the database for files it already queued.
+    """
+    from run_all_pipeline import IMAGE_EXTENSIONS
+    now = time.time()
+    found = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            if name.startswith('.') or not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, name))
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime < settle_sec:
+                continue
+            fp = f"{st.st_size}:{st.st_mtime_ns}"
+            if seen is not None:
+                if seen.get(path) == fp:
+                    continue
+                seen[path] = fp
+            found.append(path)
+    return sorted(found)
+
+
+def run_worker(queue, watch=None, mode='ocr_gis', poll_sec=DEFAULT_POLL_SEC, settle_sec=DEFAULT_SETTLE_SEC,
+               stop_event=None, **process_kwargs):
+    """
+    Processes jobs from queue with process_image(job image, job mode,
+    **process_kwargs) until the queue is drained, or, with watch set, until
+    stop_event is set (or Ctrl-C), polling the watch folder every poll_sec
+    and queueing new images in `mode`. Jobs are run one at a time, like the
+    inference server, so the models are never used concurrently. Returns
+    stats: done, failed, retried, lost (completed by someone else) and
+    images_per_sec.
+    """
+    from run_all_pipeline import process_image, flush_processed_images
+    from result_sink import flush_all
+    stop_event = stop_event or threading.Event()
+    stats = {'done': 0, 'failed': 0, 'retried': 0, 'lost': 0, 'enqueued': 0, 'released': queue.release_orphans()}
+    seen = {}
+    next_scan = 0.0
+
+    # Keep our leases alive while a slow image is being processed
+    heartbeat_stop = threading.Event()
+
+    def heartbeat():
+        while not heartbeat_stop.wait(queue.lease_sec / 3):
+            try:
+                queue.renew()
+            except sqlite3.Error:
+                pass
+    threading.Thread(target=heartbeat, name='ingest-heartbeat', daemon=True).start()
+
+    start = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            if watch and time.monotonic() >= next_scan:
+                stats['enqueued'] += queue.enqueue(scan_folder(watch, settle_sec, seen), mode)
+                next_scan = time.monotonic() + poll_sec
+            job = queue.claim()
+            if job is None:
+                if not watch and queue.outstanding() == 0:
+                    break
+                # Nothing runnable yet: wait for new files, retries or other workers' leases
+                stop_event.wait(min(poll_sec, 1.0))
+                continue
+            try:
+                result = process_image(job['image'], job['mode'], **process_kwargs)
+            except Exception as e:
+                # A missing file won't appear by retrying
+                status = queue.fail(job['id'], f"{type(e).__name__}: {e}", retryable=not isinstance(e, FileNotFoundError))
+                if status == 'pending':
+                    stats['retried'] += 1
+                    tracing.count('ingest_retries')
+                elif status == 'failed':
+                    stats['failed'] += 1
+                    tracing.count('ingest_failed')
+                continue
+            if queue.complete(job['id'], result):
+                stats['done'] += 1
+                tracing.count('ingest_done')
+            else:
+                stats['lost'] += 1
+    finally:
+        heartbeat_stop.set()
+        queue.release()
+        flush_processed_images()
+        flush_all()
+    elapsed = time.perf_counter() - start
+    stats['elapsed_sec'] = elapsed
+    stats['images_per_sec'] = stats['done'] / elapsed if elapsed > 0 else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from model_registry import ONNX_DEVICES
+    parser = argparse.ArgumentParser(description="Durable ingestion queue for the PolePad pipeline")
+    parser.add_argument('--db', default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_add = sub.add_parser('add', help="Queue the images in a folder, glob pattern or manifest")
+    p_add.add_argument('source')
+    p_add.add_argument('--roboflow', action='store_true', help="Queue for scene detection instead of OCR + GIS")
+    p_run = sub.add_parser('run', help="Process queued jobs (resumes an interrupted run)")
+    p_run.add_argument('--watch', default=None, help="Keep polling this folder for new images")
+    p_run.add_argument('--roboflow', action='store_true', help="Mode for images found by --watch")
+    p_run.add_argument('--poll', type=float, default=DEFAULT_POLL_SEC, help="Seconds between folder scans")
+    p_run.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SEC,
+                       help="Skip files modified less than this many seconds ago")
+    p_run.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS)
+    p_run.add_argument('--lease', type=float, default=DEFAULT_LEASE_SEC)
+    p_run.add_argument('--model', default='yolov8s.pt')
+    p_run.add_argument('--device', default='cpu', help="cpu, cuda, mps, or " + " / ".join(ONNX_DEVICES))
+    p_run.add_argument('--cascade', action='store_true', help="Use the bounded-latency OCR cascade")
+    p_run.add_argument('--scene-local', action='store_true', help="Run scene detection on the local detector")
+    p_run.add_argument('--predictions-only', action='store_true')
+    p_status = sub.add_parser('status', help="Job counts by status")
+    p_status.add_argument('--failed', action='store_true', help="Also list failed jobs and their errors")
+    sub.add_parser('retry-failed', help="Put failed jobs back in the queue")
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        from run_all_pipeline import collect_images
+        paths = collect_images(args.source)
+        added = IngestQueue(args.db).enqueue(paths, 'roboflow' if args.roboflow else 'ocr_gis')
+        print(f"Queued {added} new or changed images ({len(paths) - added} already queued)")
+    elif args.command == 'run':
+        queue = IngestQueue(args.db, lease_sec=args.lease, max_attempts=args.max_attempts)
+        print(f"Ingest queue {args.db}: {queue.counts()}")
+        try:
+            stats = run_worker(queue, args.watch, 'roboflow' if args.roboflow else 'ocr_gis', args.poll, args.settle,
+                               yolo_model_path=args.model, device=args.device,
+                               ocr_mode='cascade' if args.cascade else 'full',
+                               scene_backend='local' if args.scene_local else 'roboflow',
+                               predictions_only=args.predictions_only)
+        except KeyboardInterrupt:
+            print("Interrupted; unfinished jobs stay queued for the next run")
+        else:
+            print(f"Done {stats['done']}, failed {stats['failed']}, retries {stats['retried']}, "
+                  f"{stats['enqueued']} queued while watching, {stats['released']} reclaimed from a crashed run "
+                  f"({stats['images_per_sec']:.2f} images/sec)")
+        print(f"Ingest queue: {queue.counts()}")
+    elif args.command == 'status':
+        queue = IngestQueue(args.db)
+        print(queue.counts())
+        if args.failed:
+            for job in queue.jobs('failed'):
+                print(f"  {job['image']} ({job['mode']}, {job['attempts']} attempts): {job['error']}")
+    elif args.command == 'retry-failed':
+        print(f"Requeued {IngestQueue(args.db).retry_failed()} failed jobs")
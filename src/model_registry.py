@@ -0,0 +1,85 @@
+import threading
+
+import tracing
+
+# Shared, lazily-loaded model instances for every pipeline entry point.
+# Models are keyed by what actually changes the loaded weights, so asking
+# for the same detector/reader twice hands back the same warm object.
+_models = {}
+_lock = threading.Lock()
+
+DEFAULT_YOLO_MODEL = 'yolov8s.pt'
+DEFAULT_OCR_LANGS = ('en',)
+# CPU inference through ONNX Runtime instead of PyTorch, selected like a device
+ONNX_DEVICES = ('onnx', 'onnx-int8')
+
+
+def _get_or_load(key, loader):
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        # Another thread may have loaded it while we waited for the lock
+        model = _models.get(key)
+        if model is None:
+            with tracing.span('model_load', model=key[0], weights=str(key[1]), device=key[2]):
+                model = loader()
+            tracing.count('model_loads')
+            _models[key] = model
+    return model
+
+
+def get_yolo(model_path=DEFAULT_YOLO_MODEL, device='cpu'):
+    """
+    Returns a shared YOLO detector for (model_path, device), loading it on first use.
+    device 'onnx' / 'onnx-int8' runs the ONNX export on ONNX Runtime (CPU),
+    exporting it next to the weights on first use (see onnx_backend).
+    """
+    def load():
+        if device in ONNX_DEVICES:
+            from onnx_backend import load_yolo
+            return load_yolo(model_path, int8=device == 'onnx-int8')
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+        if device:
+            model.to(device)
+        return model
+    return _get_or_load(('yolo', model_path, device), load)
+
+
+def get_ocr_reader(langs=DEFAULT_OCR_LANGS, device='cpu'):
+    """
+    Returns a shared EasyOCR reader for (langs, device), loading it on first use.
+    device may be 'cpu', 'cuda', 'cuda:N' or 'mps', or 'onnx' / 'onnx-int8'
+    for a CPU reader whose recognizer runs on ONNX Runtime.
+    """
+    langs = tuple(langs)
+
+    def load():
+        if device in ONNX_DEVICES:
+            from onnx_backend import load_ocr_reader
+            return load_ocr_reader(langs, int8=device == 'onnx-int8')
+        import easyocr
+        gpu = device if device and device != 'cpu' else False
+        return easyocr.Reader(list(langs), gpu=gpu)
+    return _get_or_load(('ocr', langs, device), load)
+
+
+def warmup(yolo_model_path=DEFAULT_YOLO_MODEL, langs=DEFAULT_OCR_LANGS, device='cpu'):
+    """
+    Loads the detector and the OCR reader up front so the first image
+    only pays for inference. Call this once at process startup.
+    """
+    get_yolo(yolo_model_path, device)
+    get_ocr_reader(langs, device)
+
+
+def loaded_models():
+    """Returns the registry keys of every model currently held in memory."""
+    return list(_models.keys())
+
+
+def clear():
+    """Drops every cached model (the next request reloads from disk)."""
+    with _lock:
+        _models.clear()
@@ -1,9 +1,7 @@
 import sys
 import os
 import cv2
-import easyocr
-from ultralytics import YOLO
-from preprocess import preprocess
+from model_registry import get_ocr_reader
 
 def main():
 
@@ -23,7 +21,7 @@ def main():
         sys.exit(1)
 
     print("Running EasyOCR on the full processed image...")
-    reader = easyocr.Reader(['en'])
+    reader = get_ocr_reader(['en'])
     ocr_results = reader.readtext(img, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
     found = False
     for _, text, conf in ocr_results:
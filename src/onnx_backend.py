@@ -0,0 +1,361 @@
+import copy
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from result_sink import file_lock
+
+# Sample images used to calibrate the int8 detector
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+# Intra-op threads per ORT session; 0 lets ONNX Runtime pick (all cores)
+_num_threads = int(os.environ.get('POLEPAD_ORT_THREADS', '0'))
+
+
+def set_num_threads(n):
+    """Threads for sessions created from now on (pool workers use 1, like torch)."""
+    global _num_threads
+    _num_threads = n
+
+
+def _session(path):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = _num_threads
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+def _stale(artifact, source):
+    if not os.path.isfile(artifact):
+        return True
+    return source is not None and os.path.isfile(source) and os.path.getmtime(artifact) < os.path.getmtime(source)
+
+
+def _copy_metadata(source_path, target_path):
+    import onnx
+    source, target = onnx.load(source_path), onnx.load(target_path)
+    existing = {p.key for p in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(target, target_path)
+
+
+def quantize(onnx_path, out_path, calibration=None, op_types=None):
+    """
+    int8 copy of an ONNX model. Without calibration data this is dynamic
+    quantization (int8 weights, activation ranges computed per call), limited
+    to op_types; that suits the recognizer's LSTM/MatMul layers. Conv-heavy
+    models need calibration: a list of input arrays used to fix activation
+    ranges, giving a static QDQ model that runs int8 convolutions. Dynamic
+    quantization of convolutions (ConvInteger) is slower than float on CPU.
+    Model metadata such as the YOLO class names is carried over.
+    """
+    from onnxruntime import quantization as q
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    if calibration is None:
+        q.quantize_dynamic(onnx_path, tmp_path, weight_type=q.QuantType.QInt8, op_types_to_quantize=op_types)
+    else:
+        class Reader(q.CalibrationDataReader):
+            def __init__(self, name):
+                self.batches = iter({name: batch} for batch in calibration)
+
+            def get_next(self):
+                return next(self.batches, None)
+
+        input_name = _session(onnx_path).get_inputs()[0].name
+        q.quantize_static(onnx_path, tmp_path, Reader(input_name), quant_format=q.QuantFormat.QDQ,
+                          per_channel=True, activation_type=q.QuantType.QUInt8, weight_type=q.QuantType.QInt8,
+                          op_types_to_quantize=op_types)
+    _copy_metadata(onnx_path, tmp_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _letterbox(img, size):
+    """BGR image -> 1x3xSxS float RGB input, padded like ultralytics' LetterBox."""
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    resized = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return (canvas[:, :, ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+
+def calibration_images(folder=CALIBRATION_DIR, imgsz=640, limit=32):
+    """Letterboxed detector inputs from the sample images, for static quantization."""
+    paths = sorted(p for p in glob.glob(os.path.join(folder, '*'))
+                   if os.path.splitext(p)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp'))[:limit]
+    images = (cv2.imread(p) for p in paths)
+    return [_letterbox(img, imgsz) for img in images if img is not None]
+
+
+def export_yolo(model_path='yolov8s.pt', int8=False, imgsz=640, calibration_dir=CALIBRATION_DIR):
+    """
+    Returns the path of the ONNX export of a YOLO checkpoint, exporting it on
+    first use. Artifacts sit next to the weights (yolov8s.onnx,
+    yolov8s.int8.onnx) and are rebuilt when the weights are newer; a fresh
+    export is returned without loading the checkpoint (or torch). Exports
+    use dynamic batch and image axes, so batched and tiled calls work. The
+    int8 model is statically quantized with calibration_dir's images.
+    """
+    base = os.path.splitext(model_path)[0]
+    onnx_path = base + '.onnx'
+    int8_path = base + '.int8.onnx'
+    if not _stale(onnx_path, model_path) and not (int8 and _stale(int8_path, onnx_path)):
+        return int8_path if int8 else onnx_path
+    from ultralytics import YOLO
+    model = YOLO(model_path)
+    weights = str(getattr(model, 'ckpt_path', None) or model_path)
+    # Pool workers warm up together; only one of them should export
+    with file_lock(onnx_path):
+        if _stale(onnx_path, weights):
+            exported = model.export(format='onnx', dynamic=True, imgsz=imgsz, simplify=True, verbose=False)
+            if os.path.abspath(exported) != os.path.abspath(onnx_path):
+                os.replace(exported, onnx_path)
+        if not int8:
+            return onnx_path
+        if _stale(int8_path, onnx_path):
+            calibration = calibration_images(calibration_dir, imgsz)
+            if not calibration:
+                raise FileNotFoundError(f"No calibration images in {calibration_dir}")
+            quantize(onnx_path, int8_path, calibration)
+        return int8_path
+
+
+def load_yolo(model_path='yolov8s.pt', int8=False):
+    """An ultralytics YOLO running the ONNX export; same predict()/results API as the .pt model."""
+    from ultralytics import YOLO
+    return YOLO(export_yolo(model_path, int8), task='detect')
+
+
+class OrtRecognizer:
+    """
+    Drop-in for an EasyOCR reader's recognizer module: called as
+    recognizer(image, text) with a [B, 1, H, W] float tensor and returns the
+    per-step class scores as a tensor, so EasyOCR's decoding is unchanged.
+    """
+
+    def __init__(self, onnx_path):
+        self.onnx_path = onnx_path
+        self.session = _session(onnx_path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self):
+        return self
+
+    def __call__(self, image, text=None):
+        import torch
+        batch = image.detach().cpu().numpy().astype(np.float32, copy=False)
+        return torch.from_numpy(self.session.run(None, {self.input_name: batch})[0])
+
+
+def export_recognizer(recognizer, onnx_path, int8=False, height=64, weights_path=None):
+    """
+    Exports an EasyOCR recognizer (an unquantized torch module) to onnx_path
+    with dynamic batch and width axes, plus an int8 copy when int8 is set.
+    An existing export is reused unless weights_path (the recognizer's .pth)
+    is newer. Returns the path to load.
+    """
+    import torch
+
+    class MeanLastAxis(torch.nn.Module):
+        def forward(self, x):
+            return x.mean(dim=3, keepdim=True)
+
+    class ImageOnly(torch.nn.Module):
+        # The CTC recognizers ignore `text`; keep it out of the graph
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, image):
+            return self.inner(image, None)
+
+    model = copy.deepcopy(recognizer).cpu().eval()
+    # AdaptiveAvgPool2d((None, 1)) is a mean over the last axis, which
+    # exports for any width (the adaptive op needs a fixed input size)
+    if isinstance(getattr(model, 'AdaptiveAvgPool', None), torch.nn.AdaptiveAvgPool2d):
+        model.AdaptiveAvgPool = MeanLastAxis()
+
+    with file_lock(onnx_path):
+        if _stale(onnx_path, weights_path):
+            tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+            dummy = torch.zeros(2, 1, height, 256)
+            with torch.no_grad():
+                torch.onnx.export(ImageOnly(model), (dummy,), tmp_path, input_names=['image'], output_names=['preds'],
+                                  dynamic_axes={'image': {0: 'batch', 3: 'width'}, 'preds': {0: 'batch', 1: 'steps'}},
+                                  opset_version=17, dynamo=False)
+            os.replace(tmp_path, onnx_path)
+        if not int8:
+            return onnx_path
+        int8_path = os.path.splitext(onnx_path)[0] + '.int8.onnx'
+        if _stale(int8_path, onnx_path):
+            quantize(onnx_path, int8_path, op_types=['MatMul', 'Gemm', 'LSTM'])
+        return int8_path
+
+
+def load_ocr_reader(langs=('en',), int8=False):
+    """
+    An EasyOCR reader whose recognizer runs in ONNX Runtime. The text
+    detector (CRAFT) stays on PyTorch. The export is cached in EasyOCR's
+    model directory, next to the recognizer weights.
+    """
+    import easyocr
+    # EasyOCR's own CPU default applies torch dynamic quantization, which
+    # does not export; start from the float weights
+    reader = easyocr.Reader(list(langs), gpu=False, quantize=False, verbose=False)
+    name = f"{reader.model_lang}_{reader.recog_network}.onnx"
+    weights = os.path.join(reader.model_storage_directory, f"{reader.recog_network}.pth")
+    onnx_path = export_recognizer(reader.recognizer, os.path.join(reader.model_storage_directory, name), int8,
+                                  weights_path=weights)
+    reader.recognizer = OrtRecognizer(onnx_path)
+    return reader
+
+
+def _boxes(result):
+    return [(tuple(float(v) for v in b.xyxy[0]), int(b.cls[0])) for b in result.boxes]
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def box_f1(reference, boxes, iou_threshold=0.5):
+    """F1 of boxes against reference boxes (same class, IoU >= threshold, greedy matching)."""
+    if not reference and not boxes:
+        return 1.0
+    unmatched = list(reference)
+    hits = 0
+    for box, cls in boxes:
+        best = max(((_iou(box, r), i) for i, (r, rc) in enumerate(unmatched) if rc == cls), default=(0.0, None))
+        if best[1] is not None and best[0] >= iou_threshold:
+            unmatched.pop(best[1])
+            hits += 1
+    return 2 * hits / (len(reference) + len(boxes))
+
+
+def compare_backends(paths, devices=('cpu', 'onnx', 'onnx-int8'), yolo_model_path='yolov8s.pt', repeat=3):
+    """
+    Runs the detector, the OCR reader and the full OCR/GIS attribute pass on
+    every image with each device, against the first device (PyTorch) as the
+    reference. Returns one summary dict per device: load time (including any
+    export), median per-image latencies, detector box F1, share of images
+    with identical OCR text, and pole_id agreement.
+    """
+    import statistics
+    import model_registry
+    from infra_gis_detect import detect_infrastructure_attributes
+
+    images = [(p, cv2.imread(p)) for p in paths]
+    images = [(p, img) for p, img in images if img is not None]
+    allowlist = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    outputs, summary = {}, []
+    for device in devices:
+        start = time.perf_counter()
+        yolo = model_registry.get_yolo(yolo_model_path, device)
+        reader = model_registry.get_ocr_reader(['en'], device)
+        load_sec = time.perf_counter() - start
+        # One untimed pass so lazy initialisation isn't counted
+        yolo(images[0][1], verbose=False)
+        reader.readtext(images[0][1], allowlist=allowlist)
+        timings = {'detect': [], 'ocr': [], 'attributes': []}
+        per_image = []
+        for path, img in images:
+            runs = {k: [] for k in timings}
+            for _ in range(repeat):
+                t = time.perf_counter()
+                boxes = _boxes(yolo(img, verbose=False)[0])
+                runs['detect'].append(time.perf_counter() - t)
+                t = time.perf_counter()
+                texts = sorted(text for _, text, _ in reader.readtext(img, allowlist=allowlist))
+                runs['ocr'].append(time.perf_counter() - t)
+                t = time.perf_counter()
+                pole_id = detect_infrastructure_attributes(img, yolo_model_path, device, path).get('pole_id')
+                runs['attributes'].append(time.perf_counter() - t)
+            for k in timings:
+                timings[k].append(statistics.median(runs[k]))
+            per_image.append({'boxes': boxes, 'texts': texts, 'pole_id': pole_id})
+        outputs[device] = per_image
+        reference = outputs[devices[0]]
+        summary.append({
+            'device': device,
+            'images': len(per_image),
+            'load_sec': load_sec,
+            'detect_ms': statistics.median(timings['detect']) * 1000,
+            'ocr_ms': statistics.median(timings['ocr']) * 1000,
+            'attributes_ms': statistics.median(timings['attributes']) * 1000,
+            'box_f1': statistics.mean(box_f1(r['boxes'], o['boxes']) for r, o in zip(reference, per_image)),
+            'ocr_identical': statistics.mean(r['texts'] == o['texts'] for r, o in zip(reference, per_image)),
+            'pole_id_agreement': statistics.mean(r['pole_id'] == o['pole_id'] for r, o in zip(reference, per_image))
+        })
+    return summary
+
+
+def _provenance(yolo_model_path):
+    """Weights fingerprint and library versions, so a committed report can be traced to its run."""
+    from importlib import metadata
+    from result_cache import file_sha256
+    weights = file_sha256(yolo_model_path)[:16] if os.path.isfile(yolo_model_path) else 'not found locally'
+    versions = []
+    for package in ('torch', 'ultralytics', 'easyocr', 'onnxruntime'):
+        try:
+            versions.append(f"{package} {metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            pass
+    return f"Weights sha256 {weights}; {', '.join(versions)}."
+
+
+def format_report(summary, yolo_model_path):
+    base = summary[0]
+    lines = [
+        f"# ONNX Runtime vs PyTorch ({yolo_model_path}, {base['images']} images)",
+        "",
+        "Median per-image latency; accuracy is agreement with the PyTorch (`cpu`) outputs.",
+        _provenance(yolo_model_path),
+        "",
+        "| backend | load s | detect ms | OCR ms | attributes ms | speedup | box F1 | OCR identical | pole_id agree |",
+        "|---|---|---|---|---|---|---|---|---|"
+    ]
+    for s in summary:
+        lines.append(f"| {s['device']} | {s['load_sec']:.1f} | {s['detect_ms']:.0f} | {s['ocr_ms']:.0f} | "
+                     f"{s['attributes_ms']:.0f} | {base['attributes_ms'] / s['attributes_ms']:.2f}x | "
+                     f"{s['box_f1']:.3f} | {s['ocr_identical']:.0%} | {s['pole_id_agreement']:.0%} |")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    import argparse
+    from run_all_pipeline import collect_images
+    parser = argparse.ArgumentParser(description="Export to ONNX and compare ONNX Runtime with PyTorch")
+    parser.add_argument("source", nargs="?", default=CALIBRATION_DIR, help="Directory, glob pattern or manifest file")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--devices", default="cpu,onnx,onnx-int8")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--export-only", action="store_true", help="Only build the ONNX artifacts")
+    parser.add_argument("--report", default=None, help="Also write the markdown report here")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        set_num_threads(args.threads)
+    if args.export_only:
+        for int8 in (False, True):
+            print(export_yolo(args.model, int8))
+            print(load_ocr_reader(int8=int8).recognizer.onnx_path)
+    else:
+        summary = compare_backends(collect_images(args.source), args.devices.split(','), args.model, args.repeat)
+        report = format_report(summary, args.model)
+        print(report)
+        if args.report:
+            with open(args.report, 'w') as f:
+                f.write(report)
+            print(f"Report written: {args.report}")
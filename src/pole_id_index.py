@@ -0,0 +1,255 @@
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+
+# Registry used by the pipeline when no index is passed in explicitly
+DEFAULT_GIS_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gis_records.csv')
+
+# Characters EasyOCR mixes up on pole tags. Every character in a group maps to
+# the group's first member, so 'PD4I459', 'P041459' and 'PD41459' share a key.
+CONFUSION_GROUPS = ('0ODQ', '1IL', '5S', '8B', '2Z', '6G')
+CONFUSION_COST = 0.2
+# Tags are printed with and without the dash ("C-5737" / "C5737")
+SEPARATOR_COST = 0.25
+SEPARATORS = '- '
+
+_CANONICAL = {c: group[0] for group in CONFUSION_GROUPS for c in group}
+
+
+def normalize_id(text):
+    """Upper-cases and trims an ID as read from OCR or the registry."""
+    return str(text).strip().upper()
+
+
+def canonical_id(text):
+    """
+    Confusion-insensitive form of an ID: separators dropped, look-alike
+    characters folded together (see CONFUSION_GROUPS).
+    """
+    return ''.join(_CANONICAL.get(c, c) for c in normalize_id(text) if c not in SEPARATORS)
+
+
+def _deletes(word, max_distance):
+    """word plus every string reachable from it by up to max_distance deletions."""
+    out = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _sub_cost(a, b):
+    if a == b:
+        return 0.0
+    if _CANONICAL.get(a, a) == _CANONICAL.get(b, b):
+        return CONFUSION_COST
+    return 1.0
+
+
+def _gap_cost(c):
+    return SEPARATOR_COST if c in SEPARATORS else 1.0
+
+
+def weighted_distance(a, b, max_cost=None):
+    """
+    Edit distance between two normalized IDs where swapping look-alike
+    characters costs CONFUSION_COST and adding or dropping a separator costs
+    SEPARATOR_COST; swapping two adjacent characters counts as one edit.
+    Returns max_cost + 1 as soon as the distance is known to exceed max_cost.
+    """
+    before = None
+    prev = [0.0]
+    for c in b:
+        prev.append(prev[-1] + _gap_cost(c))
+    for i, ca in enumerate(a):
+        cur = [prev[0] + _gap_cost(ca)]
+        for j, cb in enumerate(b):
+            cost = min(prev[j] + _sub_cost(ca, cb), prev[j + 1] + _gap_cost(ca), cur[j] + _gap_cost(cb))
+            if before is not None and j and ca == b[j - 1] and a[i - 1] == cb and ca != cb:
+                cost = min(cost, before[j - 1] + 1.0)
+            cur.append(cost)
+        if max_cost is not None and min(cur) > max_cost:
+            return max_cost + 1
+        before, prev = prev, cur
+    return prev[-1]
+
+
+class PoleIdIndex:
+    """
+    Approximate-match index over registry pole IDs.
+
+    Built SymSpell-style: every ID's canonical form (see canonical_id) and its
+    single-character deletions are hashed into one sorted int64 array, with a
+    parallel array pointing back at the ID. A lookup hashes the query's own
+    deletions and binary-searches them, so the candidate set is gathered
+    without scanning the registry; candidates are then ranked by
+    weighted_distance on the original strings. Confusions and separators are
+    free at the candidate stage, and max_distance further real edits
+    (insertions, deletions, substitutions, adjacent swaps) are tolerated.
+
+    Memory is ~12 bytes per variant (len(id) + 1 variants per ID for
+    max_distance=1), so a few million IDs fit in a few hundred MB.
+    """
+
+    def __init__(self, pole_ids, max_distance=1):
+        self.max_distance = max_distance
+        self.ids = []
+        seen = set()
+        for pid in pole_ids:
+            pid = normalize_id(pid)
+            if pid and pid not in seen:
+                seen.add(pid)
+                self.ids.append(pid)
+        hashes = []
+        owners = []
+        for i, pid in enumerate(self.ids):
+            for variant in _deletes(canonical_id(pid), max_distance):
+                hashes.append(hash(variant))
+                owners.append(i)
+        hashes = np.array(hashes, dtype=np.int64)
+        owners = np.array(owners, dtype=np.int32)
+        order = np.argsort(hashes, kind='stable')
+        self._hashes = hashes[order]
+        self._owners = owners[order]
+
+    @classmethod
+    def from_csv(cls, csv_path=DEFAULT_GIS_CSV, column='pole_id', max_distance=1):
+        with open(csv_path, newline='') as f:
+            reader = csv.DictReader(f)
+            return cls((row[column] for row in reader if row.get(column)), max_distance=max_distance)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _candidates(self, canonical):
+        keys = np.array([hash(v) for v in _deletes(canonical, self.max_distance)], dtype=np.int64)
+        lo = np.searchsorted(self._hashes, keys, side='left')
+        hi = np.searchsorted(self._hashes, keys, side='right')
+        hits = [self._owners[a:b] for a, b in zip(lo, hi) if b > a]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(hits))
+
+    def lookup(self, text, k=3, max_cost=None):
+        """
+        Returns up to k (pole_id, cost) pairs for an OCR reading, cheapest
+        first. max_cost defaults to max_distance plus a little slack for
+        confusions and separators.
+        """
+        query = normalize_id(text)
+        canonical = canonical_id(query)
+        if not canonical:
+            return []
+        if max_cost is None:
+            max_cost = self.max_distance + 0.5
+        scored = []
+        for i in self._candidates(canonical):
+            pid = self.ids[i]
+            cost = weighted_distance(query, pid, max_cost)
+            if cost <= max_cost:
+                scored.append((cost, pid))
+        scored.sort()
+        return [(pid, cost) for cost, pid in scored[:k]]
+
+    def resolve(self, candidates):
+        """
+        Picks the registry ID an OCR reading can be snapped to from candidates
+        [(text, conf), ...]: one that differs from a reading only by look-alike
+        characters and separators (same canonical_id), so any real edit keeps
+        the raw reading. The cheapest such match wins, ties going to the more
+        confident reading. Returns (pole_id, ocr_text, cost) or None.
+        """
+        best = None
+        for text, conf in candidates:
+            query = normalize_id(text)
+            canonical = canonical_id(query)
+            if not canonical:
+                continue
+            for i in self._candidates(canonical):
+                pid = self.ids[i]
+                if canonical_id(pid) != canonical:
+                    continue
+                cost = weighted_distance(query, pid)
+                if best is None or (cost, -conf) < (best[2], -best[3]):
+                    best = (pid, text, cost, conf)
+        return best[:3] if best else None
+
+    def suggest(self, candidates, k=3, max_cost=1.0):
+        """
+        Up to k registry IDs within max_cost of any of the OCR candidates
+        [(text, conf), ...], as (pole_id, ocr_text, cost) cheapest first.
+        Meant for review when resolve() finds nothing to snap to.
+        """
+        best = {}
+        for text, conf in candidates:
+            for pid, cost in self.lookup(text, k=k, max_cost=max_cost):
+                if pid not in best or (cost, -conf) < (best[pid][1], -best[pid][2]):
+                    best[pid] = (text, cost, conf)
+        ranked = sorted(best.items(), key=lambda item: (item[1][1], -item[1][2], item[0]))
+        return [(pid, text, cost) for pid, (text, cost, _) in ranked[:k]]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_pole_index(csv_path=DEFAULT_GIS_CSV, max_distance=1):
+    """
+    Shared index for csv_path, rebuilt when the file changes.
+    Returns None if the registry file does not exist.
+    """
+    try:
+        st = os.stat(csv_path)
+    except OSError:
+        return None
+    key = (os.path.abspath(csv_path), max_distance)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, PoleIdIndex.from_csv(csv_path, max_distance=max_distance))
+            _indexes[key] = cached
+        return cached[1]
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    parser = argparse.ArgumentParser(description="Approximate pole-ID lookup against the GIS registry")
+    parser.add_argument("queries", nargs="*", help="OCR readings to resolve")
+    parser.add_argument("--csv", default=DEFAULT_GIS_CSV)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--bench", type=int, default=0, metavar="N",
+                        help="Benchmark on N synthetic IDs instead of the registry")
+    args = parser.parse_args()
+
+    if args.bench:
+        rng = random.Random(0)
+        prefixes = ['', '', 'P', 'PD', 'C-', '0-']
+        ids = {f"{rng.choice(prefixes)}{rng.randrange(10 ** 7):0{rng.choice([5, 6, 7])}d}" for _ in range(args.bench)}
+        start = time.perf_counter()
+        index = PoleIdIndex(ids)
+        print(f"Indexed {len(index):,} IDs in {time.perf_counter() - start:.1f}s")
+        flips = {'0': 'O', '1': 'I', '5': 'S', '8': 'B', 'D': '0'}
+        sample = rng.sample(index.ids, 2000)
+        noisy = []
+        for pid in sample:
+            chars = list(pid)
+            i = rng.randrange(len(chars))
+            chars[i] = flips.get(chars[i], chars[i])
+            if rng.random() < 0.3:
+                del chars[rng.randrange(len(chars))]
+            noisy.append(''.join(chars))
+        start = time.perf_counter()
+        hits = sum(1 for pid, q in zip(sample, noisy) if pid in [m[0] for m in index.lookup(q, args.k)])
+        per_ms = (time.perf_counter() - start) * 1000 / len(noisy)
+        print(f"{per_ms:.3f} ms/lookup, true ID in top-{args.k}: {hits}/{len(noisy)}")
+    else:
+        index = get_pole_index(args.csv)
+        for q in args.queries:
+            match = index.resolve([(q, 1.0)])
+            print(f"{q}: {match[0] if match else 'no snap'} {index.lookup(q, args.k)}")
@@ -0,0 +1,241 @@
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import model_registry
+
+# Rough resident size of one loaded YOLOv8s + EasyOCR (en) pair on CPU, in MB.
+# Used to cap the worker count when every worker loads its own models.
+DEFAULT_MODEL_MB = 1500
+# Private memory each forked worker adds on top of copy-on-write shared weights.
+DEFAULT_FORKED_WORKER_MB = 400
+
+# Set in each worker by _init_worker
+_worker_config = {}
+
+
+def workers_for_budget(memory_budget_mb, per_worker_mb, max_workers=None):
+    """
+    Returns how many workers fit in memory_budget_mb when each costs per_worker_mb,
+    bounded by max_workers (default: CPU count). Always at least one.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if not memory_budget_mb:
+        return max_workers
+    return max(1, min(max_workers, int(memory_budget_mb // per_worker_mb)))
+
+
+def _init_worker(config):
+    _worker_config.update(config)
+    # One intra-op thread per worker: the pool provides the parallelism and
+    # oversubscribing torch threads across 32 processes only adds contention.
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    if config['device'] in model_registry.ONNX_DEVICES:
+        import onnx_backend
+        onnx_backend.set_num_threads(1)
+    if config['preload'] == 'worker':
+        model_registry.warmup(config['yolo_model_path'], device=config['device'])
+
+
+def _process_chunk(items):
+    """
+    Worker task: runs the OCR + GIS pipeline on [(index, path), ...].
+    Python-level errors are returned per image; a marker file records the image
+    in flight so the parent can tell which one took the worker down on a crash.
+    """
+    from run_all_pipeline import run_all, flush_processed_images
+    marker = os.path.join(_worker_config['marker_dir'], str(os.getpid()))
+    out = []
+    for idx, path in items:
+        with open(marker, 'w') as f:
+            f.write(str(idx))
+        try:
+            res = run_all(path, _worker_config['yolo_model_path'], output_csv=None,
+                          device=_worker_config['device'])
+            res['image'] = path
+            out.append((idx, res))
+        except Exception as e:
+            out.append((idx, {'image': path, 'error': f"{type(e).__name__}: {e}"}))
+    flush_processed_images()
+    if os.path.exists(marker):
+        os.remove(marker)
+    return out
+
+
+def _in_flight(marker_dir):
+    """Indexes of images that were being processed when the pool died."""
+    idxs = set()
+    for name in os.listdir(marker_dir):
+        path = os.path.join(marker_dir, name)
+        try:
+            with open(path) as f:
+                idxs.add(int(f.read().strip()))
+        except (OSError, ValueError):
+            pass
+        os.remove(path)
+    return idxs
+
+
+def _crash_exit_code(processes):
+    """Exit code of the worker that broke the pool; the survivors are SIGTERMed after it."""
+    codes = [p.exitcode for p in processes if p.exitcode is not None]
+    crashed = [code for code in codes if code != -signal.SIGTERM]
+    return (crashed or codes or [None])[0]
+
+
+def run_pool(image_paths, workers=None, preload='parent', memory_budget_mb=None, per_worker_mb=None,
+             chunk_size=4, max_retries=1, max_pool_restarts=3, yolo_model_path='yolov8s.pt', device='cpu'):
+    """
+    Runs the OCR + GIS pipeline over image_paths on a process pool.
+
+    preload='parent' loads the models once in this process and forks workers
+    that share the weights copy-on-write (POSIX only). preload='worker' loads
+    the models in each worker; memory_budget_mb then caps the worker count at
+    budget / per_worker_mb.
+
+    Work is sharded into chunks of chunk_size images. If a worker dies (e.g.
+    a native crash on a corrupt image), the pool is rebuilt and unfinished
+    chunks are resubmitted; images that were in flight during the crash are
+    re-run one at a time in isolation, and any that crash more than
+    max_retries times are reported as failed. A crash that no image can be
+    blamed for (e.g. in the initializer or during warmup) gets the pool
+    rebuilt at most max_pool_restarts times in a row without any image
+    finishing; after that the remaining images are reported as failed with
+    the worker's exit code. Results come back in input order.
+    Returns (results, stats).
+    """
+    if preload == 'parent' and 'fork' not in mp.get_all_start_methods():
+        preload = 'worker'
+    if per_worker_mb is None:
+        per_worker_mb = DEFAULT_FORKED_WORKER_MB if preload == 'parent' else DEFAULT_MODEL_MB
+    workers = workers_for_budget(memory_budget_mb, per_worker_mb, workers)
+    ctx = mp.get_context('fork' if preload == 'parent' else 'spawn')
+
+    if preload == 'parent':
+        # Loaded before the fork, so every worker inherits warm weights
+        model_registry.warmup(yolo_model_path, device=device)
+
+    marker_dir = tempfile.mkdtemp(prefix='polepad_pool_')
+    config = {'preload': preload, 'yolo_model_path': yolo_model_path, 'device': device,
+              'marker_dir': marker_dir}
+
+    def make_pool(n):
+        return ProcessPoolExecutor(max_workers=n, mp_context=ctx, initializer=_init_worker, initargs=(config,))
+
+    indexed = list(enumerate(image_paths))
+    pending = {i // chunk_size: indexed[i:i + chunk_size] for i in range(0, len(indexed), chunk_size)}
+    results = {}
+    crashes = {}
+    restarts = 0
+    stalled = 0
+    start = time.perf_counter()
+
+    def run_isolated(idx, path):
+        # A single image on a single fresh worker: a crash here is unambiguous
+        while True:
+            pool = make_pool(1)
+            try:
+                for i, res in pool.submit(_process_chunk, [(idx, path)]).result():
+                    results[i] = res
+                return
+            except BrokenProcessPool:
+                crashes[idx] = crashes.get(idx, 0) + 1
+                _in_flight(marker_dir)
+                if crashes[idx] > max_retries:
+                    results[idx] = {'image': path, 'error': f"Worker crashed {crashes[idx]} times"}
+                    return
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    try:
+        while pending:
+            done_before = len(results)
+            pool = make_pool(workers)
+            futures = {pool.submit(_process_chunk, items): key for key, items in pending.items()}
+            broken = False
+            for fut in as_completed(futures):
+                try:
+                    out = fut.result()
+                except BrokenProcessPool:
+                    broken = True
+                    continue
+                for idx, res in out:
+                    results[idx] = res
+                del pending[futures[fut]]
+            # The executor forgets its processes on shutdown
+            processes = list((pool._processes or {}).values())
+            pool.shutdown(wait=True, cancel_futures=True)
+            if not broken:
+                break
+
+            suspects = _in_flight(marker_dir)
+            # Drop already-finished images from the chunks that are left
+            remaining = [(idx, path) for items in pending.values() for idx, path in items
+                         if idx not in results]
+            for idx, path in remaining:
+                if idx in suspects:
+                    run_isolated(idx, path)
+            remaining = [(idx, path) for idx, path in remaining if idx not in results]
+            stalled = 0 if len(results) > done_before else stalled + 1
+            if stalled > max_pool_restarts:
+                exit_code = _crash_exit_code(processes)
+                for idx, path in remaining:
+                    results[idx] = {'image': path, 'error': f"Worker pool crashed {stalled} times in a row "
+                                                            f"(last exit code {exit_code})"}
+                break
+            restarts += 1
+            pending = {i // chunk_size: remaining[i:i + chunk_size] for i in range(0, len(remaining), chunk_size)}
+    finally:
+        shutil.rmtree(marker_dir, ignore_errors=True)
+
+    wall = time.perf_counter() - start
+    ordered = [results[i] for i in range(len(image_paths))]
+    ok = sum(1 for r in ordered if 'error' not in r)
+    stats = {
+        'workers': workers,
+        'preload': preload,
+        'images': len(ordered),
+        'failed': len(ordered) - ok,
+        'pool_restarts': restarts,
+        'wall_sec': wall,
+        'images_per_sec': ok / wall if wall > 0 else 0.0
+    }
+    return ordered, stats
+
+
+if __name__ == "__main__":
+    import argparse
+    from run_all_pipeline import collect_images, write_batch_csv
+    parser = argparse.ArgumentParser(description="Multi-process OCR + GIS batch engine")
+    parser.add_argument("source", help="Directory, glob pattern or manifest file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--preload", choices=["parent", "worker"], default="parent")
+    parser.add_argument("--memory-budget-mb", type=int, default=None)
+    parser.add_argument("--per-worker-mb", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    parser.add_argument("--max-pool-restarts", type=int, default=3)
+    parser.add_argument("--output", default="output_gis_batch.csv")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    results, stats = run_pool(collect_images(args.source), args.workers, args.preload, args.memory_budget_mb,
+                              args.per_worker_mb, args.chunk_size, max_pool_restarts=args.max_pool_restarts,
+                              yolo_model_path=args.model, device=args.device)
+    write_batch_csv([r for r in results if 'error' not in r], args.output)
+    for r in results:
+        if 'error' in r:
+            print(f"  FAILED {r['image']}: {r['error']}")
+    print(f"Processed {stats['images'] - stats['failed']}/{stats['images']} images on {stats['workers']} workers "
+          f"({stats['preload']} preload) in {stats['wall_sec']:.1f}s ({stats['images_per_sec']:.2f} images/sec), "
+          f"{stats['pool_restarts']} pool restart(s)")
+    print(f"Batch CSV written: {args.output}")
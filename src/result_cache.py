@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Project-root cache folder, next to output_gis.csv and roboflow_output/
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.polepad_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_fingerprints = {}
+
+
+def to_jsonable(value):
+    """
+    Converts pipeline results into plain JSON types (numpy scalars/arrays,
+    tuples, nested dicts). The large 'raw_result' payload is dropped.
+    """
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items() if k != 'raw_result'}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, 'tolist'):
+        # numpy arrays and numpy scalars
+        return value.tolist()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def model_version(*model_ids):
+    """
+    Fingerprints the models behind a result. Weight files that exist on disk
+    are hashed by content (memoized on path, size and mtime), so replacing the
+    weights changes the version; anything else (e.g. a hosted workflow id or
+    a weights name ultralytics downloads on demand) is used as-is.
+    """
+    parts = []
+    for model_id in model_ids:
+        if os.path.isfile(model_id):
+            st = os.stat(model_id)
+            memo_key = (os.path.abspath(model_id), st.st_size, st.st_mtime)
+            if memo_key not in _fingerprints:
+                _fingerprints[memo_key] = file_sha256(model_id)
+            parts.append(_fingerprints[memo_key])
+        else:
+            parts.append(str(model_id))
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    On-disk, content-addressed cache of process_image() results.
+
+    Entries are keyed by the image content hash, pipeline mode, model version
+    and config, stored as JSON under cache_dir, and evicted least-recently-used
+    first once the folder grows past max_bytes (file mtime is the recency
+    stamp and is bumped on every hit).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(os.path.getsize(p) for p in self._entries())
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    @staticmethod
+    def make_key(image_path, mode, version, config=None):
+        h = hashlib.sha256()
+        h.update(file_sha256(image_path).encode('utf-8'))
+        h.update(mode.encode('utf-8'))
+        h.update(version.encode('utf-8'))
+        h.update(json.dumps(config or {}, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry['result']
+
+    def put(self, key, result, mode, version):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'key': key, 'mode': mode, 'model_version': version, 'created': time.time(),
+                 'result': to_jsonable(result)}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp, path)
+        with self._lock:
+            self._size += os.path.getsize(path) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Oldest-used first until we are back under 90% of the budget
+        entries = sorted(self._entries(), key=lambda p: os.path.getmtime(p))
+        target = self.max_bytes * 0.9
+        for path in entries:
+            if self._size <= target:
+                break
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._size -= size
+            self.evictions += 1
+
+    def invalidate(self, mode=None, keep_version=None):
+        """
+        Removes cached entries: all of them, or only those for mode, and of
+        those only the ones whose model version differs from keep_version.
+        Call this after swapping model weights. Returns the number removed.
+        """
+        removed = 0
+        with self._lock:
+            for path in list(self._entries()):
+                if mode is not None or keep_version is not None:
+                    try:
+                        with open(path) as f:
+                            entry = json.load(f)
+                    except (OSError, ValueError):
+                        entry = {}
+                    if mode is not None and entry.get('mode') not in (mode, None):
+                        continue
+                    if keep_version is not None and entry.get('model_version') == keep_version:
+                        continue
+                self._size -= os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+            self.invalidations += removed
+        return removed
+
+    def ensure_model_version(self, mode, version):
+        """
+        Drops the mode's stale entries the first time a new model version is
+        seen for it, tracked in a small VERSION file inside the cache folder.
+        """
+        marker = os.path.join(self.cache_dir, 'VERSION')
+        versions = {}
+        if os.path.exists(marker):
+            try:
+                with open(marker) as f:
+                    versions = json.load(f)
+            except ValueError:
+                versions = {}
+        if versions.get(mode) == version:
+            return 0
+        removed = self.invalidate(mode=mode, keep_version=version) if mode in versions else 0
+        versions[mode] = version
+        with open(marker, 'w') as f:
+            json.dump(versions, f)
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes
+        }
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Returns the process-wide default ResultCache."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,246 @@
+import atexit
+import csv
+import io
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within this process
+    fcntl = None
+
+DEFAULT_FLUSH_ROWS = 64
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock shared by every process writing `path`
+    (held on a `path + '.lock'` side file, so the CSV itself can be replaced).
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CsvSink:
+    """
+    Buffered CSV writer for pipeline results.
+
+    Rows are collected in memory and written in one go once flush_rows are
+    pending, flush_interval seconds after the first unflushed row, on
+    flush()/close(), or at interpreter exit. Each flush takes a file lock, so
+    several pipeline processes can share one CSV without interleaving rows.
+
+    With key=None rows are appended. With key set to a column name (or a
+    tuple of them), the file is treated as a table keyed on those columns:
+    a row replaces the existing row with the same key instead of adding a
+    duplicate. Rows whose key is empty are always appended.
+
+    Flushes only ever append, so their cost is set by the rows flushed, not
+    by the file size. A keyed sink remembers the keys already in the file
+    (reading only what other processes appended since its last look); a row
+    whose key is already there is appended as well, and the superseded rows
+    are dropped in one rewrite by close()/compact() or at interpreter exit.
+    Until then a reader may see both versions of a row, the later one last.
+    """
+
+    def __init__(self, path, fieldnames, key=None, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.key = (key,) if isinstance(key, str) else tuple(key) if key else None
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.flushes = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._timer = None
+        # Keys in the file as of (inode, offset) read so far; see _file_keys
+        self._keys = set()
+        self._seen = None
+        self._superseded = False
+
+    def write(self, row):
+        row = {k: row.get(k, '') for k in self.fieldnames}
+        with self._lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+            if pending == 1 and self.flush_interval and pending < self.flush_rows:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if pending >= self.flush_rows:
+            self.flush()
+
+    def _row_key(self, row):
+        values = tuple(str(row.get(k, '')).strip() for k in self.key)
+        return values if all(values) else None
+
+    def flush(self):
+        """Writes every buffered row. Returns how many were written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not rows:
+                return 0
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with file_lock(self.path):
+                if self.key:
+                    self._upsert(rows)
+                else:
+                    self._append(rows)
+            self.rows_written += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def _append(self, rows):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=self.fieldnames)
+        if not os.path.isfile(self.path) or os.path.getsize(self.path) == 0:
+            writer.writeheader()
+        writer.writerows(rows)
+        # One write per flush; O_APPEND keeps it at the end even without the lock
+        with open(self.path, 'a', newline='') as f:
+            f.write(out.getvalue())
+
+    def _upsert(self, rows):
+        keys = self._file_keys()
+        for row in rows:
+            key = self._row_key(row)
+            if key is None:
+                continue
+            if key in keys:
+                self._superseded = True
+            keys.add(key)
+        self._append(rows)
+        st = os.stat(self.path)
+        self._seen = (st.st_ino, st.st_size)
+
+    def _file_keys(self):
+        """
+        Keys currently in the file. Other writers only append (or compact,
+        which replaces the file), so after the first full read only the bytes
+        added since this sink last looked are parsed.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._keys, self._seen = set(), None
+            return self._keys
+        offset = 0
+        if self._seen is not None and self._seen[0] == st.st_ino and self._seen[1] <= st.st_size:
+            offset = self._seen[1]
+        else:
+            self._keys = set()
+        if offset < st.st_size:
+            with open(self.path, newline='') as f:
+                header = next(csv.reader(f), None)
+                if header:
+                    if offset:
+                        f.seek(offset)
+                    for values in csv.reader(f):
+                        key = self._row_key(dict(zip(header, values)))
+                        if key is None:
+                            continue
+                        if key in self._keys:
+                            self._superseded = True
+                        self._keys.add(key)
+        self._seen = (st.st_ino, st.st_size)
+        return self._keys
+
+    def compact(self):
+        """
+        Rewrites a keyed file once, keeping only the latest row per key (in
+        the position of its first occurrence). A no-op when nothing was
+        superseded.
+        """
+        with self._lock:
+            if not self.key or not self._superseded or not os.path.isfile(self.path):
+                return
+            with file_lock(self.path):
+                table = {}
+                unkeyed = []
+                with open(self.path, newline='') as f:
+                    for row in csv.DictReader(f):
+                        self._place(table, unkeyed, row)
+                # Write a side file and swap it in, so readers never see a half-written CSV
+                fd, tmp_path = tempfile.mkstemp(prefix='.sink_', dir=os.path.dirname(self.path) or '.')
+                try:
+                    with os.fdopen(fd, 'w', newline='') as f:
+                        writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore', restval='')
+                        writer.writeheader()
+                        writer.writerows(table.values())
+                        writer.writerows(unkeyed)
+                    os.replace(tmp_path, self.path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                self._keys = set(table)
+                st = os.stat(self.path)
+                self._seen = (st.st_ino, st.st_size)
+                self._superseded = False
+
+    def _place(self, table, unkeyed, row):
+        key = self._row_key(row)
+        if key is None:
+            unkeyed.append(row)
+        else:
+            # dicts keep first-insertion order, so a replaced row stays where it was
+            table[key] = row
+
+    def close(self):
+        self.flush()
+        self.compact()
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(path, fieldnames, key=None, **kwargs):
+    """
+    Shared sink for path, created on first use and flushed at exit.
+    Later calls for the same file return the same sink.
+    """
+    abs_path = os.path.abspath(path)
+    with _sinks_lock:
+        sink = _sinks.get(abs_path)
+        if sink is None:
+            sink = CsvSink(path, fieldnames, key=key, **kwargs)
+            _sinks[abs_path] = sink
+    return sink
+
+
+def flush_all():
+    """Flushes every shared sink."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.flush()
+
+
+def close_all():
+    """Flushes and compacts every shared sink (runs at interpreter exit)."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(close_all)
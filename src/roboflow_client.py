@@ -0,0 +1,388 @@
+"""
+Roboflow scene-detection clients.
+
+get_workflow_client() hands out one shared synchronous InferenceHTTPClient.
+AsyncWorkflowClient keeps many workflow requests in flight over one pooled
+aiohttp session, with a concurrency cap, an optional rate limit and retries
+with jittered exponential backoff for transient failures:
+
+    python src/roboflow_client.py src/images --concurrency 8 [--rate 10]
+    python src/roboflow_client.py src/images --api-url http://127.0.0.1:9001   # replay server
+
+Point api_url at src/roboflow_replay.py to exercise it offline.
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+ROBOFLOW_API_URL = os.environ.get('ROBOFLOW_API_URL', "https://serverless.roboflow.com")
+# Find this in Roboflow: Workspace > Settings > API Key
+ROBOFLOW_API_KEY = os.environ.get('ROBOFLOW_API_KEY', "XrAdoF6M9mxcYRG0qyLi")
+WORKSPACE = "polepad"
+WORKFLOW_ID = "find-poles-wires-and-vegetations"
+
+# Uploads are shrunk to the model's input resolution before they leave the machine;
+# the hosted model resizes to this anyway, so larger uploads only cost bandwidth
+UPLOAD_MAX_SIDE = int(os.environ.get('POLEPAD_UPLOAD_MAX_SIDE', 640))
+UPLOAD_QUALITY = 90
+
+# Status codes worth retrying: rate limited, or the service is briefly unavailable
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+_sync_clients = {}
+_sync_lock = threading.Lock()
+
+
+def get_workflow_client(api_url=ROBOFLOW_API_URL, api_key=ROBOFLOW_API_KEY):
+    """
+    Shared synchronous InferenceHTTPClient for (api_url, api_key), created on
+    first use, so one-image-at-a-time callers don't build one per image.
+    inference_sdk is imported here rather than at module level: it pulls in
+    supervision, scipy and aiohttp, which nothing but the hosted call needs.
+    """
+    with _sync_lock:
+        client = _sync_clients.get((api_url, api_key))
+        if client is None:
+            from inference_sdk import InferenceHTTPClient
+            client = InferenceHTTPClient(api_url=api_url, api_key=api_key)
+            _sync_clients[(api_url, api_key)] = client
+        return client
+
+
+def roboflow_summary(preds):
+    """
+    Wire count and vegetation score (0-100) from workflow predictions,
+    as reported in roboflow_results.csv.
+    """
+    wire_count = sum(1 for p in preds if p.get('class', '').lower() in ['wire', 'wires', 'line', 'power line'])
+    veg_count = sum(1 for p in preds if 'vegetation' in p.get('class', '').lower())
+    # Vegetation score: scale, then cut by 50% but max 100
+    raw_score = min(100, veg_count * 20) if veg_count > 0 else 0
+    vegetation_score = min(100, int(raw_score * 0.5))
+    return wire_count, vegetation_score
+
+
+def workflow_predictions(result):
+    """The prediction list from a run_workflow result (list of output dicts)."""
+    if isinstance(result, list) and result:
+        return result[0].get('predictions', {}).get('predictions', [])
+    return []
+
+
+_REDUCED_READ = {2: 'IMREAD_REDUCED_COLOR_2', 4: 'IMREAD_REDUCED_COLOR_4', 8: 'IMREAD_REDUCED_COLOR_8'}
+
+
+def _image_size(image_path):
+    """(width, height) as displayed, from the file header only; None if unknown."""
+    try:
+        from PIL import Image
+        with Image.open(image_path) as im:
+            w, h = im.size
+            # EXIF orientations 5-8 are rotated by 90 degrees
+            if im.getexif().get(0x0112) in (5, 6, 7, 8):
+                w, h = h, w
+        return w, h
+    except Exception:
+        return None
+
+
+def prepare_upload(image_path, max_side=UPLOAD_MAX_SIDE, quality=UPLOAD_QUALITY):
+    """
+    Downscales an image so its longer side is at most max_side and re-encodes
+    it as JPEG at `quality`. Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale
+    straight from the DCT data, so a 24 MP photo is never fully decoded.
+    If re-encoding would not save anything, or max_side is 0/None, the
+    original file bytes are sent instead. Returns (encoded bytes, info); info
+    has the per-axis scale applied (scale_x / scale_y, upload / original),
+    both sizes, both byte counts and prepare_sec.
+    """
+    start = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        original = f.read()
+    size = _image_size(image_path)
+    if not max_side:
+        return original, {
+            'scale_x': 1.0,
+            'scale_y': 1.0,
+            'original_size': list(size) if size else None,
+            'upload_size': list(size) if size else None,
+            'original_bytes': len(original),
+            'upload_bytes': len(original),
+            'prepare_sec': time.perf_counter() - start
+        }
+    import cv2
+    factor = 1
+    if size:
+        factor = next((f for f in (8, 4, 2) if max(size) / f >= max_side), 1)
+    img = cv2.imread(image_path, getattr(cv2, _REDUCED_READ[factor]) if factor > 1 else cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Could not load image: {image_path}")
+    w, h = size if size and factor > 1 else (img.shape[1], img.shape[0])
+    scale = min(1.0, max_side / max(w, h))
+    target = (max(1, round(w * scale)), max(1, round(h * scale)))
+    if (img.shape[1], img.shape[0]) != target:
+        img = cv2.resize(img, target, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    data = buf.tobytes() if ok else original
+    if len(data) >= len(original):
+        # Smaller is the point; the original needs no coordinate mapping either
+        data, target = original, (w, h)
+    info = {
+        'scale_x': target[0] / w,
+        'scale_y': target[1] / h,
+        'original_size': [w, h],
+        'upload_size': list(target),
+        'original_bytes': len(original),
+        'upload_bytes': len(data),
+        'prepare_sec': time.perf_counter() - start
+    }
+    return data, info
+
+
+def scale_result(result, info):
+    """
+    Maps prediction coordinates in a run_workflow result from the uploaded
+    image back to the original image (in place), and returns the result.
+    """
+    scale_x, scale_y = info['scale_x'], info['scale_y']
+    if (scale_x == 1.0 and scale_y == 1.0) or not isinstance(result, list):
+        return result
+    for output in result:
+        predictions = output.get('predictions') if isinstance(output, dict) else None
+        if not isinstance(predictions, dict):
+            continue
+        if isinstance(predictions.get('image'), dict):
+            predictions['image'] = {'width': info['original_size'][0], 'height': info['original_size'][1]}
+        for pred in predictions.get('predictions', []):
+            for k, scale in (('x', scale_x), ('width', scale_x), ('y', scale_y), ('height', scale_y)):
+                if k in pred:
+                    pred[k] = pred[k] / scale
+            for point in pred.get('points', []) or []:
+                point['x'] = point['x'] / scale_x
+                point['y'] = point['y'] / scale_y
+    return result
+
+
+def recording_name(image_b64):
+    """File name (without .json) a recorded response is stored under: a hash of the request image."""
+    return hashlib.sha256(image_b64.encode('ascii')).hexdigest()[:20]
+
+
+class WorkflowError(Exception):
+    def __init__(self, message, status=None, transient=False):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+
+
+class AsyncWorkflowClient:
+    """
+    asyncio client for a Roboflow workflow.
+
+    One aiohttp session (and connection pool) is opened per `async with`
+    block. At most `concurrency` requests are in flight; with rate_per_sec
+    set, request starts are additionally spaced to that rate. Transient
+    failures (connection errors, timeouts, 408/429/5xx) are retried up to
+    max_retries times with full-jitter exponential backoff, honouring a
+    Retry-After header when the server sends one. With record_dir set, every
+    successful response is saved there for roboflow_replay.py.
+
+    With upload_max_side set, image paths are downscaled and re-encoded
+    before upload (see prepare_upload) and predictions are mapped back to the
+    original resolution. stats accumulates upload/original bytes, prepare
+    time and request time.
+    """
+
+    def __init__(self, api_url=ROBOFLOW_API_URL, api_key=ROBOFLOW_API_KEY, workspace=WORKSPACE,
+                 workflow_id=WORKFLOW_ID, concurrency=8, rate_per_sec=None, max_retries=4, backoff_base=0.5,
+                 backoff_max=8.0, timeout=60.0, record_dir=None, upload_max_side=None,
+                 upload_quality=UPLOAD_QUALITY):
+        self.url = f"{api_url.rstrip('/')}/{workspace}/workflows/{workflow_id}"
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.rate_per_sec = rate_per_sec
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.upload_max_side = upload_max_side
+        self.upload_quality = upload_quality
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'succeeded': 0, 'original_bytes': 0,
+                      'upload_bytes': 0, 'prepare_sec': 0.0, 'request_sec': 0.0}
+        self._session = None
+        self._semaphore = None
+        self._rate_lock = None
+        self._next_start = 0.0
+
+    async def __aenter__(self):
+        import asyncio
+        import aiohttp
+        self._aiohttp = aiohttp
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._rate_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def _wait_for_rate_slot(self):
+        if not self.rate_per_sec:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_start - now
+            self._next_start = max(now, self._next_start) + 1.0 / self.rate_per_sec
+        if wait > 0:
+            import asyncio
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _read(image):
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image)
+        with open(image, 'rb') as f:
+            return f.read()
+
+    async def run_workflow(self, image, **parameters):
+        """
+        Runs the workflow on one image (path or encoded bytes) and returns its
+        outputs list, like InferenceHTTPClient.run_workflow. Extra keyword
+        arguments are sent as workflow request fields (e.g. excluded_fields).
+        Raises WorkflowError once retries are exhausted or on a permanent error.
+        """
+        import asyncio
+        info = None
+        if self.upload_max_side and isinstance(image, str):
+            # Decode/resize/encode off the event loop
+            data, info = await asyncio.to_thread(prepare_upload, image, self.upload_max_side, self.upload_quality)
+            self.stats['original_bytes'] += info['original_bytes']
+            self.stats['prepare_sec'] += info['prepare_sec']
+        else:
+            data = self._read(image)
+            self.stats['original_bytes'] += len(data)
+        self.stats['upload_bytes'] += len(data)
+        image_b64 = base64.b64encode(data).decode('ascii')
+        payload = {'api_key': self.api_key, 'use_cache': True,
+                   'inputs': {'image': {'type': 'base64', 'value': image_b64}}}
+        payload.update(parameters)
+        body = json.dumps(payload)
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                await self._wait_for_rate_slot()
+                self.stats['requests'] += 1
+                retry_after = None
+                sent = time.perf_counter()
+                try:
+                    async with self._session.post(self.url, data=body,
+                                                  headers={'Content-Type': 'application/json'}) as resp:
+                        if resp.status == 200:
+                            response = await resp.json(content_type=None)
+                            self.stats['request_sec'] += time.perf_counter() - sent
+                            self.stats['succeeded'] += 1
+                            if self.record_dir:
+                                self._record(image_b64, response)
+                            outputs = response.get('outputs', response)
+                            return scale_result(outputs, info) if info else outputs
+                        text = await resp.text()
+                        if resp.headers.get('Retry-After', '').replace('.', '', 1).isdigit():
+                            retry_after = float(resp.headers['Retry-After'])
+                        error = WorkflowError(f"HTTP {resp.status}: {text[:200]}", resp.status,
+                                              transient=resp.status in TRANSIENT_STATUS)
+                except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = WorkflowError(f"{type(e).__name__}: {e}", transient=True)
+                if not error.transient or attempt >= self.max_retries:
+                    self.stats['failures'] += 1
+                    raise error
+                self.stats['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+                attempt += 1
+
+    def _record(self, image_b64, response):
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(os.path.join(self.record_dir, f"{recording_name(image_b64)}.json"), 'w') as f:
+            json.dump(response, f)
+
+    async def run_many(self, images, **parameters):
+        """
+        Runs the workflow on every image concurrently. Returns results in input
+        order; an image that failed has its WorkflowError in its place.
+        """
+        import asyncio
+        return await asyncio.gather(*(self.run_workflow(img, **parameters) for img in images),
+                                    return_exceptions=True)
+
+
+def run_workflow_batch(images, parameters=None, **client_kwargs):
+    """
+    Synchronous wrapper: runs the workflow on every image with an
+    AsyncWorkflowClient and returns (results, stats). parameters are extra
+    workflow request fields, as for run_workflow.
+    """
+    import asyncio
+
+    async def go():
+        async with AsyncWorkflowClient(**client_kwargs) as client:
+            results = await client.run_many(images, **(parameters or {}))
+            return results, client.stats
+    return asyncio.run(go())
+
+
+if __name__ == "__main__":
+    import argparse
+    from run_all_pipeline import collect_images, save_roboflow_csv
+    parser = argparse.ArgumentParser(description="Concurrent Roboflow scene detection")
+    parser.add_argument("source", help="Directory, glob pattern or manifest file")
+    parser.add_argument("--api-url", default=ROBOFLOW_API_URL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="Max requests started per second")
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--record", default=None, help="Save responses here for roboflow_replay.py")
+    parser.add_argument("--no-csv", action="store_true")
+    parser.add_argument("--upload-max-side", type=int, default=UPLOAD_MAX_SIDE,
+                        help="Downscale uploads to this longer side (0 = send originals)")
+    parser.add_argument("--upload-quality", type=int, default=UPLOAD_QUALITY)
+    parser.add_argument("--predictions-only", action="store_true",
+                        help="Skip Roboflow's rendered image; store predictions for roboflow_render.py")
+    args = parser.parse_args()
+
+    paths = collect_images(args.source)
+    start = time.perf_counter()
+    parameters = {'excluded_fields': ['visualization']} if args.predictions_only else {}
+    results, stats = run_workflow_batch(paths, parameters, api_url=args.api_url, concurrency=args.concurrency,
+                                        rate_per_sec=args.rate, max_retries=args.retries, record_dir=args.record,
+                                        upload_max_side=args.upload_max_side or None,
+                                        upload_quality=args.upload_quality)
+    wall = time.perf_counter() - start
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            print(f"  FAILED {path}: {result}")
+            continue
+        wire_count, vegetation_score = roboflow_summary(workflow_predictions(result))
+        print(f"  {os.path.basename(path)}: wires={wire_count} vegetation_score={vegetation_score}")
+        if args.predictions_only:
+            from roboflow_render import save_predictions
+            save_predictions(path, result)
+        if not args.no_csv:
+            save_roboflow_csv(path, wire_count, vegetation_score,
+                              csv_folder=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                      'roboflow_output'))
+    print(f"{stats['succeeded']}/{len(paths)} images in {wall:.1f}s ({len(paths) / wall if wall else 0:.2f} images/sec), "
+          f"{stats['requests']} requests, {stats['retries']} retries")
+    print(f"Uploaded {stats['upload_bytes'] / 1e6:.2f} MB of {stats['original_bytes'] / 1e6:.2f} MB original, "
+          f"prepare {stats['prepare_sec'] / max(1, len(paths)) * 1000:.0f} ms/image, "
+          f"request {stats['request_sec'] / max(1, stats['succeeded']) * 1000:.0f} ms/image")
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+from result_cache import file_sha256
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICTIONS_DIR = os.path.join(_ROOT, 'roboflow_output', 'predictions')
+RENDER_DIR = os.path.join(_ROOT, 'roboflow_visualizations', 'rendered')
+# Bump when the drawing changes so cached renders are redrawn
+RENDER_VERSION = 1
+
+_PALETTE = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207), (10, 249, 72),
+            (23, 204, 146), (134, 219, 61), (211, 188, 0), (255, 149, 0), (255, 55, 0), (255, 0, 199)]
+
+
+def _color(label):
+    return _PALETTE[int(hashlib.md5(label.encode('utf-8')).hexdigest(), 16) % len(_PALETTE)]
+
+
+def save_predictions(image_path, result, out_dir=PREDICTIONS_DIR):
+    """
+    Stores the predictions from a workflow result (without any visualization)
+    next to the other Roboflow outputs, and returns the JSON path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    predictions = result[0].get('predictions', {}) if isinstance(result, list) and result else {}
+    record = {
+        'image': os.path.abspath(image_path),
+        'image_sha256': file_sha256(image_path),
+        'predictions': predictions
+    }
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    path = os.path.join(out_dir, f"{base_name}_predictions.json")
+    with open(path, 'w') as f:
+        json.dump(record, f)
+    return path
+
+
+def draw_predictions(img, predictions):
+    """
+    Draws Roboflow predictions ({'image': {width, height}, 'predictions': [...]})
+    on a copy of img: boxes (center x/y, width, height), polygons when the
+    prediction has 'points', and a class/confidence label. Coordinates are
+    rescaled if the prediction image size differs from img.
+    """
+    out = img.copy()
+    h, w = out.shape[:2]
+    size = predictions.get('image') or {}
+    sx = w / size['width'] if size.get('width') else 1.0
+    sy = h / size['height'] if size.get('height') else 1.0
+    thickness = max(2, round(min(h, w) / 400))
+    font_scale = max(0.5, min(h, w) / 1200)
+    for pred in predictions.get('predictions', []):
+        label = str(pred.get('class', 'unknown'))
+        color = _color(label)
+        x, y, bw, bh = (pred.get(k, 0) for k in ('x', 'y', 'width', 'height'))
+        x1, y1 = int((x - bw / 2) * sx), int((y - bh / 2) * sy)
+        x2, y2 = int((x + bw / 2) * sx), int((y + bh / 2) * sy)
+        points = pred.get('points')
+        if points:
+            poly = [[int(p['x'] * sx), int(p['y'] * sy)] for p in points]
+            cv2.polylines(out, [np.array(poly, dtype=np.int32).reshape(-1, 1, 2)], True, color, thickness)
+        else:
+            cv2.rectangle(out, (x1, y1), (x2, y2), color, thickness)
+        text = f"{label} {pred.get('confidence', 0):.2f}"
+        (tw, th), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        ty = max(y1, th + baseline)
+        cv2.rectangle(out, (x1, ty - th - baseline), (x1 + tw, ty), color, -1)
+        cv2.putText(out, text, (x1, ty - baseline), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), 1,
+                    cv2.LINE_AA)
+    return out
+
+
+def render_visualization(predictions_path, image_path=None, out_dir=RENDER_DIR):
+    """
+    Returns the path of the annotated image for a stored predictions file,
+    drawing it with OpenCV on first request. Renders are cached by image
+    content, predictions and RENDER_VERSION, so repeat views are a file lookup.
+    image_path defaults to the image recorded with the predictions.
+    """
+    with open(predictions_path) as f:
+        record = json.load(f)
+    image_path = image_path or record['image']
+    image_hash = record.get('image_sha256') or file_sha256(image_path)
+    key = hashlib.sha256(json.dumps([image_hash, record['predictions'], RENDER_VERSION],
+                                    sort_keys=True).encode('utf-8')).hexdigest()[:20]
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    out_path = os.path.join(out_dir, f"{base_name}_{key}.png")
+    if os.path.isfile(out_path):
+        return out_path
+    img = cv2.imread(image_path)
+    if img is None:
+        raise FileNotFoundError(f"Could not load image: {image_path}")
+    os.makedirs(out_dir, exist_ok=True)
+    # Write then rename, so a concurrent viewer never picks up a half-written PNG
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.png"
+    cv2.imwrite(tmp_path, draw_predictions(img, record['predictions']))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python roboflow_render.py <predictions.json> [image_path]")
+        sys.exit(1)
+    print(render_visualization(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None))
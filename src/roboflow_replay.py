@@ -0,0 +1,156 @@
+"""
+Local stand-in for the Roboflow workflow API, for offline throughput and
+failure-handling tests of roboflow_client.
+
+Serves POST /<workspace>/workflows/<workflow_id> from recorded responses
+(JSON files written by `roboflow_client.py --record DIR`, named after the
+request image). Requests for images that were never recorded get the
+recordings in rotation, or an empty prediction set if there are none.
+Latency and failures can be injected:
+
+    python src/roboflow_replay.py --recordings recordings/ --latency 0.4 --jitter 0.1 --fail-rate 0.1
+"""
+import glob
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from roboflow_client import recording_name
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 9001
+EMPTY_RESPONSE = {'outputs': [{'predictions': {'image': {}, 'predictions': []}}]}
+
+
+class ReplayBackend:
+    """
+    Recorded responses plus the fault model. fail_rate is the chance a request
+    gets a 503; throttle_rate the chance of a 429 with Retry-After.
+    """
+
+    def __init__(self, recordings_dir=None, latency=0.0, jitter=0.0, fail_rate=0.0, throttle_rate=0.0,
+                 retry_after=0.1, seed=0):
+        self.responses = {}
+        if recordings_dir:
+            for path in sorted(glob.glob(os.path.join(recordings_dir, '*.json'))):
+                with open(path) as f:
+                    self.responses[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+        self._rotation = itertools.cycle(list(self.responses.values()) or [EMPTY_RESPONSE])
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'failed': 0, 'throttled': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    def handle(self, request):
+        """Returns (status, headers, payload) for one decoded request body."""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            roll = self._rng.random()
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        try:
+            time.sleep(delay)
+            if roll < self.throttle_rate:
+                with self._lock:
+                    self.stats['throttled'] += 1
+                return 429, {'Retry-After': str(self.retry_after)}, {'message': 'Rate limit exceeded'}
+            if roll < self.throttle_rate + self.fail_rate:
+                with self._lock:
+                    self.stats['failed'] += 1
+                return 503, {}, {'message': 'Service temporarily unavailable'}
+            image = request.get('inputs', {}).get('image', {})
+            response = self.responses.get(recording_name(image.get('value', '')))
+            if response is None:
+                with self._lock:
+                    response = next(self._rotation)
+            return 200, {}, response
+        finally:
+            with self._lock:
+                self.stats['in_flight'] -= 1
+
+
+def _make_handler(backend):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def _send(self, status, headers, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, {}, backend.stats)
+            else:
+                self._send(404, {}, {'message': 'Not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            raw = self.rfile.read(length)
+            if '/workflows/' not in self.path:
+                self._send(404, {}, {'message': 'Not found'})
+                return
+            try:
+                request = json.loads(raw or b'{}')
+            except ValueError:
+                self._send(400, {}, {'message': 'Body must be JSON'})
+                return
+            self._send(*backend.handle(request))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_replay_server(host=DEFAULT_HOST, port=0, **backend_kwargs):
+    """
+    Starts a replay server on a background thread. port=0 picks a free port.
+    Returns (httpd, url); call httpd.shutdown() to stop it.
+    """
+    backend = ReplayBackend(**backend_kwargs)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(backend))
+    httpd.daemon_threads = True
+    httpd.backend = backend
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay recorded Roboflow workflow responses")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--recordings', default=None, help="Directory of recorded responses (*.json)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds per request")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction answered with 429")
+    args = parser.parse_args()
+
+    backend = ReplayBackend(args.recordings, args.latency, args.jitter, args.fail_rate, args.throttle_rate)
+    httpd = ThreadingHTTPServer((args.host, args.port), _make_handler(backend))
+    httpd.daemon_threads = True
+    print(f"Roboflow replay server on http://{args.host}:{args.port} ({len(backend.responses)} recordings)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        print(json.dumps(backend.stats), file=sys.stderr)
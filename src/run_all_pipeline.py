@@ -1,67 +1,300 @@
 import os
-import cv2
 import base64
 import csv
-from preprocess import preprocess
-from infra_gis_detect import detect_infrastructure_attributes
-import easyocr
-from inference_sdk import InferenceHTTPClient
+import glob
+import time
+import tracing
+# Only light modules at the top: OpenCV/numpy (preprocess, infra_gis_detect,
+# pole_id_index) are imported by the modes that use them, and torch,
+# ultralytics and EasyOCR load with the first model (model_registry), so
+# --roboflow and the usage message start without them. test_startup.py
+# keeps an eye on this.
+from model_registry import ONNX_DEVICES, get_ocr_reader
+from result_cache import get_cache, model_version
+from result_sink import get_sink, flush_all
+from scene_local import DEFAULT_SCENE_MODEL
+from roboflow_client import (get_workflow_client, roboflow_summary, workflow_predictions, prepare_upload,
+                             scale_result, WORKSPACE, WORKFLOW_ID, UPLOAD_MAX_SIDE)
 
-def run_all(image_path, yolo_model_path='yolov8s.pt', output_csv='output_gis.csv'):
+def run_all(image_path, yolo_model_path='yolov8s.pt', output_csv='output_gis.csv', device='cpu', save_processed=True,
+            ocr_mode='full', time_budget_sec=None, min_confidence=0.6, tile_size=None):
     """
     Given an original image path, preprocesses the image, runs OCR, and GIS detection.
     Returns OCR results and GIS attributes. Also writes GIS attributes to CSV.
+    Models are taken from model_registry, so only the first call pays for loading.
+    The processed image stays in memory for OCR and detection; saving it to
+    src/processed/ happens in the background (save_processed=False skips it).
+    Pass output_csv=None to skip the CSV write (e.g. when a caller merges rows itself).
+
+    ocr_mode='cascade' skips the unconditional full-frame OCR: ROI crops are
+    read first and OCR stops once a pole ID is found with min_confidence,
+    falling back to a downscaled and then the full frame; time_budget_sec
+    caps the OCR time and returns the best result so far.
+
+    tile_size switches to tiled full-resolution detection for large survey
+    images: no whole-frame downscale or OCR, and memory bounded by the tile
+    size (see tiled_detect). result['tiling'] reports tiles and timings.
     """
+    if tile_size:
+        from tiled_detect import detect_infrastructure_attributes_tiled
+        with tracing.span('tiled_detect', tile_size=tile_size) as sp:
+            gis_attributes, tiling = detect_infrastructure_attributes_tiled(image_path, yolo_model_path, device,
+                                                                            tile_size=tile_size)
+            sp.set(tiles=tiling['tiles'], regions=tiling['regions'])
+        if output_csv:
+            from infra_gis_detect import write_gis_csv
+            with tracing.span('csv_write'):
+                write_gis_csv(gis_attributes, output_csv)
+        return {
+            'processed_image': None,
+            'ocr_results': [{'text': text, 'confidence': conf} for text, conf in tiling.pop('ocr_candidates')],
+            'gis_attributes': gis_attributes,
+            'csv': output_csv,
+            'tiling': tiling
+        }
+    import cv2
+    from preprocess import preprocess
+    from infra_gis_detect import detect_infrastructure_attributes
     # 1. Preprocess
-    img = cv2.imread(image_path)
-    if img is None:
-        raise FileNotFoundError(f"Could not load image: {image_path}")
-    processed_img = preprocess(img)
-    # Save processed image
+    with tracing.span('decode') as sp:
+        img = cv2.imread(image_path)
+        if img is None:
+            raise FileNotFoundError(f"Could not load image: {image_path}")
+        sp.set(width=img.shape[1], height=img.shape[0])
+    with tracing.span('preprocess'):
+        processed_img = preprocess(img)
+    # Save processed image (off the hot path)
+    processed_path = save_processed_image(image_path, processed_img, async_write=True) if save_processed else None
+
+    cascade = None
+    if ocr_mode == 'cascade':
+        # 2+3. Cascade: ROI OCR first, full frame only as a fallback
+        from infra_gis_detect import detect_infrastructure_attributes_cascade
+        with tracing.span('detect_attributes', ocr_mode='cascade'):
+            gis_attributes, cascade = detect_infrastructure_attributes_cascade(
+                processed_img, yolo_model_path, device, image_name=image_path,
+                min_confidence=min_confidence, time_budget_sec=time_budget_sec)
+        ocr_texts = [{'text': text, 'confidence': conf} for text, conf in cascade.pop('ocr_candidates')]
+    else:
+        # 2. OCR on processed image
+        reader = get_ocr_reader(['en'], device)
+        with tracing.span('ocr_full_frame'):
+            ocr_results = reader.readtext(processed_img, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+        tracing.count('ocr_calls')
+        ocr_texts = filter_ocr_results(ocr_results)
+
+        # 3. GIS detection (YOLO+EasyOCR) on the in-memory image
+        with tracing.span('detect_attributes', ocr_mode='full'):
+            gis_attributes = detect_infrastructure_attributes(processed_img, yolo_model_path, device,
+                                                              image_name=image_path)
+    # Write GIS attributes to CSV
+    if output_csv:
+        from infra_gis_detect import write_gis_csv
+        with tracing.span('csv_write'):
+            write_gis_csv(gis_attributes, output_csv)
+
+    result = {
+        'processed_image': processed_path,
+        'ocr_results': ocr_texts,
+        'gis_attributes': gis_attributes,
+        'csv': output_csv
+    }
+    if cascade is not None:
+        result['cascade'] = cascade
+    return result
+
+# Single background writer for processed images, so cv2.imwrite never blocks inference
+_image_writer = None
+_pending_writes = []
+
+def save_processed_image(image_path, processed_img, async_write=False):
+    """
+    Writes a preprocessed image to src/processed/<name>_processed<ext> and returns its path.
+    With async_write=True the encode/write runs on a background thread and the
+    path is returned immediately; call flush_processed_images() to wait for it.
+    """
+    global _image_writer
+    import cv2
     processed_dir = os.path.join(os.path.dirname(__file__), 'processed')
     if not os.path.exists(processed_dir):
-        os.makedirs(processed_dir)
+        os.makedirs(processed_dir, exist_ok=True)
     base, ext = os.path.splitext(os.path.basename(image_path))
     processed_filename = f"{base}_processed{ext}"
     processed_path = os.path.join(processed_dir, processed_filename)
-    cv2.imwrite(processed_path, processed_img)
+    if async_write:
+        if _image_writer is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _image_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='processed-writer')
+        _pending_writes[:] = [f for f in _pending_writes if not f.done()]
+        _pending_writes.append(_image_writer.submit(cv2.imwrite, processed_path, processed_img))
+    else:
+        cv2.imwrite(processed_path, processed_img)
+    return processed_path
+
+def flush_processed_images():
+    """Blocks until every background processed-image write has finished."""
+    while _pending_writes:
+        _pending_writes.pop(0).result()
 
-    # 2. OCR on processed image
-    reader = easyocr.Reader(['en'])
-    ocr_results = reader.readtext(processed_img, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+def filter_ocr_results(ocr_results):
+    """
+    Keeps only the alphanumeric part of each EasyOCR (box, text, conf) result.
+    """
     ocr_texts = []
     for _, text, conf in ocr_results:
         filtered = ''.join([c for c in text if c.isalnum()])
         if filtered:
             ocr_texts.append({'text': filtered, 'confidence': conf})
+    return ocr_texts
 
-    # 3. GIS detection (YOLO+EasyOCR)
-    gis_attributes = detect_infrastructure_attributes(processed_path, yolo_model_path)
-    # Write GIS attributes to CSV
-    from infra_gis_detect import write_gis_csv
-    write_gis_csv(gis_attributes, output_csv)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+
+def collect_images(source):
+    """
+    Expands a batch source into a sorted list of image paths.
+    source can be a directory, a glob pattern (e.g. 'src/images/*.jpg') or a
+    manifest file (.txt/.csv/.lst) listing one image path per line. Relative
+    paths in a manifest are resolved against the manifest's folder.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, f) for f in os.listdir(source)
+                 if f.lower().endswith(IMAGE_EXTENSIONS)]
+    elif os.path.isfile(source) and source.lower().endswith(('.txt', '.csv', '.lst')):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        paths = []
+        with open(source) as f:
+            for line in f:
+                # First column only, so a CSV manifest with extra columns works too
+                entry = line.split(',')[0].strip()
+                if not entry or entry.startswith('#') or not entry.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                paths.append(entry if os.path.isabs(entry) else os.path.join(base_dir, entry))
+    else:
+        paths = [p for p in glob.glob(source, recursive=True)
+                 if p.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(paths)
+
+def run_batch(source, batch_size=8, yolo_model_path='yolov8s.pt', output_csv='output_gis_batch.csv', device='cpu',
+              use_cache=True):
+    """
+    Runs the OCR + GIS pipeline over many images in one process.
+    Images are grouped into batches of batch_size: YOLO sees each batch in a
+    single forward pass and the EasyOCR recognizer uses the same batch size.
+    Results are cached per image like process_image(), so re-running a
+    directory only computes new or changed images. Each image gets a trace
+    (cache lookup, decode, preprocess) and each batch one more for the shared
+    OCR/detection pass. All rows for the run are written to one consolidated
+    CSV (with an 'image' column). Returns a summary dict with per-image
+    results and throughput.
+    """
+    import cv2
+    from preprocess import get_engine
+    from infra_gis_detect import detect_infrastructure_attributes_batch, readtext_batch
+    image_paths = collect_images(source)
+    engine = get_engine()
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        cache_mode, version = cache_scope('ocr_gis', yolo_model_path, device)
+        cache.ensure_model_version(cache_mode, version)
+    results = []
+    failed = []
+    cache_hits = 0
+    start = time.perf_counter()
+    for i in range(0, len(image_paths), batch_size):
+        chunk = image_paths[i:i + batch_size]
+        paths, processed, keys = [], [], []
+        for path in chunk:
+            with tracing.trace(path, mode='ocr_gis', device=device, ocr_mode='batch', batch_size=batch_size):
+                key = None
+                if cache is not None:
+                    with tracing.span('cache_key'):
+                        key = cache.make_key(path, cache_mode, version, {'yolo_model_path': yolo_model_path,
+                                                                         'ocr_mode': 'batch'})
+                    with tracing.span('cache_lookup'):
+                        cached = cache.get(key)
+                    if cached is not None:
+                        tracing.count('cache_hits')
+                        # Same content may have been cached from another path
+                        cached['image'] = path
+                        cached['cache'] = 'hit'
+                        results.append(cached)
+                        cache_hits += 1
+                        continue
+                    tracing.count('cache_misses')
+                with tracing.span('decode') as sp:
+                    img = cv2.imread(path)
+                    if img is not None:
+                        sp.set(width=img.shape[1], height=img.shape[0])
+                if img is None:
+                    failed.append({'image': path, 'error': 'Could not load image'})
+                    continue
+                with tracing.span('preprocess'):
+                    processed.append(engine.process(img))
+                paths.append(path)
+                keys.append(key)
+        if not processed:
+            continue
+        with tracing.trace(f"batch:{paths[0]}", mode='ocr_gis', device=device, ocr_mode='batch', images=paths):
+            reader = get_ocr_reader(['en'], device)
+            with tracing.span('ocr_full_frame', frames=len(processed)):
+                ocr_batch = readtext_batch(reader, processed, batch_size,
+                                           allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+            with tracing.span('detect_attributes', frames=len(processed)):
+                gis_list = detect_infrastructure_attributes_batch(processed, paths, yolo_model_path, device)
+            for path, key, processed_img, ocr_results, gis_attributes in zip(paths, keys, processed, ocr_batch,
+                                                                              gis_list):
+                result = {
+                    'image': path,
+                    'processed_image': save_processed_image(path, processed_img, async_write=True),
+                    'ocr_results': filter_ocr_results(ocr_results),
+                    'gis_attributes': gis_attributes
+                }
+                if key is not None:
+                    cache.put(key, result, cache_mode, version)
+                    result['cache'] = 'miss'
+                results.append(result)
+    flush_processed_images()
+    elapsed = time.perf_counter() - start
+
+    # One consolidated CSV per run, in input order whatever came from the cache
+    order = {path: n for n, path in enumerate(image_paths)}
+    results.sort(key=lambda r: order[r['image']])
+    write_batch_csv(results, output_csv)
 
     return {
-        'processed_image': processed_path,
-        'ocr_results': ocr_texts,
-        'gis_attributes': gis_attributes,
-        'csv': output_csv
+        'mode': 'batch',
+        'results': results,
+        'failed': failed,
+        'csv': output_csv,
+        'batch_size': batch_size,
+        'cache_hits': cache_hits,
+        'elapsed_sec': elapsed,
+        'images_per_sec': len(results) / elapsed if elapsed > 0 else 0.0
     }
 
+def write_batch_csv(results, output_csv):
+    """
+    Writes one consolidated GIS CSV (image + GIS attribute columns) for a batch run.
+    """
+    fieldnames = ['image', 'pole_id', 'pole_type', 'vegetation_encroachment', 'from_ocr']
+    with open(output_csv, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for r in results:
+            row = {k: r['gis_attributes'].get(k, '') for k in fieldnames[1:]}
+            row['image'] = os.path.basename(r['image'])
+            writer.writerow(row)
+
 def run_roboflow_inference(image_path):
     """
     Runs Roboflow inference on the given image and prints the results.
     Also saves the visualization image to disk in a new folder.
     """
-    # Replace with your actual API key from Roboflow dashboard if needed
-    api_key = "XrAdoF6M9mxcYRG0qyLi"  # Find this in Roboflow: Workspace > Settings > API Key
-    client = InferenceHTTPClient(
-        api_url="https://serverless.roboflow.com",
-        api_key=api_key
-    )
+    # Shared client; the API key comes from ROBOFLOW_API_KEY (see roboflow_client)
+    client = get_workflow_client()
     result = client.run_workflow(
-        workspace_name="polepad",
-        workflow_id="find-poles-wires-and-vegetations",
+        workspace_name=WORKSPACE,
+        workflow_id=WORKFLOW_ID,
         images={
             "image": image_path
         },
@@ -93,52 +326,161 @@ def run_roboflow_inference(image_path):
 def save_roboflow_csv(image_path, wire_count, vegetation_score, csv_folder='roboflow_output'):
     """
     Save Roboflow summary results to a CSV file in the specified folder.
+    Rows are buffered and upserted by image name (see result_sink), so
+    re-running an image updates its row instead of adding another.
     """
-    if not os.path.exists(csv_folder):
-        os.makedirs(csv_folder)
     csv_path = os.path.join(csv_folder, 'roboflow_results.csv')
-    file_exists = os.path.isfile(csv_path)
-    with open(csv_path, 'a', newline='') as csvfile:
-        fieldnames = ['image', 'wire_count', 'vegetation_score']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow({
-            'image': os.path.basename(image_path),
-            'wire_count': wire_count,
-            'vegetation_score': vegetation_score
-        })
+    get_sink(csv_path, ['image', 'wire_count', 'vegetation_score'], key='image').write({
+        'image': os.path.basename(image_path),
+        'wire_count': wire_count,
+        'vegetation_score': vegetation_score
+    })
     return csv_path
 
-def process_image(image_path, mode='ocr_gis'):
+def cache_scope(mode, yolo_model_path='yolov8s.pt', device='cpu', scene_backend='roboflow',
+                scene_model_path=DEFAULT_SCENE_MODEL):
+    """
+    (cache mode, model version) that results of this mode/backend/device are
+    cached under (see result_cache).
+    """
+    # Each backend is versioned on its own, so switching backends doesn't purge the other's entries
+    cache_mode = mode
+    if mode == 'roboflow' and scene_backend == 'local':
+        cache_mode = 'roboflow_local'
+        version = model_version(scene_model_path)
+    elif mode == 'roboflow':
+        version = model_version(f'{WORKSPACE}/{WORKFLOW_ID}')
+    else:
+        from pole_id_index import DEFAULT_GIS_CSV
+        # The registry decides which pole an OCR reading resolves to
+        version = model_version(yolo_model_path, 'easyocr:en', DEFAULT_GIS_CSV, 'pole-id-snap:2')
+    if device in ONNX_DEVICES and cache_mode != 'roboflow':
+        # ONNX Runtime (int8 especially) can read slightly differently from torch
+        cache_mode = f'{cache_mode}_{device}'
+    return cache_mode, version
+
+def process_image(image_path, mode='ocr_gis', yolo_model_path='yolov8s.pt', device='cpu', use_cache=True,
+                  ocr_mode='full', time_budget_sec=None, predictions_only=False, scene_backend='roboflow',
+                  scene_model_path=DEFAULT_SCENE_MODEL, upload_max_side=UPLOAD_MAX_SIDE, tile_size=None):
     """
     Unified entry point for UI or CLI.
     mode: 'roboflow' for Roboflow workflow, 'ocr_gis' for OCR+YOLOv8 GIS workflow.
-    Returns a dictionary with results and output paths.
+    Results are cached on disk by image content, mode and model version, so a
+    duplicate upload returns the stored result without any OCR/YOLO or Roboflow work.
+    ocr_mode='cascade' (with an optional time_budget_sec) is the bounded-latency
+    OCR path for interactive use; see run_all().
+    predictions_only=True asks Roboflow for predictions without the rendered
+    visualization and stores them instead (result['predictions_path']);
+    roboflow_render.render_visualization() draws the image when it is needed.
+    scene_backend='local' runs scene detection on a local detector
+    (scene_model_path, see scene_local) instead of the hosted workflow and
+    returns the same structure; the local path is always predictions-only.
+    Hosted uploads are downscaled to upload_max_side (0/None sends the
+    original file); boxes come back in original-image coordinates and
+    result['upload'] reports bytes, prepare time and request time.
+    tile_size runs the OCR/GIS mode tiled at full resolution (see run_all()).
+    device 'onnx' / 'onnx-int8' runs the local models on ONNX Runtime.
+    With tracing enabled (see tracing), each call records one trace of timed
+    stages and counters.
+    Returns a dictionary with results and output paths ('cache' is 'hit' or 'miss').
     """
+    with tracing.trace(image_path, mode=mode, device=device, ocr_mode=ocr_mode):
+        if not use_cache:
+            return _process_image_uncached(image_path, mode, yolo_model_path, device, ocr_mode, time_budget_sec,
+                                           predictions_only, scene_backend, scene_model_path, upload_max_side,
+                                           tile_size)
+        if not os.path.isfile(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        cache = get_cache()
+        cache_mode, version = cache_scope(mode, yolo_model_path, device, scene_backend, scene_model_path)
+        cache.ensure_model_version(cache_mode, version)
+        with tracing.span('cache_key'):
+            key = cache.make_key(image_path, cache_mode, version, {'yolo_model_path': yolo_model_path,
+                                                                   'ocr_mode': ocr_mode,
+                                                                   'predictions_only': predictions_only,
+                                                                   'scene_backend': scene_backend,
+                                                                   'upload_max_side': upload_max_side,
+                                                                   'tile_size': tile_size})
+        with tracing.span('cache_lookup'):
+            cached = cache.get(key)
+        if cached is not None:
+            tracing.count('cache_hits')
+            cached['cache'] = 'hit'
+            return cached
+        tracing.count('cache_misses')
+        result = _process_image_uncached(image_path, mode, yolo_model_path, device, ocr_mode, time_budget_sec,
+                                         predictions_only, scene_backend, scene_model_path, upload_max_side,
+                                         tile_size)
+        # A run cut short by the time budget is not the answer we'd want to replay
+        if not result.get('cascade', {}).get('timed_out'):
+            cache.put(key, result, cache_mode, version)
+        result['cache'] = 'miss'
+        return result
+
+def _process_image_uncached(image_path, mode, yolo_model_path, device, ocr_mode='full', time_budget_sec=None,
+                            predictions_only=False, scene_backend='roboflow', scene_model_path=DEFAULT_SCENE_MODEL,
+                            upload_max_side=UPLOAD_MAX_SIDE, tile_size=None):
+    if mode == 'roboflow' and scene_backend == 'local':
+        # Same output as the hosted workflow, from a detector on this machine
+        if not os.path.isfile(image_path):
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+        from roboflow_render import save_predictions
+        from scene_local import detect_scene
+        with tracing.span('scene_local') as sp:
+            result = detect_scene(image_path, scene_model_path, device)
+            preds = workflow_predictions(result)
+            sp.set(detections=len(preds))
+        tracing.count('boxes', len(preds))
+        wire_count, vegetation_score = roboflow_summary(preds)
+        with tracing.span('csv_write'):
+            csv_path = save_roboflow_csv(image_path, wire_count, vegetation_score, csv_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'roboflow_output'))
+        with tracing.span('save_predictions'):
+            predictions_path = save_predictions(image_path, result)
+        return {
+            'mode': 'roboflow',
+            'scene_backend': 'local',
+            'detections': preds,
+            'visualization': None,
+            'predictions_path': predictions_path,
+            'raw_result': result,
+            'wire_count': wire_count,
+            'vegetation_score': vegetation_score,
+            'csv': csv_path
+        }
     if mode == 'roboflow':
         # Roboflow inference
-        from inference_sdk import InferenceHTTPClient
-        import base64
-        api_key = "XrAdoF6M9mxcYRG0qyLi"
-        client = InferenceHTTPClient(
-            api_url="https://serverless.roboflow.com",
-            api_key=api_key
-        )
+        client = get_workflow_client()
         # Debug: print and check image path
         print(f"[DEBUG] Roboflow image path: {image_path}")
         if not os.path.isfile(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
-        result = client.run_workflow(
-            workspace_name="polepad",
-            workflow_id="find-poles-wires-and-vegetations",
-            images={"image": image_path},
-            use_cache=True
-        )
+        # Send a copy sized for the model instead of the full-resolution photo
+        with tracing.span('upload_prepare') as sp:
+            upload_data, upload = prepare_upload(image_path, upload_max_side)
+            sp.set(upload_bytes=upload['upload_bytes'], original_bytes=upload['original_bytes'])
+        request_start = time.perf_counter()
+        with tracing.span('roboflow_request', predictions_only=predictions_only):
+            result = client.run_workflow(
+                workspace_name=WORKSPACE,
+                workflow_id=WORKFLOW_ID,
+                images={"image": base64.b64encode(upload_data).decode('ascii')},
+                use_cache=True,
+                # The rendered PNG is usually bigger than the predictions; draw it locally on demand instead
+                excluded_fields=['visualization'] if predictions_only else None
+            )
+        tracing.count('roboflow_requests')
+        tracing.count('upload_bytes', upload['upload_bytes'])
+        upload['request_sec'] = time.perf_counter() - request_start
+        scale_result(result, upload)
         # Save visualization (fix: always use input image base name)
         vis_b64 = result[0].get('visualization') if isinstance(result, list) and result else None
         vis_path = None
-        if vis_b64:
+        predictions_path = None
+        if predictions_only:
+            from roboflow_render import save_predictions
+            with tracing.span('save_predictions'):
+                predictions_path = save_predictions(image_path, result)
+        elif vis_b64:
             # Always save to project root's roboflow_visualizations
             project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
             vis_folder = os.path.join(project_root, 'roboflow_visualizations')
@@ -146,56 +488,109 @@ def process_image(image_path, mode='ocr_gis'):
                 os.makedirs(vis_folder)
             base_name = os.path.splitext(os.path.basename(image_path))[0]
             vis_path = os.path.join(vis_folder, f"{base_name}_roboflow.png")
-            with open(vis_path, "wb") as f:
+            with tracing.span('save_visualization'), open(vis_path, "wb") as f:
                 f.write(base64.b64decode(vis_b64))
         # Parse predictions
-        preds = result[0].get('predictions', {}).get('predictions', []) if isinstance(result, list) and result else []
+        preds = workflow_predictions(result)
+        tracing.count('boxes', len(preds))
         # Count wires and vegetation
-        wire_count = sum(1 for p in preds if p.get('class', '').lower() in ['wire', 'wires', 'line', 'power line'])
-        veg_count = sum(1 for p in preds if 'vegetation' in p.get('class', '').lower())
-        # Vegetation score: scale, then cut by 50% but max 100
-        raw_score = min(100, veg_count * 20) if veg_count > 0 else 0
-        vegetation_score = min(100, int(raw_score * 0.5))
+        wire_count, vegetation_score = roboflow_summary(preds)
         # Save CSV summary in project root
-        csv_path = save_roboflow_csv(image_path, wire_count, vegetation_score, csv_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'roboflow_output'))
+        with tracing.span('csv_write'):
+            csv_path = save_roboflow_csv(image_path, wire_count, vegetation_score, csv_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'roboflow_output'))
         return {
             'mode': 'roboflow',
+            'scene_backend': 'roboflow',
             'detections': preds,
             'visualization': vis_path,
+            'predictions_path': predictions_path,
             'raw_result': result,
             'wire_count': wire_count,
             'vegetation_score': vegetation_score,
-            'csv': csv_path
+            'csv': csv_path,
+            'upload': upload
         }
     else:
         # OCR + GIS pipeline
-        res = run_all(image_path)
-        return {
+        res = run_all(image_path, yolo_model_path, device=device, ocr_mode=ocr_mode, time_budget_sec=time_budget_sec,
+                      tile_size=tile_size)
+        out = {
             'mode': 'ocr_gis',
             'ocr_results': res['ocr_results'],
             'gis_attributes': res['gis_attributes'],
             'processed_image': res['processed_image'],
             'csv': res['csv']
         }
+        if 'cascade' in res:
+            out['cascade'] = res['cascade']
+        if 'tiling' in res:
+            out['tiling'] = res['tiling']
+        return out
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
-        print("Usage: python run_all_pipeline.py <original_image_path> [--roboflow]")
+        print("Usage: python run_all_pipeline.py <original_image_path> [--roboflow [--predictions-only] | --scene-local | --cascade | --tiled] [--onnx | --onnx-int8] [--trace]")
+        print("       python run_all_pipeline.py --batch <dir|glob|manifest> [--batch-size N] [--output out.csv] [--no-cache] [--trace]")
         sys.exit(1)
+    if sys.argv[1] == "--batch":
+        import argparse
+        parser = argparse.ArgumentParser(description="Batch OCR + GIS pipeline")
+        parser.add_argument("--batch", required=True, help="Directory, glob pattern or manifest file")
+        parser.add_argument("--batch-size", type=int, default=8)
+        parser.add_argument("--output", default="output_gis_batch.csv")
+        parser.add_argument("--model", default="yolov8s.pt")
+        parser.add_argument("--device", default="cpu")
+        parser.add_argument("--no-cache", action="store_true", help="Recompute every image")
+        parser.add_argument("--trace", action="store_true", help="Record per-image traces")
+        args = parser.parse_args()
+        if args.trace:
+            tracing.enable()
+        summary = run_batch(args.batch, args.batch_size, args.model, args.output, args.device,
+                            use_cache=not args.no_cache)
+        print(f"\n--- Pipeline Mode: batch (batch size {summary['batch_size']}) ---")
+        for r in summary['results']:
+            print(f"  {os.path.basename(r['image'])}: pole_id={r['gis_attributes'].get('pole_id', '')}")
+        for f in summary['failed']:
+            print(f"  FAILED {f['image']}: {f['error']}")
+        print(f"Processed {len(summary['results'])} images in {summary['elapsed_sec']:.1f}s "
+              f"({summary['images_per_sec']:.2f} images/sec, {summary['cache_hits']} from cache)")
+        print(f"Batch CSV written: {summary['csv']}")
+        sys.exit(0)
     image_path = sys.argv[1]
-    mode = 'roboflow' if (len(sys.argv) > 2 and sys.argv[2] == "--roboflow") else 'ocr_gis'
-    result = process_image(image_path, mode)
+    mode = 'roboflow' if (len(sys.argv) > 2 and sys.argv[2] in ("--roboflow", "--scene-local")) else 'ocr_gis'
+    scene_backend = 'local' if "--scene-local" in sys.argv[2:] else 'roboflow'
+    ocr_mode = 'cascade' if "--cascade" in sys.argv[2:] else 'full'
+    predictions_only = "--predictions-only" in sys.argv[2:]
+    tile_size = 1024 if "--tiled" in sys.argv[2:] else None
+    device = next((d for d in ONNX_DEVICES if f"--{d}" in sys.argv[2:]), 'cpu')
+    if "--trace" in sys.argv[2:]:
+        tracing.enable()
+    result = process_image(image_path, mode, device=device, ocr_mode=ocr_mode, predictions_only=predictions_only,
+                           scene_backend=scene_backend, tile_size=tile_size)
     print(f"\n--- Pipeline Mode: {result['mode']} ---")
+    print(f"Result cache: {result['cache']} {get_cache().stats()}")
     if result['mode'] == 'roboflow':
-        print(f"Visualization image: {result['visualization']}")
+        if result.get('predictions_path'):
+            print(f"Predictions: {result['predictions_path']} (render with src/roboflow_render.py)")
+        else:
+            print(f"Visualization image: {result['visualization']}")
         print(f"Detections: {len(result['detections'])}")
         print(f"Wire count: {result['wire_count']}")
         print(f"Vegetation score (1-100): {result['vegetation_score']}")
         print(f"Roboflow CSV updated: {result['csv']}")
+        if result.get('upload'):
+            up = result['upload']
+            print(f"Upload: {up['upload_bytes'] / 1024:.0f} KB of {up['original_bytes'] / 1024:.0f} KB "
+                  f"({up['upload_size'][0]}x{up['upload_size'][1]}), prepare {up['prepare_sec'] * 1000:.0f} ms, "
+                  f"request {up['request_sec'] * 1000:.0f} ms")
         for pred in result['detections']:
             print(f"  Class: {pred.get('class', 'unknown')}, Confidence: {pred.get('confidence', 0):.2f}")
     else:
+        if 'tiling' in result:
+            t = result['tiling']
+            print(f"Tiled: {t['image_size'][0]}x{t['image_size'][1]} in {t['tiles']} tiles, "
+                  f"{t['regions']} regions after merging, {t['elapsed_sec']:.1f}s")
         print(f"Processed image: {result['processed_image']}")
         print("OCR Results:")
         for r in result['ocr_results']:
@@ -204,6 +599,19 @@ if __name__ == "__main__":
         for k, v in result['gis_attributes'].items():
             print(f"  {k}: {v}")
         print(f"GIS CSV updated: {result['csv']}")
+        if 'cascade' in result:
+            print(f"OCR cascade stages: {', '.join(result['cascade']['stages']) or 'none'} "
+                  f"(early exit: {result['cascade']['early_exit']}, timed out: {result['cascade']['timed_out']})")
+    if tracing.enabled():
+        trace = tracing.recent_traces()[-1]
+        print(f"Trace {trace['trace_id']}: {trace['duration_ms']:.0f} ms, counters {trace['counters']}")
+        for sp in trace['spans']:
+            depth, parent = 0, sp['parent']
+            while parent is not None:
+                depth, parent = depth + 1, trace['spans'][parent]['parent']
+            print(f"  {'  ' * depth}{sp['name']:<{24 - 2 * depth}} {sp['duration_ms']:9.1f} ms")
+    flush_processed_images()
+    flush_all()
 
     # Example usage:
     # run_roboflow_inference("src/images/PoleTag_24.jpg")
@@ -0,0 +1,93 @@
+import os
+import time
+import uuid
+
+from model_registry import get_yolo
+
+# Weights for the offline scene detector. For wire/vegetation counts that
+# agree with the hosted workflow, export the workflow's model weights from
+# Roboflow and point POLEPAD_SCENE_MODEL at them; the stock COCO yolov8s.pt
+# only detects generic objects.
+DEFAULT_SCENE_MODEL = os.environ.get('POLEPAD_SCENE_MODEL', 'yolov8s.pt')
+DEFAULT_CONFIDENCE = 0.4
+
+# Local class names mapped onto the workflow's names, so roboflow_summary()
+# counts them the same way. Extend this for custom-trained weights.
+CLASS_ALIASES = {
+    'power line': 'wire',
+    'powerline': 'wire',
+    'cable': 'wire',
+    'tree': 'vegetation',
+    'vegetations': 'vegetation',
+    'potted plant': 'vegetation'
+}
+
+
+def detect_scene(image, model_path=DEFAULT_SCENE_MODEL, device='cpu', confidence=DEFAULT_CONFIDENCE):
+    """
+    Runs the local detector on an image (path or BGR ndarray) and returns its
+    detections in the workflow's format: a run_workflow-style result
+    [{'predictions': {'image': {width, height}, 'predictions': [...]}}], each
+    prediction with center x/y, width, height, confidence, class and class_id.
+    The model comes from the shared registry, like the OCR/GIS detector.
+    """
+    if isinstance(image, str):
+        import cv2
+        img = cv2.imread(image)
+        if img is None:
+            raise FileNotFoundError(f"Could not load image: {image}")
+    else:
+        img = image
+    model = get_yolo(model_path, device)
+    result = model(img, conf=confidence, verbose=False)[0]
+    h, w = img.shape[:2]
+    preds = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = (float(v) for v in box.xyxy[0])
+        cls = int(box.cls[0])
+        name = str(model.names.get(cls, cls)) if isinstance(model.names, dict) else str(model.names[cls])
+        preds.append({
+            'x': (x1 + x2) / 2,
+            'y': (y1 + y2) / 2,
+            'width': x2 - x1,
+            'height': y2 - y1,
+            'confidence': float(box.conf[0]),
+            'class': CLASS_ALIASES.get(name.lower(), name),
+            'class_id': cls,
+            'detection_id': str(uuid.uuid4())
+        })
+    return [{'predictions': {'image': {'width': w, 'height': h}, 'predictions': preds}}]
+
+
+if __name__ == "__main__":
+    import argparse
+    from run_all_pipeline import collect_images, process_image
+    parser = argparse.ArgumentParser(description="Local vs hosted scene detection, side by side")
+    parser.add_argument("source", help="Directory, glob pattern or manifest file")
+    parser.add_argument("--model", default=DEFAULT_SCENE_MODEL)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--local-only", action="store_true", help="Skip the hosted workflow")
+    args = parser.parse_args()
+
+    backends = ['local'] if args.local_only else ['local', 'roboflow']
+    timings = {b: [] for b in backends}
+    for path in collect_images(args.source):
+        row = []
+        for backend in backends:
+            start = time.perf_counter()
+            try:
+                res = process_image(path, 'roboflow', use_cache=False, predictions_only=True,
+                                    scene_backend=backend, scene_model_path=args.model, device=args.device)
+            except Exception as e:
+                row.append(f"{backend}: FAILED {type(e).__name__}")
+                continue
+            timings[backend].append(time.perf_counter() - start)
+            row.append(f"{backend}: wires={res['wire_count']} veg={res['vegetation_score']} "
+                       f"({timings[backend][-1] * 1000:.0f} ms)")
+        print(f"  {os.path.basename(path)}: " + " | ".join(row))
+    for backend, secs in timings.items():
+        if secs:
+            # The first local image includes model loading
+            warm = secs[1:] or secs
+            print(f"{backend}: {len(secs)} images, first {secs[0]:.2f}s, "
+                  f"then {sum(warm) / len(warm) * 1000:.0f} ms/image")
@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+
+import cv2
+from preprocess import preprocess
+from model_registry import get_yolo, get_ocr_reader
+from infra_gis_detect import attributes_from_detections, write_gis_csv
+from run_all_pipeline import collect_images, save_processed_image, filter_ocr_results
+from result_sink import flush_all
+
+# Marks the end of the stream; each stage forwards it and then exits
+_DONE = object()
+
+
+class Stage:
+    """
+    One pipeline stage running in its own thread. Pulls items from in_q,
+    applies fn and pushes the result to out_q. Queues are bounded, so a slow
+    downstream stage blocks the upstream ones (backpressure).
+    Tracks busy time, time blocked on a full output queue and items handled.
+    """
+
+    def __init__(self, name, fn, in_q, out_q):
+        self.name = name
+        self.fn = fn
+        self.in_q = in_q
+        self.out_q = out_q
+        self.busy_sec = 0.0
+        self.blocked_sec = 0.0
+        self.items = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+
+    def _run(self):
+        while True:
+            item = self.in_q.get()
+            if item is _DONE:
+                if self.out_q is not None:
+                    self.out_q.put(_DONE)
+                return
+            # Failed items skip the remaining stages but still flow to the end
+            if 'error' not in item:
+                start = time.perf_counter()
+                try:
+                    self.fn(item)
+                except Exception as e:
+                    item['error'] = f"{self.name}: {type(e).__name__}: {e}"
+                    self.errors += 1
+                self.busy_sec += time.perf_counter() - start
+                self.items += 1
+            if self.out_q is not None:
+                start = time.perf_counter()
+                self.out_q.put(item)
+                self.blocked_sec += time.perf_counter() - start
+
+
+def run_streaming(image_paths, queue_size=4, yolo_model_path='yolov8s.pt', output_csv='output_gis.csv', device='cpu'):
+    """
+    Streaming OCR + GIS pipeline: decode -> preprocess -> detect -> ocr -> write,
+    each stage in its own worker thread connected by bounded queues, so image
+    N+1 is decoded and preprocessed while image N is in inference.
+    Returns (results, stats) where stats has per-stage occupancy
+    (busy time / wall time) and the average depth of each stage's input queue.
+    """
+    yolo_model = get_yolo(yolo_model_path, device)
+    reader = get_ocr_reader(['en'], device)
+
+    def decode(item):
+        img = cv2.imread(item['image'])
+        if img is None:
+            raise FileNotFoundError(f"Could not load image: {item['image']}")
+        item['img'] = img
+
+    def do_preprocess(item):
+        item['processed_img'] = preprocess(item.pop('img'))
+
+    def detect(item):
+        item['detections'] = yolo_model(item['processed_img'])[0]
+
+    def ocr(item):
+        img = item['processed_img']
+        ocr_results = reader.readtext(img, allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+        item['ocr_results'] = filter_ocr_results(ocr_results)
+        item['gis_attributes'] = attributes_from_detections(
+            img, item.pop('detections'), yolo_model.names, reader, item['image'])
+
+    def write(item):
+        item['processed_image'] = save_processed_image(item['image'], item.pop('processed_img'))
+        write_gis_csv(item['gis_attributes'], output_csv)
+
+    steps = [('decode', decode), ('preprocess', do_preprocess), ('detect', detect),
+             ('ocr', ocr), ('write', write)]
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(steps) + 1)]
+    stages = [Stage(name, fn, queues[i], queues[i + 1]) for i, (name, fn) in enumerate(steps)]
+
+    depth_samples = {s.name: [] for s in stages}
+    sampling = threading.Event()
+
+    def sample_depths():
+        while not sampling.is_set():
+            for s in stages:
+                depth_samples[s.name].append(s.in_q.qsize())
+            time.sleep(0.01)
+
+    sampler = threading.Thread(target=sample_depths, daemon=True)
+    start = time.perf_counter()
+    for s in stages:
+        s.thread.start()
+    sampler.start()
+
+    def feed():
+        for path in image_paths:
+            queues[0].put({'image': path})
+        queues[0].put(_DONE)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    results = []
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        results.append(item)
+    flush_all()
+    wall = time.perf_counter() - start
+    sampling.set()
+
+    stats = {
+        'images': len(results),
+        'wall_sec': wall,
+        'images_per_sec': len(results) / wall if wall > 0 else 0.0,
+        'queue_size': queue_size,
+        'stages': {
+            s.name: {
+                'items': s.items,
+                'errors': s.errors,
+                'busy_sec': s.busy_sec,
+                'blocked_sec': s.blocked_sec,
+                'occupancy': s.busy_sec / wall if wall > 0 else 0.0,
+                'avg_queue_depth': (sum(depth_samples[s.name]) / len(depth_samples[s.name])
+                                    if depth_samples[s.name] else 0.0)
+            }
+            for s in stages
+        }
+    }
+    stats['bottleneck'] = max(stats['stages'], key=lambda n: stats['stages'][n]['occupancy'])
+    return results, stats
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Streaming OCR + GIS pipeline")
+    parser.add_argument("source", help="Directory, glob pattern or manifest file")
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--output", default="output_gis.csv")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    results, stats = run_streaming(collect_images(args.source), args.queue_size, args.model, args.output, args.device)
+    for r in results:
+        if 'error' in r:
+            print(f"  FAILED {r['image']}: {r['error']}")
+        else:
+            print(f"  {r['image']}: pole_id={r['gis_attributes'].get('pole_id', '')}")
+    print(f"\nProcessed {stats['images']} images in {stats['wall_sec']:.1f}s ({stats['images_per_sec']:.2f} images/sec)")
+    print("Stage occupancy (busy / wall):")
+    for name, st in stats['stages'].items():
+        print(f"  {name:<10} {st['occupancy']:6.1%}  avg queue {st['avg_queue_depth']:.1f}  "
+              f"blocked {st['blocked_sec']:.1f}s  items {st['items']}")
+    print(f"Bottleneck stage: {stats['bottleneck']}")
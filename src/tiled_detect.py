@@ -0,0 +1,237 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from model_registry import get_yolo, get_ocr_reader
+from infra_gis_detect import build_attributes, merge_boxes, ocr_crops, pole_id_candidates, MIN_ROI_AREA, MIN_ROI_SIDE
+from preprocess import PreprocessEngine
+import tracing
+
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_TILE_OVERLAP = 128
+# Tiles per YOLO call; with the tile size this bounds the working set
+DEFAULT_TILE_BATCH = 4
+# Compressed images (JPEG, PNG, ...) can only be decoded whole; above this many
+# pixels open_source() refuses them instead of letting RSS follow the image size
+MAX_DECODE_PIXELS = int(os.environ.get('POLEPAD_MAX_DECODE_PIXELS', 40_000_000))
+
+
+class _Box:
+    """Just enough of an ultralytics box for build_attributes() (cls, conf, xyxy)."""
+
+    def __init__(self, x1, y1, x2, y2, conf, cls):
+        self.xyxy = [(x1, y1, x2, y2)]
+        self.conf = [conf]
+        self.cls = [cls]
+
+
+class _Detections:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class NpySource:
+    """
+    Read-only HxWx3 view of an .npy image that reads each slice row by row
+    from the file. Unlike a memmap, nothing stays mapped between slices, so
+    peak RSS is set by the tile size, not by the image's width or height.
+    """
+
+    def __init__(self, path):
+        arr = np.load(path, mmap_mode='r')
+        if arr.ndim != 3 or arr.shape[2] != 3 or arr.dtype != np.uint8 or np.isfortran(arr):
+            raise ValueError(f"{path}: expected a C-ordered HxWx3 uint8 BGR array, got {arr.shape} {arr.dtype}")
+        self.path = path
+        self.shape = arr.shape
+        self.dtype = arr.dtype
+        self._offset = arr.offset
+        del arr
+
+    def __getitem__(self, key):
+        rows, cols = key
+        h, w, c = self.shape
+        y1, y2, _ = rows.indices(h)
+        x1, x2, _ = cols.indices(w)
+        out = np.empty((max(0, y2 - y1), max(0, x2 - x1), c), dtype=self.dtype)
+        with open(self.path, 'rb', buffering=0) as f:
+            for i, y in enumerate(range(y1, y2)):
+                f.seek(self._offset + (y * w + x1) * c)
+                f.readinto(memoryview(out[i]).cast('B'))
+        return out
+
+
+def image_size(image_path):
+    """(width, height) from the file header, without decoding; None if Pillow can't tell."""
+    from PIL import Image
+    try:
+        with Image.open(image_path) as im:
+            return im.size
+    except Image.DecompressionBombError:
+        # Pillow refuses to even open images this large
+        return float('inf'), float('inf')
+    except (OSError, SyntaxError):
+        return None
+
+
+def open_source(image_path, max_decode_pixels=MAX_DECODE_PIXELS):
+    """
+    Returns an HxWx3 uint8 BGR array that tiles can be sliced from.
+
+    .npy files are read through NpySource, so their peak RSS is independent
+    of image size, and an already-decoded ndarray is used as is. Other
+    formats have no partial decoder in OpenCV and are decoded whole, so
+    they are only accepted up to max_decode_pixels; larger ones raise
+    ValueError asking for a one-off conversion with to_npy() (--to-npy).
+    """
+    if isinstance(image_path, np.ndarray):
+        return image_path
+    if image_path.lower().endswith('.npy'):
+        return NpySource(image_path)
+    size = image_size(image_path)
+    if size is not None and size[0] * size[1] > max_decode_pixels:
+        raise ValueError(f"{image_path} is {size[0]}x{size[1]}, too large to decode whole "
+                         f"(limit {max_decode_pixels:,} pixels, POLEPAD_MAX_DECODE_PIXELS). Convert it once with "
+                         f"`python src/tiled_detect.py {image_path} --to-npy image.npy` and pass the .npy file")
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Could not load image: {image_path}")
+    return img
+
+
+def to_npy(image_path, npy_path):
+    """
+    Decodes an image once and stores it as an .npy file that open_source()
+    reads slice by slice. This one-off conversion does hold the whole
+    decoded image in memory; run it where that fits.
+    """
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Could not load image: {image_path}")
+    out = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.uint8, shape=img.shape)
+    out[:] = img
+    out.flush()
+    del out, img
+    return npy_path
+
+
+def tile_grid(height, width, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP):
+    """(x1, y1, x2, y2) windows covering the image, overlapping by `overlap` px."""
+    stride = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        s = list(range(0, length - tile_size, stride))
+        # Last tile flush with the edge instead of a thin sliver
+        return s + [length - tile_size]
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def detect_infrastructure_attributes_tiled(image, yolo_model_path='yolov8s.pt', device='cpu', image_name=None,
+                                           tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_TILE_OVERLAP,
+                                           tile_batch=DEFAULT_TILE_BATCH, enhance=True, ocr_batch_size=16):
+    """
+    Full-resolution variant of detect_infrastructure_attributes for very large
+    images (a path, an .npy file, or a decoded ndarray). The image is read
+    through open_source() and processed as overlapping tile_size tiles,
+    tile_batch at a time; detections are shifted to image coordinates and
+    merged across tile seams with merge_boxes(). OCR runs only on the merged
+    regions (regions larger than a tile are read tile by tile), so for .npy
+    input memory is bounded by the tile size, not the image; convert large
+    JPEG/PNG/TIFF files with to_npy() first.
+    enhance applies the usual CLAHE + sharpening per tile/crop, without the
+    1024 px downscale that preprocess() would apply to the whole frame.
+    Returns (attributes, info) with tile counts, region count, OCR candidates
+    and timings.
+    """
+    start = time.perf_counter()
+    src = open_source(image)
+    engine = PreprocessEngine(max_side=tile_size) if enhance else None
+
+    def read(x1, y1, x2, y2):
+        tile = np.ascontiguousarray(src[y1:y2, x1:x2])
+        return engine.process(tile) if engine is not None else tile
+
+    try:
+        h, w = src.shape[:2]
+        yolo_model = get_yolo(yolo_model_path, device)
+        windows = tile_grid(h, w, tile_size, overlap)
+        detections = []
+        for i in range(0, len(windows), tile_batch):
+            batch = windows[i:i + tile_batch]
+            with tracing.span('yolo_tiles', tiles=len(batch)):
+                results = yolo_model([read(*win) for win in batch])
+            for (x0, y0, _, _), result in zip(batch, results):
+                for box in result.boxes:
+                    bx1, by1, bx2, by2 = (float(v) for v in box.xyxy[0])
+                    detections.append((max(0, int(bx1) + x0), max(0, int(by1) + y0),
+                                       min(w, int(bx2) + x0), min(h, int(by2) + y0),
+                                       float(box.conf[0]), int(box.cls[0])))
+        tracing.count('boxes', len(detections))
+        detect_sec = time.perf_counter() - start
+
+        regions = [b for b in merge_boxes([d[:5] for d in detections])
+                   if min(b[2] - b[0], b[3] - b[1]) >= MIN_ROI_SIDE and (b[2] - b[0]) * (b[3] - b[1]) >= MIN_ROI_AREA]
+        reader = get_ocr_reader(['en'], device)
+        candidates = []
+        # Batch OCR over crops, at most one tile's worth of pixels per crop
+        crops = []
+        for x1, y1, x2, y2, _ in regions:
+            for cx1, cy1, cx2, cy2 in tile_grid(y2 - y1, x2 - x1, tile_size, overlap):
+                crops.append(read(x1 + cx1, y1 + cy1, x1 + cx2, y1 + cy2))
+            if len(crops) >= ocr_batch_size:
+                for res in ocr_crops(reader, crops, ocr_batch_size):
+                    candidates.extend(pole_id_candidates(res))
+                crops = []
+        if crops:
+            for res in ocr_crops(reader, crops, ocr_batch_size):
+                candidates.extend(pole_id_candidates(res))
+    finally:
+        del src
+
+    # Highest-confidence detections first, as in a single YOLO result
+    boxes = [_Box(*d) for d in sorted(detections, key=lambda d: d[4], reverse=True)]
+    image_path = image if isinstance(image, str) else ''
+    attributes = build_attributes(candidates, _Detections(boxes), yolo_model.names, image_name or image_path)
+    info = {
+        'image_size': [w, h],
+        'tiles': len(windows),
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'detections': len(detections),
+        'regions': len(regions),
+        'ocr_candidates': candidates,
+        'detect_sec': detect_sec,
+        'elapsed_sec': time.perf_counter() - start
+    }
+    return attributes, info
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Tiled full-resolution OCR + GIS detection for large images")
+    parser.add_argument("image", help="Image file, or an .npy array written by --to-npy")
+    parser.add_argument("--to-npy", metavar="OUT", help="Only convert the image to a memory-mappable .npy file")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_TILE_OVERLAP)
+    parser.add_argument("--tile-batch", type=int, default=DEFAULT_TILE_BATCH)
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    if args.to_npy:
+        print(f"Wrote {to_npy(args.image, args.to_npy)}")
+    else:
+        import resource
+        attributes, info = detect_infrastructure_attributes_tiled(args.image, args.model, args.device,
+                                                                  tile_size=args.tile_size, overlap=args.overlap,
+                                                                  tile_batch=args.tile_batch)
+        print(f"{info['image_size'][0]}x{info['image_size'][1]}: {info['tiles']} tiles, {info['detections']} detections, "
+              f"{info['regions']} regions after merging, {info['elapsed_sec']:.1f}s")
+        for k, v in attributes.items():
+            print(f"  {k}: {v}")
+        print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
@@ -0,0 +1,280 @@
+"""
+Lightweight hot-path instrumentation for the pipeline.
+
+Timed spans and counters are recorded per image (a trace, one per
+process_image() call) and aggregated per process (for Prometheus):
+
+    with tracing.trace(image_path, mode='ocr_gis'):
+        with tracing.span('yolo'):
+            ...
+        tracing.count('boxes', len(boxes))
+
+Tracing is off unless POLEPAD_TRACE=1 (or enable() is called). When off,
+span() hands back a shared no-op context manager and count() returns
+immediately, so the instrumented code pays one flag check per call.
+
+Finished traces are kept in memory (recent_traces()) and, when
+POLEPAD_TRACE_DIR is set, written there as one JSON file per image.
+write_prometheus() dumps the aggregated metrics in Prometheus text format,
+e.g. for node_exporter's textfile collector; with POLEPAD_METRICS_FILE set
+that happens automatically at exit.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+_enabled = os.environ.get('POLEPAD_TRACE', '') not in ('', '0', 'false', 'no')
+TRACE_DIR = os.environ.get('POLEPAD_TRACE_DIR') or None
+METRICS_FILE = os.environ.get('POLEPAD_METRICS_FILE') or None
+METRIC_PREFIX = 'polepad'
+# Latency histogram buckets (seconds), shared by every stage
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_RECENT = 100
+
+_current = contextvars.ContextVar('polepad_trace', default=None)
+_lock = threading.Lock()
+_stage_hist = {}   # stage -> [bucket counts..., +Inf count, sum]
+_counters = {}     # name -> total
+_recent = deque(maxlen=MAX_RECENT)
+
+
+def enable(trace_dir=None):
+    """Turns tracing on for this process; trace_dir also writes per-image JSON traces."""
+    global _enabled, TRACE_DIR
+    _enabled = True
+    if trace_dir:
+        TRACE_DIR = trace_dir
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Spans and counters of one image's trip through the pipeline."""
+
+    def __init__(self, image, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.image = image
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self._stack = []
+        self.duration_sec = None
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'image': self.image,
+            'attrs': self.attrs,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_sec * 1000 if self.duration_sec is not None else None,
+            'spans': self.spans,
+            'counters': self.counters
+        }
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', '_trace', '_start', '_record')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self._trace = _current.get()
+
+    def set(self, **attrs):
+        """Adds attributes known only inside the span (e.g. a box count)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        trace = self._trace
+        if trace is not None:
+            self._record = {
+                'id': len(trace.spans),
+                'name': self.name,
+                'parent': trace._stack[-1]['id'] if trace._stack else None,
+                'start_ms': (self._start - trace._t0) * 1000,
+                'duration_ms': None,
+                'attrs': self.attrs
+            }
+            trace.spans.append(self._record)
+            trace._stack.append(self._record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        trace = self._trace
+        if trace is not None:
+            self._record['duration_ms'] = elapsed * 1000
+            if exc_type is not None:
+                self._record['error'] = exc_type.__name__
+            if trace._stack and trace._stack[-1] is self._record:
+                trace._stack.pop()
+        _observe(self.name, elapsed)
+        return False
+
+
+def span(name, /, **attrs):
+    """Times a block as stage `name`; a no-op when tracing is disabled."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def count(name, n=1):
+    """Adds n to counter `name` for the current image and the process totals."""
+    if not _enabled:
+        return
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + n
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def _observe(stage, seconds):
+    with _lock:
+        hist = _stage_hist.get(stage)
+        if hist is None:
+            hist = _stage_hist[stage] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += 1
+        hist[-1] += seconds
+
+
+class _TraceScope:
+    def __init__(self, image, attrs):
+        self.trace = Trace(image, **attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        trace = self.trace
+        trace.duration_sec = time.perf_counter() - trace._t0
+        if exc_type is not None:
+            trace.attrs['error'] = exc_type.__name__
+        _observe('total', trace.duration_sec)
+        with _lock:
+            _recent.append(trace)
+        if TRACE_DIR:
+            write_trace(trace, TRACE_DIR)
+        return False
+
+
+def trace(image, **attrs):
+    """
+    Collects the spans and counters recorded while the block runs into one
+    trace for `image`. Nested calls (e.g. process_image() inside a batch)
+    join the outer trace. A no-op when tracing is disabled.
+    """
+    if not _enabled or _current.get() is not None:
+        return _NULL_SPAN
+    return _TraceScope(image, attrs)
+
+
+def current_trace():
+    return _current.get()
+
+
+def recent_traces():
+    """The most recent finished traces (as dicts), oldest first."""
+    with _lock:
+        return [t.to_dict() for t in _recent]
+
+
+def write_trace(trace, out_dir):
+    """Writes one trace as <image>_<trace_id>.json in out_dir and returns the path."""
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(trace.image or 'image'))[0]
+    path = os.path.join(out_dir, f"{base}_{trace.trace_id}.json")
+    with open(path, 'w') as f:
+        json.dump(trace.to_dict(), f, indent=2, default=str)
+    return path
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text():
+    """Aggregated stage latencies and counters in Prometheus text exposition format."""
+    with _lock:
+        hists = {k: list(v) for k, v in _stage_hist.items()}
+        counters = dict(_counters)
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines = [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} histogram"]
+    for stage in sorted(hists):
+        hist = hists[stage]
+        label = f'stage="{_label(stage)}"'
+        for bound, n in zip(BUCKETS, hist):
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {n}')
+        lines.append(f'{name}_bucket{{{label},le="+Inf"}} {hist[-2]}')
+        lines.append(f'{name}_sum{{{label}}} {hist[-1]:.6f}')
+        lines.append(f'{name}_count{{{label}}} {hist[-2]}')
+    for counter in sorted(counters):
+        metric = f"{METRIC_PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {counters[counter]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Writes prometheus_text() to path atomically (scrapers never see a partial file)."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+
+def reset():
+    """Clears the aggregated metrics and recent traces."""
+    with _lock:
+        _stage_hist.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+def _write_metrics_at_exit():
+    if _enabled and METRICS_FILE:
+        write_prometheus(METRICS_FILE)
+
+
+atexit.register(_write_metrics_at_exit)
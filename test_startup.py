@@ -0,0 +1,175 @@
+"""
+Startup budget for src/run_all_pipeline.py.
+
+Each path runs in a fresh interpreter under `python -X importtime`; the
+test fails if it imports more than its budget (total import time, best of
+RUNS) or pulls in a module the mode does not need:
+
+    usage     - no arguments: the usage message
+    roboflow  - one hosted scene-detection call (against roboflow_replay);
+                inference_sdk is allowed here, it is what makes the call
+    ocr       - one OCR + GIS run, with stand-in models so only the
+                pipeline's own imports are measured (model loading is
+                the registry's job and is benchmarked in src/benchmark.py)
+
+    python -m pytest -q test_startup.py
+    python test_startup.py          # prints the numbers and the slowest imports
+
+Budgets are in milliseconds and can be raised for slow machines with
+POLEPAD_STARTUP_BUDGET_<PATH>_MS, e.g. POLEPAD_STARTUP_BUDGET_OCR_MS=900.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(ROOT, 'src')
+IMAGE = os.path.join(SRC, 'images', 'PoleTag_24.jpg')
+RUNS = 3
+MODULES_MARKER = '__modules__'
+
+BUDGETS_MS = {'usage': 120, 'roboflow': 2000, 'ocr': 600}
+# Heavy packages each path must not import
+FORBIDDEN = {
+    'usage': ('cv2', 'numpy', 'asyncio', 'torch', 'ultralytics', 'easyocr', 'inference_sdk', 'onnxruntime'),
+    'roboflow': ('torch', 'ultralytics', 'easyocr', 'onnxruntime', 'pandas'),
+    'ocr': ('asyncio', 'torch', 'ultralytics', 'easyocr', 'inference_sdk', 'supervision', 'onnxruntime', 'pandas')
+}
+
+_PRELUDE = f"""
+import json, sys
+sys.path.insert(0, {SRC!r})
+"""
+_EPILOGUE = f"""
+print({MODULES_MARKER!r} + json.dumps(sorted(sys.modules)))
+"""
+SCRIPTS = {
+    'usage': f"""
+import runpy
+sys.argv = ['run_all_pipeline.py']
+try:
+    runpy.run_path({os.path.join(SRC, 'run_all_pipeline.py')!r}, run_name='__main__')
+except SystemExit:
+    pass
+""",
+    'roboflow': f"""
+import run_all_pipeline
+# Keep the repo's roboflow_results.csv out of it
+run_all_pipeline.save_roboflow_csv = lambda *args, **kwargs: None
+result = run_all_pipeline.process_image({IMAGE!r}, 'roboflow', use_cache=False)
+assert result['mode'] == 'roboflow'
+""",
+    'ocr': f"""
+import model_registry
+import run_all_pipeline
+
+class Result:
+    boxes = []
+
+class Detector:
+    names = {{}}
+
+    def __call__(self, img, **kwargs):
+        return [Result()]
+
+class Reader:
+    def readtext(self, img, **kwargs):
+        return []
+
+model_registry._models[('yolo', 'yolov8s.pt', 'cpu')] = Detector()
+model_registry._models[('ocr', ('en',), 'cpu')] = Reader()
+result = run_all_pipeline.run_all({IMAGE!r}, output_csv=None, save_processed=False)
+assert 'gis_attributes' in result
+"""
+}
+
+
+def parse_importtime(stderr):
+    """[(name, cumulative_us, depth)] from `-X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(cumulative), (len(name) - len(name.lstrip()) - 1) // 2))
+    return imports
+
+
+def measure(path, env=None):
+    """
+    Runs one startup path in a fresh interpreter and returns
+    {'import_ms', 'modules', 'slowest'}; import_ms is the total of the
+    top-level imports, modules everything in sys.modules at the end.
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PRELUDE + SCRIPTS[path] + _EPILOGUE],
+                          capture_output=True, text=True, cwd=ROOT, env={**os.environ, **(env or {})}, timeout=120)
+    marker = [line for line in proc.stdout.splitlines() if line.startswith(MODULES_MARKER)]
+    if proc.returncode != 0 or not marker:
+        raise RuntimeError(f"{path} startup failed:\n{proc.stderr[-2000:]}")
+    imports = parse_importtime(proc.stderr)
+    top = [(name, us) for name, us, depth in imports if depth == 0]
+    return {
+        'import_ms': sum(us for _, us in top) / 1000,
+        'modules': set(json.loads(marker[0][len(MODULES_MARKER):])),
+        'slowest': sorted(top, key=lambda t: t[1], reverse=True)[:5]
+    }
+
+
+def best_of(path, runs=RUNS, env=None):
+    return min((measure(path, env) for _ in range(runs)), key=lambda m: m['import_ms'])
+
+
+def budget_ms(path):
+    return float(os.environ.get(f'POLEPAD_STARTUP_BUDGET_{path.upper()}_MS', BUDGETS_MS[path]))
+
+
+def check(path, env=None):
+    m = best_of(path, env=env)
+    loaded = sorted(mod for mod in FORBIDDEN[path] if mod in m['modules'])
+    assert not loaded, f"{path} path imports {', '.join(loaded)}"
+    slowest = ', '.join(f"{name} {us / 1000:.0f} ms" for name, us in m['slowest'])
+    assert m['import_ms'] <= budget_ms(path), \
+        f"{path} path imports take {m['import_ms']:.0f} ms, budget {budget_ms(path):.0f} ms ({slowest})"
+    return m
+
+
+def _replay_env():
+    sys.path.insert(0, SRC)
+    from roboflow_replay import start_replay_server
+    server, url = start_replay_server()
+    return server, {'ROBOFLOW_API_URL': url}
+
+
+def test_usage_startup():
+    check('usage')
+
+
+def test_roboflow_startup():
+    server, env = _replay_env()
+    try:
+        check('roboflow', env)
+    finally:
+        server.shutdown()
+
+
+def test_ocr_startup():
+    check('ocr')
+
+
+if __name__ == "__main__":
+    server, env = _replay_env()
+    failed = False
+    try:
+        for path in SCRIPTS:
+            try:
+                m = check(path, env)
+                status = 'ok'
+            except AssertionError as e:
+                m, status, failed = best_of(path, env=env), f"FAIL: {e}", True
+            print(f"{path:<9} {m['import_ms']:6.0f} ms (budget {budget_ms(path):.0f}) {status}")
+            for name, us in m['slowest']:
+                print(f"    {name:<24} {us / 1000:6.1f} ms")
+    finally:
+        server.shutdown()
+    sys.exit(1 if failed else 0)
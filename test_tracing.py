@@ -0,0 +1,52 @@
+"""
+Tracing around the shared model registry.
+
+    python -m pytest -q test_tracing.py
+"""
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import model_registry
+import tracing
+
+
+class _YOLO:
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def to(self, device):
+        self.device = device
+        return self
+
+
+def test_model_load_is_traced(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'ultralytics', types.SimpleNamespace(YOLO=_YOLO))
+    monkeypatch.setattr(model_registry, '_models', {})
+    tracing.reset()
+    tracing.enable()
+    try:
+        with tracing.trace('pole.jpg') as trace:
+            model = model_registry.get_yolo('weights.pt')
+            assert model_registry.get_yolo('weights.pt') is model
+    finally:
+        tracing.disable()
+    loads = [s for s in trace.spans if s['name'] == 'model_load']
+    assert len(loads) == 1
+    assert loads[0]['attrs'] == {'model': 'yolo', 'weights': 'weights.pt', 'device': 'cpu'}
+    assert trace.counters == {'model_loads': 1}
+    assert 'stage="model_load"' in tracing.prometheus_text()
+
+
+def test_span_accepts_name_attribute():
+    tracing.enable()
+    try:
+        with tracing.trace('pole.jpg') as trace:
+            with tracing.span('ocr', name='reader'):
+                pass
+    finally:
+        tracing.disable()
+    assert trace.spans[0]['name'] == 'ocr'
+    assert trace.spans[0]['attrs'] == {'name': 'reader'}